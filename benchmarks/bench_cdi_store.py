@@ -0,0 +1,76 @@
+"""
+This Python script benchmarks repeated CDI queries through a CDIStore
+against boolean masks over the whole DataFrame, on synthetic CDI data:
+    * the (Question, StratificationCategory1, DataValueType) slices used
+      by plot_geomap
+    * plot_geomap and variable_summary end to end
+
+Run from the repository root with:
+    python benchmarks/bench_cdi_store.py [--queries N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from hdcd.plot import plot_geomap
+from hdcd.store import CDIStore, select
+from hdcd.summary import variable_summary
+from benchmarks.synthetic import make_cdi
+
+
+def timed(func, *args):
+    """
+    Return the output of func and the elapsed wall time in seconds.
+    """
+    start = time.perf_counter()
+    out = func(*args)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CDI store benchmark')
+    parser.add_argument('--queries', type=int, default=200,
+                        help='number of queries')
+    args = parser.parse_args()
+
+    cdi = make_cdi()
+    rng = np.random.default_rng(0)
+    questions = rng.choice(cdi['Question'].unique(), args.queries)
+    criteria = [{'Question': q,
+                 'StratificationCategory1': 'Gender',
+                 'DataValueType': 'Crude Prevalence'} for q in questions]
+
+    store, t_build = timed(CDIStore, cdi)
+    print(f'rows: {len(cdi):,}  queries: {args.queries}  '
+          f'store build: {t_build:.2f} s')
+
+    def run(data):
+        return [select(data, x) for x in criteria]
+
+    masked, t_mask = timed(run, cdi)
+    indexed, t_store = timed(run, store)
+    assert all(x.equals(y) for x, y in zip(masked, indexed))
+    print(f'select   masks: {t_mask:7.3f} s  store: {t_store:7.3f} s  '
+          f'speedup: {t_mask / t_store:6.1f}x')
+
+    def dashboard(data):
+        with contextlib.redirect_stdout(io.StringIO()):
+            for question in questions[:20]:
+                plot_geomap(question, 'Crude Prevalence', 'Overall', data)
+                variable_summary(question, data)
+
+    _, t_mask = timed(dashboard, cdi)
+    _, t_store = timed(dashboard, store)
+    print(f'plots    masks: {t_mask:7.3f} s  store: {t_store:7.3f} s  '
+          f'speedup: {t_mask / t_store:6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+This Python script benchmarks the hdcd data transformer against Altair's
+default inline data, when the same CDI slices are drawn repeatedly (as a
+dashboard redrawing its charts): total spec size and to_dict time.
+
+Run from the repository root with:
+    python benchmarks/bench_chart_data.py [--charts N]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import altair as alt
+
+sys.path.append(os.getcwd())
+
+from hdcd.chart_data import enable_shared_data
+from hdcd.plot import plot_geomap
+from hdcd.store import CDIStore
+from benchmarks.synthetic import make_cdi
+
+
+def main():
+    parser = argparse.ArgumentParser(description='chart data benchmark')
+    parser.add_argument('--charts', type=int, default=50,
+                        help='number of charts, over 5 distinct questions')
+    args = parser.parse_args()
+
+    store = CDIStore(make_cdi(n_years=40))
+    questions = [f'Question {i % 5}' for i in range(args.charts)]
+    charts = [plot_geomap(x, 'Crude Prevalence', 'Gender', store) for x in questions]
+
+    def render():
+        start = time.perf_counter()
+        size = sum(len(json.dumps(x.to_dict())) for x in charts)
+        return size, time.perf_counter() - start
+
+    alt.data_transformers.disable_max_rows()
+    size_inline, t_inline = render()
+    with tempfile.TemporaryDirectory() as tmp:
+        for file_format in ['json', 'csv']:
+            with enable_shared_data(data_dir=os.path.join(tmp, file_format),
+                                    format=file_format):
+                size_shared, t_shared = render()
+            files = os.listdir(os.path.join(tmp, file_format))
+            on_disk = sum(os.path.getsize(os.path.join(tmp, file_format, x))
+                          for x in files)
+            print(f'{file_format:4} specs: {size_shared:12,} bytes  files: '
+                  f'{len(files)} x {on_disk // len(files):,} bytes  '
+                  f'to_dict: {t_shared:6.2f} s')
+
+    print(f'inline specs: {size_inline:12,} bytes  to_dict: {t_inline:6.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+This Python script reports the peak resident memory (RSS) of
+AoU_conditions.counties_groupby_count with and without compact dtypes
+on a synthetic million-row condition dataset, and checks that compact
+mode lowers the peak.
+
+Each mode runs in its own process so peaks do not mix. Run from the
+repository root with:
+    python benchmarks/bench_compact_memory.py [--rows N]
+"""
+import argparse
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.getcwd())
+
+from hdcd.cache import ReferenceCache
+from hdcd.data_wrangling import AoU_conditions
+from benchmarks.synthetic import make_conditions, make_observations, \
+make_reference_files
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB (Linux reports KB).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(mode, rows, directory):
+    """
+    Run the conditions pipeline once and print peak RSS and wall time.
+    """
+    geo_df = os.path.join(directory, 'counties.geojson')
+    county_df = os.path.join(directory, 'geo-data.csv')
+    n_person = rows // 10
+    cache = ReferenceCache(cache_dir=os.path.join(directory, 'cache'))
+
+    wrangler = AoU_conditions(conditions_df=make_conditions(rows, n_person),
+                              observations_df=make_observations(n_person, n_person),
+                              county_df=county_df,
+                              geo_df=geo_df,
+                              cache=cache,
+                              compact=mode == 'category')
+    # warm the reference cache so every mode reads from disk
+    wrangler.load_counties_zip()
+    cache.read_geoshapes(geo_df)
+    baseline = peak_rss_mb()
+
+    start = time.perf_counter()
+    wrangler.counties_groupby_count(threshold=0)
+    elapsed = time.perf_counter() - start
+
+    print(f'{mode:16s} inputs {baseline:8.1f} MB   peak {peak_rss_mb():8.1f} MB   '
+          f'{elapsed:6.2f} s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='compact dtypes memory benchmark')
+    parser.add_argument('--rows', type=int, default=1_000_000,
+                        help='number of synthetic condition rows')
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    parser.add_argument('--dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run(args.mode, args.rows, args.dir)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        make_reference_files(directory)
+        print(f'condition rows: {args.rows}')
+        peaks = {}
+        for mode in ['object', 'category']:
+            output = subprocess.run([sys.executable, __file__, '--rows', str(args.rows),
+                                     '--mode', mode, '--dir', directory],
+                                    check=True, capture_output=True, text=True).stdout
+            print(output, end='')
+            peaks[mode] = float(re.search(r'peak\s+([\d.]+) MB', output).group(1))
+
+    assert peaks['category'] < peaks['object'], \
+        f"compact mode did not lower peak memory: {peaks}"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+This Python script benchmarks spearman_matrix, the batched Spearman
+correlation of every pair of questions, against pd.DataFrame.corr and a
+scipy.stats.spearmanr call per pair (as plot_corr does), on synthetic CDI
+data with 10% of (state, question) cells missing.
+
+Run from the repository root with:
+    python benchmarks/bench_corr_matrix.py [--pairs N]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import scipy.stats as sp
+
+sys.path.append(os.getcwd())
+
+from hdcd.plot import spearman_matrix
+from benchmarks.synthetic import make_cdi
+
+
+def timed(func, *args):
+    """
+    Return the output of func and the elapsed wall time in seconds.
+    """
+    start = time.perf_counter()
+    out = func(*args)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='correlation matrix benchmark')
+    parser.add_argument('--pairs', type=int, default=2000,
+                        help='pairs timed with spearmanr, extrapolated to all pairs')
+    args = parser.parse_args()
+
+    cdi = make_cdi()
+    rng = np.random.default_rng(0)
+    cell = cdi['LocationAbbr'] + cdi['Question']
+    missing = rng.choice(cell.unique(), cell.nunique() // 10, replace=False)
+    cdi = cdi[~cell.isin(missing)]
+
+    corr, t_batched = timed(spearman_matrix, 'Gender', cdi)
+    n_columns = len(corr)
+    n_pairs = n_columns * (n_columns - 1) // 2
+
+    rows = cdi[(cdi['StratificationCategory1'] == 'Gender') &
+               (cdi['LocationAbbr'] != 'US')]
+    pivot = rows.groupby(['LocationAbbr', rows['Question'] + ' - ' +
+                          rows['DataValueType']])['DataValue'].mean().unstack()
+    reference, t_pandas = timed(pivot.corr, 'spearman')
+    assert np.allclose(reference.to_numpy(), corr.to_numpy(), equal_nan=True)
+
+    def per_pair(pairs):
+        for a, b in pairs:
+            both = pivot.iloc[:, [a, b]].dropna()
+            sp.spearmanr(both.iloc[:, 0], both.iloc[:, 1])
+
+    pairs = rng.integers(0, n_columns, (args.pairs, 2))
+    _, t_pair = timed(per_pair, pairs)
+    t_pair *= n_pairs / args.pairs
+
+    print(f'columns: {n_columns}  pairs: {n_pairs:,}  states: {len(pivot)}')
+    print(f'spearmanr per pair: {t_pair:8.2f} s (extrapolated)')
+    print(f'DataFrame.corr:     {t_pandas:8.2f} s (pivot only)')
+    print(f'spearman_matrix:    {t_batched:8.2f} s (from the long CDI data)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+This Python script benchmarks parse_datetimes and datetime_parts against
+format-inferring pd.to_datetime followed by two DatetimeIndex objects for
+year and month, on synthetic All of Us style timestamps.
+
+Run from the repository root with:
+    python benchmarks/bench_datetime_parsing.py [--rows N]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.getcwd())
+
+from hdcd.data_wrangling import parse_datetimes, datetime_parts
+from benchmarks.synthetic import make_conditions
+
+
+def legacy_year_month(values):
+    """
+    Previous implementation: infer the format, then build a DatetimeIndex
+    for each of year and month.
+    """
+    datetimes = pd.to_datetime(values)
+    return pd.DatetimeIndex(datetimes).year, pd.DatetimeIndex(datetimes).month
+
+
+def fast_year_month(values):
+    return datetime_parts(parse_datetimes(values))
+
+
+def timed(func, *args):
+    """
+    Return the output of func and the elapsed wall time in seconds.
+    """
+    start = time.perf_counter()
+    out = func(*args)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='datetime parsing benchmark')
+    parser.add_argument('--rows', type=int, default=3_000_000,
+                        help='number of synthetic timestamps')
+    args = parser.parse_args()
+
+    values = make_conditions(args.rows, args.rows)['condition_start_datetime']
+
+    (year, month), t_legacy = timed(legacy_year_month, values)
+    (fast_year, fast_month), t_fast = timed(fast_year_month, values)
+    assert np.array_equal(year, fast_year) and np.array_equal(month, fast_month)
+
+    print(f'rows: {args.rows}  unique: {values.nunique()}')
+    print(f'to_datetime: {t_legacy:8.3f} s  {args.rows / t_legacy:14,.0f} rows/s')
+    print(f'fast path:   {t_fast:8.3f} s  {args.rows / t_fast:14,.0f} rows/s')
+    print(f'speedup:     {t_legacy / t_fast:8.1f}x')
+    print(f'year/month:  {year.nbytes + month.nbytes:,} -> '
+          f'{fast_year.nbytes + fast_month.nbytes:,} bytes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+This Python script compares the spec size and Altair build time of
+plot_geomap with and without pre_aggregate, on synthetic CDI data with a
+long history of years.
+
+Run from the repository root with:
+    python benchmarks/bench_geomap_years.py [--years N]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from hdcd.plot import plot_geomap
+from hdcd.store import CDIStore
+from benchmarks.synthetic import make_cdi
+
+
+def spec_size(pre_aggregate, data):
+    """
+    Return the size in bytes of the plot_geomap spec and the wall time
+    to build it.
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        chart = plot_geomap('Question 0', 'Crude Prevalence', 'Overall', data,
+                            pre_aggregate=pre_aggregate)
+        spec = json.dumps(chart.to_dict(), separators=(',', ':'))
+    return len(spec), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='plot_geomap year slider benchmark')
+    parser.add_argument('--years', type=int, default=40,
+                        help='number of years of synthetic data')
+    args = parser.parse_args()
+
+    store = CDIStore(make_cdi(n_questions=10, n_years=args.years))
+    print(f'years: {args.years}')
+    for pre_aggregate in (False, True):
+        size, elapsed = spec_size(pre_aggregate, store)
+        print(f'pre_aggregate={pre_aggregate!s:5}  spec: {size / 1e3:8.1f} kB  '
+              f'build: {elapsed:6.3f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+This Python script benchmarks the size of the plot_geomap_socioeconomic
+spec with county shapes embedded as simplified TopoJSON, at each level of
+detail, against embedding the full geoJSON of the counties, on synthetic
+counties with detailed shared borders.
+
+Run from the repository root with:
+    python benchmarks/bench_map_payload.py [--vertices N]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import altair as alt
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from hdcd.cache import ReferenceCache
+from hdcd.plot import plot_geomap_socioeconomic
+from hdcd.topology import LEVELS
+from benchmarks.synthetic import make_county_shapes
+
+
+def spec_size(chart):
+    return len(json.dumps(chart.to_dict(), separators=(',', ':')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='geomap payload benchmark')
+    parser.add_argument('--vertices', type=int, default=100,
+                        help='points per county side')
+    args = parser.parse_args()
+    alt.data_transformers.disable_max_rows()
+
+    counties = make_county_shapes(vertices=args.vertices)
+    rng = np.random.default_rng(0)
+    counties['STATEFP'] = '53'
+    counties['NAME'] = 'County'
+    for sdoh in ['high_school_education', 'median_income',
+                 'no_health_insurance', 'poverty']:
+        counties[sdoh] = rng.random(len(counties))
+
+    geojson = spec_size(alt.Chart(counties).mark_geoshape().encode(color='poverty:Q'))
+    print(f'counties: {len(counties)}  points: '
+          f'{sum(len(x.exterior.coords) for x in counties.geometry):,}')
+    print(f'geoJSON spec:      {geojson:14,} bytes')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ReferenceCache(tmp)
+        for level in LEVELS:
+            start = time.perf_counter()
+            chart = plot_geomap_socioeconomic(counties, level=level, cache=cache)
+            t_build = time.perf_counter() - start
+            start = time.perf_counter()
+            plot_geomap_socioeconomic(counties, level=level, cache=cache)
+            t_cached = time.perf_counter() - start
+            size = spec_size(chart)
+            print(f'{level + " spec:":18} {size:14,} bytes  {geojson / size:6.1f}x smaller'
+                  f'  build {t_build:6.2f} s  cached {t_cached:6.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+This Python script benchmarks AoU_conditions.observation_zip against
+the previous row-by-row (iterrows) implementation on a synthetic
+observation dataset.
+
+Run from the repository root with:
+    python benchmarks/bench_observation_zip.py [--rows N]
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.append(os.getcwd())
+
+from hdcd.data_wrangling import AoU_conditions
+from benchmarks.synthetic import make_observations
+
+
+def legacy_observation_zip(observations_df):
+    """
+    Previous row-by-row implementation of observation_zip.
+    """
+    postal_code = \
+    observations_df.loc[observations_df.standard_concept_name == 'Postal code [Location]'].copy()
+    postal_code['observation_datetime'] = pd.to_datetime(postal_code['observation_datetime'])
+
+    zip_list = []
+    for i, row in postal_code.iterrows():
+        tmp = dict()
+        tmp['person_id'] = int(row.person_id)
+        tmp['zip'] = row.value_as_string
+        tmp['datetime'] = row.observation_datetime
+        zip_list.append(tmp)
+
+    return pd.DataFrame(zip_list)
+
+
+def timed(func, *args):
+    """
+    Return the output of func and the elapsed wall time in seconds.
+    """
+    start = time.perf_counter()
+    out = func(*args)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='observation_zip benchmark')
+    parser.add_argument('--rows', type=int, default=1_000_000,
+                        help='number of synthetic observation rows')
+    args = parser.parse_args()
+
+    observations_df = make_observations(args.rows)
+    wrangler = AoU_conditions(conditions_df=pd.DataFrame(),
+                              observations_df=observations_df,
+                              county_df='',
+                              geo_df='')
+
+    legacy, t_legacy = timed(legacy_observation_zip, observations_df)
+    columnar, t_columnar = timed(wrangler.observation_zip)
+    assert legacy['zip'].tolist() == columnar['zip'].tolist()
+
+    print(f'rows: {args.rows}')
+    print(f'iterrows:  {t_legacy:8.3f} s  {args.rows / t_legacy:14,.0f} rows/s')
+    print(f'columnar:  {t_columnar:8.3f} s  {args.rows / t_columnar:14,.0f} rows/s')
+    print(f'speedup:   {t_legacy / t_columnar:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+This Python script benchmarks render_charts on a batch of CDI geomaps
+and scatterplots rendered to SVG, in the current process and across
+a pool of worker processes.
+
+Run from the repository root with:
+    python benchmarks/bench_render.py [--charts N] [--processes N]
+
+Requires `vl-convert-python`.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.getcwd())
+
+from hdcd.render import render_charts
+from hdcd.store import CDIStore
+from benchmarks.synthetic import make_cdi
+
+
+def make_requests(n_charts, out_dir):
+    """
+    Alternate geomap and scatterplot requests on synthetic questions.
+    """
+    requests = []
+    for i in range(n_charts):
+        if i % 2 == 0:
+            requests.append({'function': 'plot_geomap', 'data': 'cdi',
+                             'kwargs': {'variable': f'Question {i}',
+                                        'datatype': 'Crude Prevalence',
+                                        'stratification': 'Overall'},
+                             'output': os.path.join(out_dir, f'geomap_{i}.svg')})
+        else:
+            requests.append({'function': 'plot_corr', 'data': 'cdi',
+                             'kwargs': {'sod': f'Question {i}',
+                                        'health_outcome': f'Question {i - 1}',
+                                        'stratification': 'Overall'},
+                             'output': os.path.join(out_dir, f'corr_{i}.svg')})
+    return requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description='batch renderer benchmark')
+    parser.add_argument('--charts', type=int, default=24, help='number of charts')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                        help='number of worker processes')
+    args = parser.parse_args()
+
+    datasets = {'cdi': CDIStore(make_cdi(n_questions=args.charts, n_years=5))}
+    print(f'charts: {args.charts}  cpus: {os.cpu_count()}')
+
+    for processes in sorted({1, args.processes}):
+        with tempfile.TemporaryDirectory() as out_dir:
+            requests = make_requests(args.charts, out_dir)
+            start = time.perf_counter()
+            report = render_charts(requests, datasets, processes=processes)
+            elapsed = time.perf_counter() - start
+            assert (report['status'] == 'rendered').all(), report['error'].dropna()
+
+            start = time.perf_counter()
+            skipped = render_charts(requests, datasets, processes=processes)
+            rerun = time.perf_counter() - start
+            assert (skipped['status'] == 'skipped').all()
+
+        print(f'processes: {processes:3d}  wall: {elapsed:7.2f} s  '
+              f'build: {report["build_s"].sum():6.2f} s  '
+              f'render: {report["render_s"].sum():6.2f} s  rerun: {rerun:5.3f} s')
+
+
+if __name__ == '__main__':
+    main()
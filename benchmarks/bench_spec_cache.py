@@ -0,0 +1,54 @@
+"""
+This Python script benchmarks SpecCache on synthetic CDI data: the first
+call of plot_geomap, plot_corr and plot_longitudinal_change (miss) against
+repeated calls (memory hit) and a new session (disk hit), for a DataFrame
+and for a CDIStore.
+
+Run from the repository root with:
+    python benchmarks/bench_spec_cache.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.getcwd())
+
+from hdcd.cache import ReferenceCache
+from hdcd.plot import plot_corr, plot_geomap, plot_longitudinal_change
+from hdcd.spec_cache import SpecCache
+from hdcd.store import CDIStore
+from benchmarks.synthetic import make_cdi
+
+CALLS = [(plot_geomap, ('Question 3', 'Crude Prevalence', 'Overall')),
+         (plot_corr, ('Question 3', 'Question 4', 'Overall')),
+         (plot_longitudinal_change, ('Question 3', 'Crude Prevalence', 'Arkansas'))]
+
+
+def timed(specs, data):
+    """
+    Return the wall time in seconds of all CALLS on @data through @specs.
+    """
+    start = time.perf_counter()
+    for function, args in CALLS:
+        specs.spec(function, *args, data)
+    return time.perf_counter() - start
+
+
+def main():
+    cdi = make_cdi()
+    print(f'rows: {len(cdi):,}')
+    for name, make_data in [('DataFrame', lambda: cdi), ('CDIStore', lambda: CDIStore(cdi))]:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ReferenceCache(cache_dir=cache_dir)
+            data = make_data()
+            specs = SpecCache(disk=True, cache=cache)
+            miss = timed(specs, data)
+            hit = timed(specs, data)
+            disk = timed(SpecCache(disk=True, cache=cache), data)
+        print(f'{name:10s} miss: {miss:7.3f} s  memory hit: {hit:7.4f} s  '
+              f'disk hit: {disk:7.4f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+This Python script benchmarks minimize=True of the hdcd.plot functions on
+synthetic CDI data and on conditions counts of every county: the spec size
+before and after minimize_chart and the time the pass takes.
+
+Run from the repository root with:
+    python benchmarks/bench_spec_size.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.getcwd())
+
+from hdcd.geo import county_table, state_dimension
+from hdcd.minimize import minimize_chart
+from hdcd.plot import plot_corr, plot_corr_matrix, plot_geomap
+from hdcd.plot import plot_geomap_conditions, plot_longitudinal_change
+from benchmarks.synthetic import CONCEPTS, make_cdi
+
+
+def make_conditions_counts(n_years=10, seed=0):
+    """
+    Conditions counts per concept, county and year, formatted as
+    data_wrangling.AoU_conditions output.
+    """
+    rng = np.random.default_rng(seed)
+    counties = county_table()
+    abbr = counties['STATEFP'].astype(int).map(
+        state_dimension().set_index('state_fips')['state_abbr'])
+    index = pd.MultiIndex.from_product([CONCEPTS, range(len(counties)),
+                                        range(2010, 2010 + n_years)])
+    rows = index.to_frame(index=False, name=['standard_concept_name',
+                                             'county', 'year'])
+    position = rows.pop('county').to_numpy()
+    rows.insert(1, 'county', counties['NAME'].to_numpy()[position])
+    rows['state_abbr'] = abbr.to_numpy()[position]
+    rows['counts'] = rng.integers(1, 200, len(rows))
+    rows['id'] = counties['GEOID'].astype(int).to_numpy()[position]
+    rows['share'] = rows['counts'] / rows.groupby(
+        ['standard_concept_name', 'year'])['counts'].transform('sum')
+    rows['person_ids'] = 'person list placeholder'
+    return rows.reset_index()
+
+
+def main():
+    cdi = make_cdi()
+    conditions = make_conditions_counts()
+    print(f'CDI rows: {len(cdi):,}  conditions rows: {len(conditions):,}')
+    calls = [
+        ('plot_corr', lambda: plot_corr('Question 3', 'Question 4', 'Overall', cdi)),
+        ('plot_corr_matrix', lambda: plot_corr_matrix('Overall', cdi,
+                                                      datatype='Crude Prevalence')),
+        ('plot_geomap', lambda: plot_geomap('Question 3', 'Crude Prevalence',
+                                            'Overall', cdi)),
+        ('plot_longitudinal_change', lambda: plot_longitudinal_change(
+            'Question 3', 'Arkansas', 'Overall', cdi)),
+        ('plot_geomap_conditions', lambda: plot_geomap_conditions(conditions)),
+    ]
+    for name, plot in calls:
+        chart = plot()
+        start = time.perf_counter()
+        _, sizes = minimize_chart(chart)
+        seconds = time.perf_counter() - start
+        print(f"{name:26s} {sizes['before']:>11,} -> {sizes['after']:>11,} bytes "
+              f"({sizes['after'] / sizes['before']:4.0%})  {seconds:6.2f} s")
+
+
+if __name__ == '__main__':
+    main()
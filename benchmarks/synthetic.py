@@ -0,0 +1,243 @@
+"""
+This Python script builds synthetic All of Us style datasets and
+reference files for the benchmarks in this folder.
+    * make_observations: observation data with postal codes
+    * make_conditions: condition data
+    * make_reference_files: counties geoJSON and county ZIP codes csv
+    * make_county_shapes: counties with detailed, shared borders
+    * make_cdi: long-format chronic disease index (CDI) data
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from hdcd.geo import STATES
+
+CONCEPTS = ['Essential hypertension',
+            'Type 2 diabetes mellitus',
+            'Hyperlipidemia',
+            'Major depressive disorder',
+            'Generalized anxiety disorder',
+            'Chronic obstructive lung disease',
+            'Asthma',
+            'Congestive heart failure']
+
+
+def _stamps(rng, n_rows):
+    stamps = pd.date_range('2010-01-01', periods=5000, freq='D')
+    return stamps[rng.integers(0, len(stamps), n_rows)].strftime('%Y/%-m/%-d %H:%M')
+
+
+def make_observations(n_rows, n_person=None, seed=0):
+    """
+    Build a synthetic observation dataset where about half of the rows
+    are postal code observations.
+
+    Args:
+        n_rows (int): number of observation rows
+        n_person (int): number of participants, defaults to n_rows
+        seed (int): random seed
+
+    Return:
+        observations_df (DataFrame): synthetic observation data
+    """
+    rng = np.random.default_rng(seed)
+    n_person = n_person or n_rows
+    concepts = np.array(['Postal code [Location]', 'Homelessness'])
+    zips = np.array([f'{z:03d}**' for z in range(10, 1000)])
+    observations_df = pd.DataFrame({
+        'person_id': rng.integers(0, n_person, n_rows),
+        'standard_concept_name': concepts[rng.integers(0, 2, n_rows)],
+        'value_as_string': zips[rng.integers(0, len(zips), n_rows)],
+        'observation_datetime': _stamps(rng, n_rows),
+        })
+
+    return observations_df
+
+
+def make_conditions(n_rows, n_person, seed=0):
+    """
+    Build a synthetic condition dataset over CONCEPTS with skewed
+    concept frequencies.
+
+    Args:
+        n_rows (int): number of condition rows
+        n_person (int): number of participants
+        seed (int): random seed
+
+    Return:
+        conditions_df (DataFrame): synthetic condition data
+    """
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, len(CONCEPTS) + 1)
+    concepts = rng.choice(CONCEPTS, n_rows, p=weights / weights.sum())
+    conditions_df = pd.DataFrame({
+        'person_id': rng.integers(0, n_person, n_rows),
+        'standard_concept_name': concepts,
+        'condition_start_datetime': _stamps(rng, n_rows),
+        })
+
+    return conditions_df
+
+
+def make_reference_files(directory, n_counties=3000, seed=0):
+    """
+    Write a synthetic counties geoJSON and county ZIP codes csv with the
+    same columns as the recommended reference files.
+
+    Args:
+        directory (str): output directory
+        n_counties (int): number of counties
+        seed (int): random seed
+
+    Return:
+        geo_df, county_df (str): paths of the geoJSON and csv files
+    """
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    rng = np.random.default_rng(seed)
+    states = pd.DataFrame(STATES, columns=['state', 'state_abbr', 'state_fips'])
+    state = rng.integers(0, len(states), n_counties)
+    state_fips = states['state_fips'].to_numpy()[state]
+    county_fips = np.arange(n_counties) % 999 + 1
+    names = np.array([f'County {i % 1900}' for i in range(n_counties)])
+    geoid = [f'{s:02d}{c:03d}' for s, c in zip(state_fips, county_fips)]
+
+    counties = gpd.GeoDataFrame({
+        'STATEFP': [x[:2] for x in geoid],
+        'COUNTYFP': [x[2:] for x in geoid],
+        'AFFGEOID': ['0500000US' + x for x in geoid],
+        'GEOID': geoid,
+        'NAME': names,
+        'LSAD': '06',
+        'geometry': [box(-120 + i % 60, 25 + i // 60 % 25,
+                         -119.1 + i % 60, 25.9 + i // 60 % 25)
+                     for i in range(n_counties)],
+        }, crs='EPSG:4326')
+
+    # about 13 5-digit ZIP codes per county
+    n_zip = n_counties * 13
+    county = rng.integers(0, n_counties, n_zip)
+    counties_zip = pd.DataFrame({
+        'state_fips': state_fips[county],
+        'state': states['state'].to_numpy()[state[county]],
+        'state_abbr': states['state_abbr'].to_numpy()[state[county]],
+        'zipcode': rng.integers(1000, 99999, n_zip),
+        'county': names[county],
+        'city': 'City',
+        })
+
+    geo_df = os.path.join(directory, 'counties.geojson')
+    county_df = os.path.join(directory, 'geo-data.csv')
+    counties.to_file(geo_df, driver='GeoJSON')
+    counties_zip.to_csv(county_df, index=False)
+
+    return geo_df, county_df
+
+
+def make_county_shapes(n_columns=60, n_rows=50, vertices=100, seed=0):
+    """
+    Build a grid of counties whose borders are noisy polylines with
+    @vertices points per side, shared exactly by neighbouring counties
+    like in the census cartographic boundary files.
+
+    Args:
+        n_columns, n_rows (int): grid size, n_columns * n_rows counties
+        vertices (int): points per county side
+        seed (int): random seed
+
+    Return:
+        counties (GeoDataFrame): 'GEOID' and polygon 'geometry'
+    """
+    import geopandas as gpd
+    from shapely.geometry import Polygon
+
+    rng = np.random.default_rng(seed)
+    width, height = 58 / n_columns, 24 / n_rows
+    t = np.linspace(0, 1, vertices + 1)
+
+    def edge(x0, y0, x1, y1, noisy):
+        x, y = x0 + (x1 - x0) * t, y0 + (y1 - y0) * t
+        if noisy:
+            # random walk pinned to zero at both ends
+            wiggle = np.cumsum(rng.normal(0, 0.005, len(t)))
+            wiggle -= wiggle[0] + (wiggle[-1] - wiggle[0]) * t
+            wiggle *= np.sin(np.pi * t)
+            x, y = x + wiggle * (y1 - y0), y + wiggle * (x1 - x0)
+        return np.stack([x, y], axis=1)
+
+    x = -125 + width * np.arange(n_columns + 1)
+    y = 25 + height * np.arange(n_rows + 1)
+    # horizontal[i][j] from (x[j], y[i]) to (x[j + 1], y[i])
+    horizontal = [[edge(x[j], y[i], x[j + 1], y[i], 0 < i < n_rows)
+                   for j in range(n_columns)] for i in range(n_rows + 1)]
+    # vertical[i][j] from (x[j], y[i]) to (x[j], y[i + 1])
+    vertical = [[edge(x[j], y[i], x[j], y[i + 1], 0 < j < n_columns)
+                 for j in range(n_columns + 1)] for i in range(n_rows)]
+
+    geometry = []
+    for i in range(n_rows):
+        for j in range(n_columns):
+            ring = np.concatenate([horizontal[i][j][:-1],
+                                   vertical[i][j + 1][:-1],
+                                   horizontal[i + 1][j][::-1][:-1],
+                                   vertical[i][j][::-1][:-1]])
+            geometry.append(Polygon(ring))
+
+    counties = gpd.GeoDataFrame({
+        'GEOID': [f'{i:05d}' for i in range(1, len(geometry) + 1)],
+        'geometry': geometry,
+        }, crs='EPSG:4326')
+
+    return counties
+
+
+def make_cdi(n_questions=200, n_years=10, seed=0):
+    """
+    Build a synthetic long-format CDI dataset with one row per question,
+    state, year, stratification and data value type, about 1.3 million
+    rows with the defaults like the CDC file.
+
+    Args:
+        n_questions (int): number of questions
+        n_years (int): number of years from 2010
+        seed (int): random seed
+
+    Return:
+        cdi (DataFrame): synthetic CDI data
+    """
+    rng = np.random.default_rng(seed)
+    locations = [(x[1], x[0]) for x in STATES] + [('US', 'United States')]
+    stratifications = [('Overall', 'Overall'), ('Gender', 'Male'),
+                       ('Gender', 'Female'), ('Race/Ethnicity', 'White'),
+                       ('Race/Ethnicity', 'Black'), ('Race/Ethnicity', 'Hispanic')]
+    datatypes = ['Crude Prevalence', 'Age-adjusted Prevalence']
+
+    index = pd.MultiIndex.from_product([range(n_questions), range(len(locations)),
+                                        range(2010, 2010 + n_years),
+                                        range(len(stratifications)),
+                                        range(len(datatypes))])
+    question, location, year, stratification, datatype = \
+        [index.get_level_values(i).to_numpy() for i in range(5)]
+    locations = np.array(locations, dtype=object)
+    stratifications = np.array(stratifications, dtype=object)
+    value = rng.gamma(4, 5, len(index)).round(1)
+
+    cdi = pd.DataFrame({
+        'YearStart': year,
+        'YearEnd': year,
+        'LocationAbbr': locations[location, 0],
+        'LocationDesc': locations[location, 1],
+        'Topic': np.array([f'Topic {i % 17}' for i in range(n_questions)])[question],
+        'Question': np.array([f'Question {i}' for i in range(n_questions)])[question],
+        'DataValue': value,
+        'DataValueType': np.array(datatypes, dtype=object)[datatype],
+        'LowConfidenceLimit': (value * 0.9).round(1),
+        'HighConfidenceLimit': (value * 1.1).round(1),
+        'StratificationCategory1': stratifications[stratification, 0],
+        'Stratification1': stratifications[stratification, 1],
+        })
+
+    return cdi
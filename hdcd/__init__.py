@@ -1,7 +1,15 @@
+__version__="1.0"
+
 from .plot import *
 from .summary import *
+from .store import CDIStore
+from .chart_data import enable_shared_data
+from .render import render_charts
+from .spec_cache import SpecCache, cached_spec
+from .minimize import minimize_chart
 
-__version__="1.0"
 __all__ = ["plot_geomap","plot_corr","plot_longitudinal_change",
-           "data_summary","variable_summary",
+           "data_summary","variable_summary","CDIStore",
+           "enable_shared_data", "render_charts", "SpecCache", "cached_spec",
+           "minimize_chart",
            ]
@@ -0,0 +1,69 @@
+"""
+This Python script builds the geo assets bundled with hdcd from the US
+Census Bureau 2016 cartographic boundary county file
+(cb_2016_us_county_500k, public domain):
+    * us-states.topo.json.gz: states (dissolved from the counties) as
+      TopoJSON, object 'states', ids are state FIPS codes
+    * us-counties.topo.json.gz: counties as TopoJSON, object 'counties',
+      ids are county FIPS codes (GEOID)
+    * us-counties.csv: county FIPS table with 'GEOID', 'STATEFP' and
+      'NAME', the columns of the counties geoshapes
+
+Only the states of hdcd.geo.STATES (50 states, DC and Puerto Rico) are
+kept. Shapes are simplified at the 'national' level of
+hdcd.topology.LEVELS, like the geomaps built from the counties geoJSON.
+
+The shapefile ships e.g. with the plotly-geo package
+(_plotly_geo/package_data). Run from the repository root with:
+    python hdcd/assets/build_assets.py path/to/cb_2016_us_county_500k.shp
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+
+import geopandas as gpd
+
+sys.path.append(os.getcwd())
+
+from hdcd.geo import ASSETS_DIR, STATES
+from hdcd.topology import to_topojson
+
+
+def write_topojson(geodataframe, object_name, file_name):
+    """
+    Write the national level TopoJSON of @geodataframe, gzipped.
+    """
+    topology = to_topojson(geodataframe, 'national', object_name, 'GEOID')
+    path = os.path.join(ASSETS_DIR, file_name)
+    # mtime=0 so that rebuilding unchanged shapes gives identical files
+    with gzip.GzipFile(path, 'wb', mtime=0) as f:
+        f.write(json.dumps(topology, separators=(',', ':')).encode())
+    print(f'{path}: {os.path.getsize(path) / 1e3:.1f} kB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='build the hdcd geo assets')
+    parser.add_argument('counties', help='cb_2016_us_county_500k shapefile')
+    args = parser.parse_args()
+
+    fips = {f'{x[2]:02d}' for x in STATES}
+    # the attribute table is UTF-8, which not every copy declares
+    counties = gpd.read_file(args.counties, encoding='utf-8')
+    counties = counties[counties['STATEFP'].isin(fips)]
+    counties = counties.sort_values('GEOID').reset_index(drop=True)
+
+    states = counties[['STATEFP', 'geometry']].dissolve('STATEFP').reset_index()
+    states = states.rename(columns={'STATEFP': 'GEOID'})
+
+    write_topojson(states, 'states', 'us-states.topo.json.gz')
+    write_topojson(counties, 'counties', 'us-counties.topo.json.gz')
+
+    path = os.path.join(ASSETS_DIR, 'us-counties.csv')
+    counties[['GEOID', 'STATEFP', 'NAME']].to_csv(path, index=False)
+    print(f'{path}: {os.path.getsize(path) / 1e3:.1f} kB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""
+This Python script defines a local on-disk cache for the reference
+files shared by the data wrangling and plotting modules:
+    * the US counties geoJSON (geoshapes)
+    * the US county and ZIP code csv
+
+Each source is downloaded once, keyed by its URL (or local path) and the
+SHA-256 hash of its content, and stored in a fast binary format
+(GeoParquet for geoshapes, Feather for tables). Later reads come from
+disk, and repeated reads within one process come from memory.
+
+The ReferenceCache class consists of functions:
+    * read_geoshapes
+    * read_csv
+    * refresh
+    * clear
+
+The cache directory defaults to ~/.cache/hdcd and can be changed with the
+environment variable HDCD_CACHE_DIR. Setting HDCD_OFFLINE=1 (or passing
+offline=True) never touches the network and only serves cached sources.
+
+This script requires `pandas` and `geopandas`. `pyarrow` is used for the
+binary formats when installed, otherwise frames are pickled.
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import urllib.request
+from datetime import datetime, timezone
+
+import pandas as pd
+import geopandas as gpd
+
+__all__ = ['ReferenceCache', 'get_cache', 'read_geoshapes', 'read_csv']
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'hdcd')
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ReferenceCache():
+    """
+    This class stores reference files on local disk, keyed by source URL
+    and content hash, and serves them back as (Geo)DataFrames.
+    """
+    def __init__(self, cache_dir=None, offline=None):
+        """
+        This function initializes objects to be passed in the class.
+
+        Args:
+            cache_dir (str): directory for cached files, defaults to
+                HDCD_CACHE_DIR or ~/.cache/hdcd
+            offline (bool): if True, never download and only serve
+                sources already in the cache, defaults to HDCD_OFFLINE
+        """
+        if cache_dir is None:
+            cache_dir = os.environ.get('HDCD_CACHE_DIR', CACHE_DIR)
+        if offline is None:
+            offline = os.environ.get('HDCD_OFFLINE', '0') not in ('', '0')
+
+        self.cache_dir = cache_dir
+        self.offline = bool(offline)
+        self._memory = {}
+
+    @property
+    def index_path(self):
+        return os.path.join(self.cache_dir, 'index.json')
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path) as f:
+            return json.load(f)
+
+    def _save_index(self, index):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.index_path)
+
+    @staticmethod
+    def _key(source, kind):
+        """
+        Build the index key of a source. Local files also key on their
+        modification time and size so edits invalidate the entry.
+        """
+        key = f'{kind}:{source}'
+        if os.path.isfile(source):
+            stat = os.stat(source)
+            key += f':{stat.st_mtime_ns}:{stat.st_size}'
+        return key
+
+    def _fetch(self, source):
+        """
+        Read the raw bytes of a source from a URL or a local path.
+        """
+        if not isinstance(source, str) or source == '':
+            raise ValueError('source must be a non-empty string to a URL \
+or a local file')
+
+        if self.offline and not os.path.isfile(source):
+            raise ValueError(f'"{source}" is not in the reference cache \
+and offline mode is enabled')
+
+        try:
+            if os.path.isfile(source):
+                with open(source, 'rb') as f:
+                    return f.read()
+            with urllib.request.urlopen(source) as response:
+                return response.read()
+        except OSError as e:
+            raise ValueError(f'could not load "{source}": {e}') from e
+
+    def _write(self, frame, digest, kind):
+        """
+        Write a parsed frame to disk and return its file name.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        frame = frame.reset_index(drop=True)
+
+        if _has_pyarrow():
+            if kind == 'geoshapes':
+                file_name = f'{digest}.parquet'
+                frame.to_parquet(os.path.join(self.cache_dir, file_name))
+            else:
+                file_name = f'{digest}.feather'
+                frame.to_feather(os.path.join(self.cache_dir, file_name))
+        else:
+            file_name = f'{digest}.{kind}.pkl'
+            frame.to_pickle(os.path.join(self.cache_dir, file_name))
+
+        return file_name
+
+    def _read(self, file_name):
+        path = os.path.join(self.cache_dir, file_name)
+        if file_name.endswith('.parquet'):
+            return gpd.read_parquet(path)
+        if file_name.endswith('.feather'):
+            return pd.read_feather(path)
+        return pd.read_pickle(path)
+
+    def _load(self, source, kind, parse, refresh=False):
+        """
+        Serve a source from memory, then disk, then the network.
+        """
+        key = self._key(source, kind) if isinstance(source, str) else None
+
+        if not refresh and key in self._memory:
+            return self._memory[key].copy()
+
+        index = self._load_index()
+        entry = index.get(key)
+        if not refresh and entry is not None and \
+            os.path.exists(os.path.join(self.cache_dir, entry['file'])):
+            frame = self._read(entry['file'])
+        else:
+            raw = self._fetch(source)
+            digest = hashlib.sha256(raw).hexdigest()
+            file_name = None
+            # identical content is stored once, whatever its URL
+            for other in index.values():
+                if other['sha256'] == digest and other['kind'] == kind and \
+                    os.path.exists(os.path.join(self.cache_dir, other['file'])):
+                    file_name = other['file']
+                    break
+
+            if file_name is None:
+                frame = parse(raw)
+                file_name = self._write(frame, digest[:32], kind)
+            frame = self._read(file_name)
+
+            index[key] = {'source': source,
+                          'kind': kind,
+                          'sha256': digest,
+                          'file': file_name,
+                          'fetched': datetime.now(timezone.utc).isoformat()}
+            self._save_index(index)
+
+        self._memory[key] = frame
+        return frame.copy()
+
+    def read_geoshapes(self, source, refresh=False):
+        """
+        Load a geoshapes file (e.g. counties geoJSON) through the cache.
+
+        Args:
+            source (str): URL or path of the geoshapes file
+            refresh (bool): re-download the source even if cached
+
+        Return:
+            counties (GeoDataFrame): parsed geoshapes
+        """
+        return self._load(source, 'geoshapes',
+                          lambda raw: gpd.read_file(io.BytesIO(raw)),
+                          refresh=refresh)
+
+    def read_csv(self, source, refresh=False):
+        """
+        Load a csv file (e.g. US county ZIP codes) through the cache.
+
+        Args:
+            source (str): URL or path of the csv file
+            refresh (bool): re-download the source even if cached
+
+        Return:
+            table (DataFrame): parsed csv
+        """
+        return self._load(source, 'csv',
+                          lambda raw: pd.read_csv(io.BytesIO(raw)),
+                          refresh=refresh)
+
+    def refresh(self, source):
+        """
+        Re-download every cached kind of a source. Content that did not
+        change keeps its existing file.
+        """
+        index = self._load_index()
+        for entry in list(index.values()):
+            if entry['source'] != source:
+                continue
+            if entry['kind'] == 'geoshapes':
+                self.read_geoshapes(source, refresh=True)
+            else:
+                self.read_csv(source, refresh=True)
+
+    def clear(self):
+        """
+        Remove all cached files, derived TopoJSON and chart specs, and the
+        in-memory copies.
+        """
+        self._memory.clear()
+        for derived in ['topojson', 'specs']:
+            shutil.rmtree(os.path.join(self.cache_dir, derived), ignore_errors=True)
+        index = self._load_index()
+        for entry in index.values():
+            path = os.path.join(self.cache_dir, entry['file'])
+            if os.path.exists(path):
+                os.remove(path)
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+
+
+_default_cache = None
+
+
+def get_cache():
+    """
+    Return the process-wide ReferenceCache, creating it on first use.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ReferenceCache()
+    return _default_cache
+
+
+def read_geoshapes(source, cache=None):
+    """
+    Load a geoshapes file through @cache or the process-wide cache.
+    """
+    return (cache or get_cache()).read_geoshapes(source)
+
+
+def read_csv(source, cache=None):
+    """
+    Load a csv file through @cache or the process-wide cache.
+    """
+    return (cache or get_cache()).read_csv(source)
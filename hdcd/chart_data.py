@@ -0,0 +1,236 @@
+"""
+This Python script defines the hdcd Altair data transformer, which stores
+chart data outside of the Vega-Lite spec:
+    * shared_data: write a dataset once, content-addressed, and reference
+      it by URL
+    * enable_shared_data: make shared_data the active Altair data
+      transformer
+    * within_max_rows: inline the chart data over Altair's max rows limit
+
+Each distinct dataset is written once to @data_dir as compact JSON (or
+CSV), named by the SHA-256 hash of its content. Charts built from
+the same data reference the same file, and a dataset that is already on
+disk is not serialized again: its name is derived from a hash of the
+frame (pd.util.hash_pandas_object), which is much cheaper than JSON.
+
+The transformer is registered as 'hdcd' when hdcd is imported:
+    alt.data_transformers.enable('hdcd', data_dir='charts/data')
+
+CSV files store each column name once instead of once per row, and carry
+an explicit Vega-Lite parse directive so numbers, booleans and dates keep
+their types. Vega-Lite only accepts json, csv, tsv, dsv and topojson data
+formats, so Arrow files cannot be referenced from a spec. Geoshapes are
+always written as GeoJSON.
+
+Altair's default transformer raises MaxRowsError for data over 5000 rows
+when the chart is serialized, long after the plot function returned. Rather
+than lifting the limit for the whole process, within_max_rows serializes
+such DataFrames of a chart to inline JSON strings, which the transformers
+pass through and Vega parses with the json format.
+
+This script requires `pandas` and `altair`.
+"""
+import hashlib
+import json
+import os
+
+import pandas as pd
+import altair as alt
+from altair.utils.data import sanitize_dataframe, sanitize_geo_interface
+
+__all__ = ['shared_data', 'enable_shared_data', 'FORMATS']
+
+FORMATS = ('json', 'csv')
+DATA_DIR = 'hdcd_data'
+# max_rows of Altair's default data transformer
+DEFAULT_MAX_ROWS = 5000
+# sub-charts of compound charts
+CHART_LISTS = ('layer', 'hconcat', 'vconcat', 'concat')
+
+# content hash of frames already written, keyed by their fingerprint
+_written = {}
+
+
+def _fingerprint(data):
+    """
+    Cheap hash of a (Geo)DataFrame: column names, dtypes, row hashes and
+    geometries as WKB. None if a column cannot be hashed (e.g. lists).
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(x) for x in data.columns],
+                              [str(x) for x in data.dtypes]]).encode())
+    geometry = getattr(data, '_geometry_column_name', None)
+    columns = [x for x in data.columns if x != geometry]
+    try:
+        rows = pd.util.hash_pandas_object(data[columns], index=False)
+    except TypeError:
+        return None
+    digest.update(rows.to_numpy().tobytes())
+    if geometry is not None:
+        import shapely
+        for wkb in shapely.to_wkb(data[geometry].to_numpy()):
+            digest.update(wkb or b'')
+    return digest.hexdigest()
+
+
+def _serialize(data, format):
+    """
+    Return the bytes, file extension and Vega-Lite format of a dataset.
+    """
+    if hasattr(data, '__geo_interface__'):
+        if isinstance(data, pd.DataFrame):
+            data = sanitize_dataframe(data)
+        # features with their properties flattened, as Altair inlines them
+        values = sanitize_geo_interface(data.__geo_interface__)
+        return (json.dumps(values, separators=(',', ':')).encode(), 'json',
+                {'type': 'json'})
+
+    if isinstance(data, dict):
+        if 'values' not in data:
+            raise KeyError('values expected in data dict, but not present.')
+        # keep the format of e.g. TopoJSON, and raw values as they are
+        values = data['values']
+        if isinstance(values, str):
+            raw = values.encode()
+        else:
+            raw = json.dumps(values, separators=(',', ':'), sort_keys=True).encode()
+        return raw, 'json', data.get('format', {'type': 'json'})
+
+    if format == 'csv':
+        parse = {}
+        for column, dtype in data.dtypes.items():
+            if pd.api.types.is_bool_dtype(dtype):
+                parse[str(column)] = 'boolean'
+            elif pd.api.types.is_numeric_dtype(dtype):
+                parse[str(column)] = 'number'
+            elif pd.api.types.is_datetime64_any_dtype(dtype):
+                parse[str(column)] = 'date'
+        data = sanitize_dataframe(data)
+        return (data.to_csv(index=False).encode(), 'csv',
+                {'type': 'csv', 'parse': parse})
+
+    data = sanitize_dataframe(data)
+    return (data.to_json(orient='records', double_precision=15).encode(),
+            'json', {'type': 'json'})
+
+
+def shared_data(data, data_dir=DATA_DIR, url_path=None, format='json'):
+    """
+    Altair data transformer that writes @data once to @data_dir, named by
+        the SHA-256 hash of its content, and returns a URL data model.
+
+    Args:
+        data (DataFrame, GeoDataFrame or dict): chart data
+        data_dir (str): directory for the data files, created if missing
+        url_path (str): URL prefix of @data_dir as seen by the renderer,
+            defaults to @data_dir
+        format (str): 'json' or 'csv' for DataFrames
+
+    Return:
+        data (dict): {'url': ..., 'format': ...}
+    """
+    if format not in FORMATS:
+        raise ValueError(f'"format" must be one of {list(FORMATS)}')
+    if url_path is None:
+        url_path = data_dir
+
+    fingerprint = None
+    if isinstance(data, pd.DataFrame):
+        fingerprint = _fingerprint(data)
+        key = (fingerprint, format, os.path.abspath(data_dir))
+        entry = _written.get(key)
+        if fingerprint is not None and entry is not None and \
+            os.path.exists(os.path.join(data_dir, entry[0])):
+            file_name, data_format = entry
+            return {'url': f'{url_path}/{file_name}', 'format': data_format}
+
+    raw, extension, data_format = _serialize(data, format)
+    file_name = f'hdcd-data-{hashlib.sha256(raw).hexdigest()[:32]}.{extension}'
+    path = os.path.join(data_dir, file_name)
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp_path, path)
+
+    if fingerprint is not None:
+        _written[key] = (file_name, data_format)
+
+    return {'url': f'{url_path}/{file_name}', 'format': data_format}
+
+
+def enable_shared_data(data_dir=DATA_DIR, url_path=None, format='json'):
+    """
+    Make shared_data the active Altair data transformer. Can be used as a
+        context manager to restore the previous transformer on exit.
+
+    Return:
+        enabler (PluginEnabler): from alt.data_transformers.enable
+    """
+    if format not in FORMATS:
+        raise ValueError(f'"format" must be one of {list(FORMATS)}')
+    return alt.data_transformers.enable('hdcd', data_dir=data_dir,
+                                        url_path=url_path, format=format)
+
+
+def _inline_json(data):
+    """
+    Inline Vega-Lite data of a (Geo)DataFrame as a JSON string.
+    """
+    raw, _, data_format = _serialize(data, 'json')
+    return {'values': raw.decode(), 'format': data_format}
+
+
+def _inline_over(chart, max_rows):
+    """
+    Inline the DataFrames of @chart, its lookups and sub-charts with more
+        than @max_rows rows, in place.
+    """
+    data = chart._get('data')
+    if isinstance(data, pd.DataFrame) and len(data) > max_rows:
+        chart.data = _inline_json(data)
+
+    transforms = chart._get('transform')
+    for transform in (transforms if isinstance(transforms, list) else []):
+        lookup = transform._get('from') \
+            if isinstance(transform, alt.LookupTransform) else alt.Undefined
+        if lookup is alt.Undefined:
+            continue
+        data = lookup._get('data')
+        if isinstance(data, pd.DataFrame) and len(data) > max_rows:
+            lookup.data = _inline_json(data)
+
+    for attr in CHART_LISTS:
+        subcharts = chart._get(attr)
+        for subchart in (subcharts if isinstance(subcharts, list) else []):
+            if isinstance(subchart, alt.SchemaBase):
+                _inline_over(subchart, max_rows)
+    spec = chart._get('spec')
+    if isinstance(spec, alt.SchemaBase):
+        _inline_over(spec, max_rows)
+    return chart
+
+
+def within_max_rows(chart):
+    """
+    Make @chart serializable under the active data transformer's max rows
+        limit without changing it: DataFrames over the limit are inlined
+        as JSON strings. Charts are returned unchanged with other
+        transformers, e.g. 'hdcd', or if the limit is disabled.
+
+    Args:
+        chart (alt.TopLevelMixin): chart, modified in place
+
+    Return:
+        chart (alt.TopLevelMixin): the chart
+    """
+    if alt.data_transformers.active != 'default':
+        return chart
+    max_rows = alt.data_transformers.options.get('max_rows', DEFAULT_MAX_ROWS)
+    if max_rows is None:
+        return chart
+    return _inline_over(chart, max_rows)
+
+
+alt.data_transformers.register('hdcd', shared_data)
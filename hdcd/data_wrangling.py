@@ -15,36 +15,1247 @@ The AoU_socioeconomic class accepts Pandas DataFrames, csv files, and
     * zip_socioeconomic
     * merge_county_socioeconomic
 
-The AoU_conditions class accepts Pandas DataFrames and csv files.
-    The class consists of functions:
+The AoU_conditions class accepts Pandas DataFrames, csv files, and
+    Parquet/Arrow files or datasets. The class consists of functions:
     * load_counties_zip
+    * load_zip3_crosswalk
+    * load_county_dimension
     * threshold_conditions
     * observation_zip
     * merge_conditions_observation
     * groupby_count
+    * counties_groupby_count_stream: chunked version of groupby_count
+        that also accepts csv paths or iterators of DataFrame chunks
+    * counties_groupby_count_append: folds a new data release into a
+        CountyCountState and returns the updated counts
+
+With memoize=True, both classes keep the output of each stage on the
+    instance, keyed by the stage arguments, the settings that change
+    stage outputs (e.g. engine, cache, compact) and the identity of the
+    instance inputs (for example conditions_df). A stage is recomputed
+    when one of its inputs is reassigned, when a setting changes, when
+    one of the stages it used was recomputed, or after invalidate().
+    Cached frames are returned as copies, so editing a returned frame
+    does not change the cache. stage_graph() shows the stages, their
+    dependencies and how often each was computed or reused. Memoization
+    is off by default, as it keeps every intermediate frame in memory.
+
+Both classes accept engine='duckdb' (requires the optional `duckdb`
+    package) to run the joins, deduplication and groupby of
+    merge_conditions_observation, counties_groupby_count and
+    merge_county_socioeconomic as SQL in an embedded DuckDB database,
+    using all cores and spilling to a temporary directory. The output
+    is the same as with the default engine='pandas'.
+
+AoU_socioeconomic.merge_county_socioeconomic joins ZIP codes to counties
+    and reduces the socioeconomic data to one row per county ('first',
+    'mean' or 'weighted_mean') on attribute tables, and attaches the
+    county geometries once at the end.
+
+The compact_dtypes function converts long repeated string columns to
+    categoricals and downcasts integer columns.
+    AoU_conditions(compact=True) applies it at ingest.
+
+The read_dataset function reads only the needed columns of a DataFrame,
+    Parquet/Arrow dataset or file and pushes row filters (e.g. the
+    postal code observations) down to the Parquet reader.
+
+The parse_datetimes function parses timestamps with an explicit (given
+    or detected) format once per unique value, and datetime_parts
+    extracts compact int16 year and int8 month columns.
+
+The ConceptFrequencyIndex class counts condition records per concept
+    once per dataset and selects concepts by count threshold or top-N.
+
+The CountyCountState class keeps the participant-level pairs behind the
+    county counts so that a new release is added without recounting the
+    history: the new data is matched against sorted runs of the state by
+    binary search, only the counts it touches are updated, and the runs
+    are merged geometrically, so an update costs time proportional to
+    the new data (times the log of the history). It can be saved
+    to and loaded from a .npz file.
 
 This script can be imported as a module for the classes listed above.
 """
+import functools
+import inspect
 import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 
 import numpy as np
 import pandas as pd
 import geopandas as  gpd
 
+from .cache import get_cache
+from .geo import county_dimension, county_ids
+
 # recommended geoshapes file and ZIP codes for US counties file
 geo_df = 'https://gist.githubusercontent.com/sdwfrost/d1c73f91dd9d175998ed166eb\
 216994a/raw/e89c35f308cee7e2e5a784e1d3afc5d449e9e4bb/counties.geojson'
 county_df = 'https://raw.githubusercontent.com/scpike/us-state-county-zip/\
 master/geo-data.csv'
 
-class AoU_socioeconomic():
+# minimum number of condition records for a concept to be visualized
+CONCEPT_THRESHOLD = 100000
+POSTAL_CODE = 'Postal code [Location]'
+
+# long, heavily repeated string columns of the AoU and CDI data
+COMPACT_STRING_COLUMNS = ['standard_concept_name',
+                          'county',
+                          'state',
+                          'state_abbr',
+                          'city',
+                          'value_as_string',
+                          'Question',
+                          'LocationDesc']
+COMPACT_INT_COLUMNS = ['person_id', 'year', 'month', 'zip3', 'zipcode',
+                       'state_fips']
+
+ENGINES = ('pandas', 'duckdb')
+
+# reducers of the socioeconomic rows of the 3-digit ZIP codes of a county
+REDUCERS = ('first', 'mean', 'weighted_mean')
+# reducers of the socioeconomic observations of a 3-digit ZIP code
+SNAPSHOTS = ('latest', 'mean', 'median')
+
+# explicit timestamp formats tried in order, the first one being the
+# All of Us export format (e.g. '2011/9/23 16:00')
+DATETIME_FORMATS = ['%Y/%m/%d %H:%M',
+                    '%Y/%m/%d %H:%M:%S',
+                    '%Y/%m/%d',
+                    '%Y-%m-%d %H:%M:%S',
+                    '%Y-%m-%d %H:%M',
+                    '%Y-%m-%dT%H:%M:%S',
+                    '%Y-%m-%d',
+                    '%m/%d/%Y %H:%M',
+                    '%m/%d/%Y']
+
+
+def compact_dtypes(df, string_columns=None, int_columns=None):
+    """
+    Convert repeated string columns to categoricals and downcast integer
+        columns to the smallest integer type. Categoricals keep their codes
+        through merges and groupbys; Arrow strings do not (pandas converts
+        them back to object), so they are not offered.
+
+    Args:
+        df (DataFrame): DataFrame to convert, not modified
+        string_columns (list): string columns to convert, defaults to
+            COMPACT_STRING_COLUMNS found in df
+        int_columns (list): integer columns to downcast, defaults to
+            COMPACT_INT_COLUMNS found in df
+
+    Return:
+        df (DataFrame): DataFrame with compact dtypes
+    """
+    if string_columns is None:
+        string_columns = [x for x in COMPACT_STRING_COLUMNS if x in df.columns]
+    if int_columns is None:
+        int_columns = [x for x in COMPACT_INT_COLUMNS if x in df.columns]
+
+    converted = {}
+    for column in string_columns:
+        if df[column].dtype != 'category':
+            converted[column] = df[column].astype('category')
+    for column in int_columns:
+        # nullable or float columns with missing values are left as is
+        if df[column].dtype.kind in 'iu':
+            converted[column] = pd.to_numeric(df[column], downcast='integer')
+
+    return df.assign(**converted) if converted else df
+
+
+def zip3_codes(zipcode):
+    """
+    Parse 3-digit ZIP codes with vectorized string operations. Numeric
+        5-digit ZIP codes are zero padded first (7001 -> 070) and masked
+        ZIP codes from All of Us ('981**') are sliced directly.
+
+    Args:
+        zipcode (Series): 5-digit or masked ZIP codes
+
+    Return:
+        zip3 (Series): nullable integer 3-digit ZIP codes
+    """
+    # ZIP codes repeat heavily, parse each unique value once
+    codes, uniques = pd.factorize(zipcode)
+    uniques = pd.Series(uniques)
+    if pd.api.types.is_numeric_dtype(uniques):
+        zip_str = uniques.astype('Int64').astype('string').str.zfill(5)
+    else:
+        zip_str = uniques.astype('string')
+
+    zip3 = pd.to_numeric(zip_str.str.slice(0, 3), errors='coerce').astype('Int64')
+
+    return pd.Series(zip3.array.take(codes, allow_fill=True),
+                     index=zipcode.index, name=zipcode.name)
+
+
+def detect_datetime_format(values, sample_size=100):
+    """
+    Detect the first format of DATETIME_FORMATS that parses a sample of
+        timestamps.
+
+    Args:
+        values (array-like): timestamp strings
+        sample_size (int): number of unique values to try
+
+    Return:
+        format (str): detected format, None if no format matches
+    """
+    sample = pd.unique(pd.Series(values).dropna())[:sample_size]
+    for format in DATETIME_FORMATS:
+        try:
+            pd.to_datetime(sample, format=format)
+        except (ValueError, TypeError):
+            continue
+        return format
+
+    return None
+
+
+def parse_datetimes(values, format=None):
+    """
+    Parse timestamps with an explicit format, once per unique value.
+        Timestamps repeat heavily (one per visit), so parsing the unique
+        values and broadcasting them back is much faster than parsing
+        every row and letting pandas infer the format.
+
+    Args:
+        values (Series): timestamp strings or datetimes
+        format (str): strftime format, detected with
+            detect_datetime_format if None
+
+    Return:
+        datetimes (Series): datetime64[ns] values with the index of values
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+
+    codes, uniques = pd.factorize(values)
+    if format is None:
+        format = detect_datetime_format(uniques)
+    try:
+        parsed = pd.to_datetime(uniques, format=format)
+    except (ValueError, TypeError):
+        # mixed formats, let pandas parse each unique value
+        parsed = pd.to_datetime(uniques, format='mixed')
+
+    # extra NaT slot for missing values (code -1)
+    parsed = np.append(parsed.to_numpy(dtype='datetime64[ns]'),
+                       np.datetime64('NaT', 'ns'))[codes]
+
+    return pd.Series(parsed, index=values.index, name=values.name)
+
+
+def datetime_parts(datetimes):
+    """
+    Extract year and month from datetimes with numpy datetime arithmetic.
+
+    Args:
+        datetimes (Series): datetime64 values
+
+    Return:
+        year (ndarray): int16 years, nullable Int16 if values are missing
+        month (ndarray): int8 months, nullable Int8 if values are missing
+    """
+    months = np.asarray(datetimes, dtype='datetime64[ns]').astype('datetime64[M]')
+    missing = np.isnat(months)
+    months = months.astype('int64')
+
+    year = (months // 12 + 1970).astype('int16')
+    month = (months % 12 + 1).astype('int8')
+    if missing.any():
+        year = pd.array(year, dtype='Int16')
+        year[missing] = pd.NA
+        month = pd.array(month, dtype='Int8')
+        month[missing] = pd.NA
+
+    return year, month
+
+
+def zip3_crosswalk(counties_zip):
+    """
+    Deduplicate county ZIP codes to one row per 3-digit ZIP code and
+        county, so that joining on 'zip3' does not fan out by the number
+        of 5-digit ZIP codes.
+
+    Args:
+        counties_zip (DataFrame): county ZIP codes with column 'zip3'
+
+    Return:
+        crosswalk (DataFrame): 3-digit ZIP code to county crosswalk
+    """
+    keys = ['zip3', 'state_fips', 'state', 'state_abbr', 'county']
+    keys = [x for x in keys if x in counties_zip.columns]
+
+    return counties_zip[keys].drop_duplicates(ignore_index=True)
+
+
+def _is_csv(source):
+    return isinstance(source, str) and source.lower().endswith(('.csv', '.csv.gz'))
+
+
+def _is_arrow(source):
+    return type(source).__module__.startswith('pyarrow')
+
+
+def _is_table_source(source):
+    """
+    True for the inputs accepted by read_dataset.
+    """
+    return isinstance(source, (pd.DataFrame, str, os.PathLike)) or _is_arrow(source)
+
+
+def _arrow_dataset(source):
+    """
+    Open a pyarrow Dataset over a Table, a Dataset or a Parquet or
+    Feather/Arrow path without reading any data.
+    """
+    if isinstance(source, str) and not os.path.exists(source):
+        raise ValueError(f'"{source}" does not exist')
+
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+    except ImportError as e:
+        raise ImportError('Parquet and Arrow inputs require the `pyarrow` \
+package, install it with `pip install pyarrow`') from e
+
+    if isinstance(source, ds.Dataset):
+        return source
+    if isinstance(source, pa.Table):
+        return ds.dataset(source)
+    if isinstance(source, str):
+        if source.lower().endswith(('.arrow', '.feather', '.ipc')):
+            return ds.dataset(source, format='ipc')
+        return ds.dataset(source, format='parquet')
+
+    raise ValueError('source must be a Pandas DataFrame, a pyarrow Table or \
+Dataset, or a path to a Parquet, Arrow or csv file')
+
+
+def _filters_mask(df, filters):
+    """
+    Boolean mask of the rows of @df matching all @filters.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for column, op, value in filters:
+        if op == '==':
+            mask &= (df[column] == value).to_numpy()
+        elif op == '!=':
+            mask &= (df[column] != value).to_numpy()
+        elif op == 'in':
+            mask &= df[column].isin(value).to_numpy()
+        elif op == 'not in':
+            mask &= ~df[column].isin(value).to_numpy()
+        else:
+            raise ValueError(f'unsupported filter operator "{op}"')
+
+    return mask
+
+
+def read_dataset(source, columns=None, filters=None):
+    """
+    Read the @columns of the rows matching @filters. Parquet and Arrow
+        sources only load the requested columns and push the filters
+        down to the reader, so row groups without matching rows are
+        skipped. csv files only parse the requested columns.
+
+    Args:
+        source (DataFrame, str or pyarrow Table/Dataset): data, or path to
+            a Parquet, Feather/Arrow or csv file or a Parquet directory
+        columns (list): columns to read, all columns if None
+        filters (list): (column, op, value) tuples combined with AND,
+            op is one of '==', '!=', 'in' and 'not in'
+
+    Return:
+        df (DataFrame): selected columns and rows
+    """
+    filters = list(filters or [])
+    if isinstance(source, os.PathLike):
+        source = os.fspath(source)
+
+    if isinstance(source, pd.DataFrame):
+        df = source
+    elif _is_csv(source):
+        usecols = None if columns is None else \
+                  list(dict.fromkeys(list(columns) + [x[0] for x in filters]))
+        df = pd.read_csv(source, usecols=usecols)
+    else:
+        dataset = _arrow_dataset(source)
+        expression = None
+        if filters:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            # an empty value set is typed like its column, pyarrow cannot
+            # match a null-typed set against a string column
+            filters = [(column, op, pa.array([], dataset.schema.field(column).type))
+                       if op in ('in', 'not in') and not len(value)
+                       else (column, op, value)
+                       for column, op, value in filters]
+            expression = pq.filters_to_expression(filters)
+        table = dataset.to_table(columns=None if columns is None else list(columns),
+                                 filter=expression)
+        return table.to_pandas()
+
+    if filters:
+        mask = _filters_mask(df, filters)
+        return df.loc[mask] if columns is None else df.loc[mask, list(columns)]
+
+    return df if columns is None else df[list(columns)]
+
+
+def _iter_chunks(source, chunksize, usecols):
+    """
+    Yield DataFrame chunks with columns @usecols from a csv, Parquet or
+    Arrow path, a pyarrow Table or Dataset, a DataFrame or an iterable
+    of DataFrames.
+    """
+    if isinstance(source, os.PathLike):
+        source = os.fspath(source)
+
+    if _is_csv(source):
+        yield from pd.read_csv(source, chunksize=chunksize, usecols=usecols)
+    elif isinstance(source, str) or _is_arrow(source):
+        for batch in _arrow_dataset(source).to_batches(columns=usecols,
+                                                       batch_size=chunksize):
+            yield batch.to_pandas()
+    elif isinstance(source, pd.DataFrame):
+        for start in range(0, len(source), chunksize):
+            yield source.iloc[start:start + chunksize][usecols]
+    else:
+        for chunk in source:
+            yield chunk[usecols]
+
+
+def _check_engine(engine):
+    if engine not in ENGINES:
+        raise ValueError(f'"engine" must be one of {ENGINES}')
+
+
+def _duckdb_connect():
+    """
+    Open an in-memory DuckDB connection that uses all cores and spills
+    to a temporary directory when the data does not fit in memory.
+    """
+    try:
+        import duckdb
+    except ImportError as e:
+        raise ImportError('engine="duckdb" requires the `duckdb` package, \
+install it with `pip install duckdb`') from e
+
+    return duckdb.connect(config={
+        'threads': os.cpu_count() or 1,
+        'temp_directory': os.path.join(tempfile.gettempdir(), 'hdcd_duckdb'),
+        })
+
+
+def _with_row(df):
+    """
+    Shallow copy of @df with its row position in column '_row', used to
+    reproduce the row order and keep-first semantics of pandas in SQL.
+    """
+    df = df.copy(deep=False)
+    df['_row'] = np.arange(len(df))
+    return df
+
+
+def _columns(columns, table=None, exclude=()):
+    """
+    Quoted SQL column list of @columns without @exclude.
+    """
+    prefix = f'{table}.' if table else ''
+    return ', '.join(f'{prefix}"{x}"' for x in columns if x not in exclude)
+
+
+def _restore_dtypes(df, sources, columns=None):
+    """
+    Cast columns of a DuckDB result back to their dtype in the first of
+    @sources that has them, so both engines return the same schema.
+    """
+    for column in (df.columns if columns is None else columns):
+        for source in sources:
+            if column in source.columns:
+                df[column] = df[column].astype(source[column].dtype)
+                break
+
+    return df
+
+
+def _share_arrays(arrays):
+    """
+    Copy numpy arrays into shared memory blocks.
+
+    Args:
+        arrays (dict): name -> 1-d numpy array
+
+    Return:
+        blocks (list): SharedMemory blocks to close and unlink
+        descriptors (dict): name -> (block name, dtype, length) to attach
+    """
+    blocks = []
+    descriptors = {}
+    for name, array in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+        blocks.append(block)
+        descriptors[name] = (block.name, array.dtype.str, len(array))
+
+    return blocks, descriptors
+
+
+def _read_shared(descriptors, ranges):
+    """
+    Attach the shared arrays of _share_arrays and copy out the row range
+        of each (all rows if no range is given). The blocks are closed
+        before returning.
+
+    Args:
+        descriptors (dict): name -> (block name, dtype, length)
+        ranges (dict): name -> (start, stop)
+
+    Return:
+        arrays (dict): name -> numpy array copy
+    """
+    arrays = {}
+    for name, (block_name, dtype, length) in descriptors.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        try:
+            shared = np.ndarray((length,), dtype=dtype, buffer=block.buf)
+            start, stop = ranges.get(name, (0, length))
+            arrays[name] = shared[start:stop].copy()
+            # release the buffer before closing the block
+            del shared
+        finally:
+            block.close()
+
+    return arrays
+
+
+def _partition_counts(descriptors, conditions_range, zip_range):
+    """
+    Join one participant partition to counties and count distinct
+        participants per concept, county and year. Rows of a partition
+        are the given slices of the shared arrays.
+
+    Return:
+        counts (DataFrame): codes of concept and county, year and counts
+    """
+    arrays = _read_shared(descriptors, {'person_id': conditions_range,
+                                        'concept': conditions_range,
+                                        'year': conditions_range,
+                                        'zip_person_id': zip_range,
+                                        'zip3': zip_range})
+
+    conditions = pd.DataFrame({'person_id': arrays['person_id'],
+                               'concept': arrays['concept'],
+                               'year': arrays['year']})
+    person_zip3 = pd.DataFrame({'person_id': arrays['zip_person_id'],
+                                'zip3': arrays['zip3']})
+    crosswalk = pd.DataFrame({'zip3': arrays['crosswalk_zip3'],
+                              'county': arrays['crosswalk_county']})
+
+    person_county = person_zip3.merge(crosswalk, on='zip3', how='inner')
+    person_county = person_county[['person_id', 'county']].drop_duplicates()
+    merged = conditions.merge(person_county, on='person_id', how='inner')
+
+    return merged.groupby(['concept', 'county', 'year'])['person_id'].nunique().reset_index()
+
+
+def _stage(*inputs):
+    """
+    Decorator for memoized stage methods of the wrangler classes.
+
+    Args:
+        inputs (str): names of the instance attributes the stage reads
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            params = tuple(bound.arguments.items())[1:]
+            return self._run_stage(method, inputs, params)
+
+        return wrapper
+    return decorator
+
+
+class _StageEntry():
+    """
+    Cached output of one stage call with the inputs and stages it used.
+    """
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.children = []
+        self.output = None
+
+
+class _StageCache():
+    """
+    Mixin that stores stage outputs on the instance, see _stage.
+    """
+    # instance attributes that change stage outputs, part of the stage key
+    _stage_settings = ()
+
+    def _stage_state(self):
+        if '_stages' not in self.__dict__:
+            self._stages = {}
+            self._stage_stack = []
+            self._stage_stats = {}
+        return self._stages
+
+    def _stage_valid(self, key, entry):
+        """
+        An entry is valid if its inputs were not reassigned and the
+            stages it used are still cached and valid.
+        """
+        if self._stages.get(key) is not entry:
+            return False
+        if any(getattr(self, name) is not value for name, value in entry.inputs):
+            return False
+        return all(self._stage_valid(child_key, child)
+                   for child_key, child in entry.children)
+
+    def _run_stage(self, method, inputs, params):
+        stages = self._stage_state()
+        memoize = getattr(self, 'memoize', False)
+        settings = tuple((name, getattr(self, name, None))
+                         for name in self._stage_settings)
+        key = (method.__name__, params, settings)
+        stats = self._stage_stats.setdefault(key, {'computed': 0,
+                                                   'reused': 0,
+                                                   'last': None})
+        # outputs computed with other settings are never reused
+        for stale in [x for x in stages if x[2] != settings]:
+            del stages[stale]
+
+        entry = stages.get(key) if memoize else None
+        if entry is not None and self._stage_valid(key, entry):
+            stats['reused'] += 1
+            stats['last'] = 'reused'
+            output = entry.output
+        else:
+            entry = _StageEntry(tuple((name, getattr(self, name)) for name in inputs))
+            self._stage_stack.append(entry)
+            try:
+                output = method(self, *[value for _, value in params])
+            finally:
+                self._stage_stack.pop()
+            if memoize:
+                entry.output = output
+                stages[key] = entry
+            stats['computed'] += 1
+            stats['last'] = 'computed'
+
+        if self._stage_stack:
+            self._stage_stack[-1].children.append((key, entry))
+
+        if memoize and isinstance(output, (pd.DataFrame, pd.Series)):
+            # in-place edits of the returned frame do not reach the cache
+            return output.copy()
+        return output
+
+    def invalidate(self, stage=None):
+        """
+        Drop cached stage outputs. Stages that used a dropped stage are
+            recomputed on their next call.
+
+        Args:
+            stage (str): name of the stage to drop, all stages if None
+        """
+        stages = self._stage_state()
+        for key in list(stages):
+            if stage is None or key[0] == stage:
+                del stages[key]
+
+    def stage_graph(self):
+        """
+        Inspect the cached stages.
+
+        Return:
+            graph (DataFrame): one row per stage call with its parameters,
+                the stages it used, whether the cached output is still
+                valid, how often it was computed and reused, and whether
+                the last call computed or reused it
+        """
+        stages = self._stage_state()
+        rows = []
+        for key, stats in self._stage_stats.items():
+            entry = stages.get(key)
+            rows.append({'stage': key[0],
+                         'params': dict(key[1]),
+                         'depends_on': sorted({child[0] for child, _ in entry.children})
+                                       if entry is not None else [],
+                         'valid': entry is not None and self._stage_valid(key, entry),
+                         'computed': stats['computed'],
+                         'reused': stats['reused'],
+                         'last': stats['last']})
+
+        return pd.DataFrame(rows, columns=['stage', 'params', 'depends_on', 'valid',
+                                           'computed', 'reused', 'last'])
+
+
+class ConceptFrequencyIndex():
+    """
+    This class counts condition records per 'standard_concept_name'
+    once, on integer (categorical) codes, so that concepts can be
+    selected repeatedly with different thresholds without rescanning
+    the data.
+    """
+    def __init__(self, counts, codes=None):
+        """
+        This function initializes objects to be passed in the class.
+
+        Args:
+            counts (Series): number of records indexed by concept name,
+                in code order
+            codes (ndarray): per-record concept codes into counts, -1 for
+                missing concepts, needed for mask
+         """
+        self.counts = counts
+        self.codes = codes
+
+    @classmethod
+    def from_series(cls, concepts):
+        """
+        Build the index from a column of concept names. Categorical
+            columns reuse their codes, others are factorized once.
+
+        Args:
+            concepts (Series): 'standard_concept_name' column
+
+        Return:
+            index (ConceptFrequencyIndex): concept frequency index
+        """
+        if isinstance(concepts.dtype, pd.CategoricalDtype):
+            codes = concepts.cat.codes.to_numpy()
+            categories = concepts.cat.categories
+        else:
+            codes, categories = pd.factorize(concepts)
+
+        counts = np.bincount(codes[codes >= 0], minlength=len(categories))
+
+        return cls(pd.Series(counts, index=pd.Index(categories, name='standard_concept_name'),
+                             name='count'),
+                   codes)
+
+    def select(self, threshold=None, top_n=None):
+        """
+        Select concepts with more than @threshold records, then keep the
+            @top_n most frequent of those. If only @top_n is given no
+            count threshold is applied.
+
+        Args:
+            threshold (int): minimum number of records (exclusive),
+                defaults to CONCEPT_THRESHOLD
+            top_n (int): number of most frequent concepts to keep
+
+        Return:
+            keep (ndarray): boolean array over concept codes
+        """
+        counts = self.counts.to_numpy()
+        if threshold is None and top_n is None:
+            threshold = CONCEPT_THRESHOLD
+
+        keep = np.ones(len(counts), dtype=bool)
+        if threshold is not None:
+            keep &= counts > threshold
+        if top_n is not None:
+            # most frequent first, ties broken by concept name
+            name_rank = self.counts.index.argsort().argsort()
+            order = np.lexsort((name_rank, -counts))
+            order = order[keep[order]][:top_n]
+            keep = np.zeros(len(counts), dtype=bool)
+            keep[order] = True
+
+        return keep
+
+    def concepts(self, threshold=None, top_n=None):
+        """
+        Return the names of the concepts selected by select().
+        """
+        return self.counts.index[self.select(threshold, top_n)]
+
+    def mask(self, threshold=None, top_n=None):
+        """
+        Return a per-record boolean mask of the concepts selected by
+            select(), built from the stored codes.
+        """
+        if self.codes is None:
+            raise ValueError('mask needs an index built with from_series')
+
+        # extra False slot so that missing concepts (code -1) are dropped
+        keep = np.append(self.select(threshold, top_n), False)
+
+        return keep[self.codes]
+
+def _reduce_socioeconomic(socioeconomic, links, reducer):
+    """
+    Reduce socioeconomic rows to one row per county.
+
+    Args:
+        socioeconomic (DataFrame): socioeconomic rows with a RangeIndex
+        links (DataFrame): '_county', '_socio' (row of socioeconomic,
+            missing if unmatched) and '_weight', sorted by county and row
+        reducer (str): one of REDUCERS
+
+    Return:
+        reduced (DataFrame): column '_county' and the columns of
+            socioeconomic
+    """
+    if reducer == 'first':
+        position = links['_socio'].fillna(-1).to_numpy(dtype='int64')
+        reduced = socioeconomic.reindex(position).reset_index(drop=True)
+        reduced.insert(0, '_county', links['_county'].to_numpy())
+        return reduced
+
+    rows = socioeconomic.iloc[links['_socio'].to_numpy(dtype='int64')]
+    rows = rows.reset_index(drop=True)
+    county = links['_county'].to_numpy()
+    if reducer == 'weighted_mean':
+        weight = links['_weight'].to_numpy(dtype='float64')[:, None]
+    else:
+        weight = np.ones((len(links), 1))
+
+    numeric = [x for x in socioeconomic.columns
+               if pd.api.types.is_numeric_dtype(socioeconomic[x]) and
+               not pd.api.types.is_bool_dtype(socioeconomic[x])]
+    values = rows[numeric].to_numpy(dtype='float64', na_value=np.nan)
+    present = ~np.isnan(values)
+
+    # weighted mean of the values that are present
+    total = pd.DataFrame(np.where(present, values, 0) * weight,
+                         columns=numeric).groupby(county).sum()
+    weight_sum = pd.DataFrame(present * weight, columns=numeric).groupby(county).sum()
+    means = total / weight_sum.replace(0, np.nan)
+
+    others = rows.drop(columns=numeric).groupby(county).first()
+    reduced = pd.concat([others, means], axis=1)[list(socioeconomic.columns)]
+
+    return reduced.rename_axis('_county').reset_index()
+
+
+# person ids are packed with a concept or county code into one int64
+_CODE_BITS = 20
+_CODE_MASK = (1 << _CODE_BITS) - 1
+# bits of the (non-negative) year in packed count keys
+_YEAR_BITS = 16
+
+
+def _pack(person_id, code):
+    """
+    Pack person ids and concept or county codes into sortable int64 keys,
+    raising ValueError if either does not fit its bits.
+    """
+    person_id = person_id.astype('int64')
+    code = np.asarray(code, dtype='int64')
+    if len(code) and (code.min() < 0 or code.max() > _CODE_MASK):
+        raise ValueError(f'at most {1 << _CODE_BITS} concepts or counties \
+can be packed with person ids')
+    if len(person_id) and (person_id.min() < 0 or
+                           person_id.max() >= 1 << (63 - _CODE_BITS)):
+        raise ValueError(f'"person_id" must be in [0, 2**{63 - _CODE_BITS})')
+    return person_id * (1 << _CODE_BITS) + code
+
+
+def _pack_count_key(concept, county, year):
+    return (concept.astype('int64') << (_CODE_BITS + _YEAR_BITS)) | \
+        (county.astype('int64') << _YEAR_BITS) | year.astype('int64')
+
+
+def _sorted_contains(pairs, values):
+    """
+    Whether each of @values is in the sorted array @pairs, by binary search.
+    """
+    position = np.searchsorted(pairs, values)
+    found = position < len(pairs)
+    found[found] = pairs[position[found]] == values[found]
+    return found
+
+
+def _expand_persons(pairs, person_id):
+    """
+    For each person of @person_id, find the codes paired with it in the
+        sorted packed array @pairs.
+
+    Return:
+        row (ndarray): position in @person_id of each match
+        position (ndarray): position of each match in @pairs
+    """
+    person_id = person_id.astype('int64')
+    low = np.searchsorted(pairs, person_id * (1 << _CODE_BITS))
+    high = np.searchsorted(pairs, (person_id + 1) * (1 << _CODE_BITS))
+    lengths = high - low
+
+    row = np.repeat(np.arange(len(person_id)), lengths)
+    offset = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    return row, np.repeat(low, lengths) + offset
+
+
+def _sorted_insert(pairs, new, *aligned):
+    """
+    Insert the sorted packed values @new into the sorted array @pairs,
+        together with the arrays aligned to each.
+
+    Args:
+        aligned: (old, new) array pairs kept aligned with @pairs
+    """
+    position = np.searchsorted(pairs, new)
+    return (np.insert(pairs, position, new),
+            *[np.insert(old, position, values) for old, values in aligned])
+
+
+class _SortedRuns():
+    """
+    Sorted set of packed int64 keys with aligned value arrays, stored as
+        sorted runs of decreasing length. Each added batch becomes a new
+        run, and the last two runs are merged while the older one is at
+        most twice as long, so there are at most log2(n) + 1 runs and a
+        key is copied O(log n) times over all updates. Adding a batch
+        costs time proportional to the batch (times log n) in amortized
+        terms, instead of a copy of the whole set. Reading the arrays
+        merges the runs into one.
+    """
+    def __init__(self, *dtypes):
+        """
+        This function initializes an empty set.
+
+        Args:
+            dtypes: dtype of each array aligned with the keys
+        """
+        self.dtypes = ('int64',) + dtypes
+        self.runs = []
+
+    def arrays(self):
+        """
+        Return the keys and aligned arrays as single sorted arrays.
+        """
+        if not self.runs:
+            return tuple(np.zeros(0, dtype=x) for x in self.dtypes)
+        while len(self.runs) > 1:
+            self._merge()
+        return self.runs[0]
+
+    def set(self, *arrays):
+        """
+        Replace the set with sorted keys and their aligned arrays.
+        """
+        self.runs = [arrays] if len(arrays[0]) else []
+
+    def contains(self, values):
+        """
+        Whether each of @values is in the set.
+        """
+        found = np.zeros(len(values), dtype=bool)
+        for run in self.runs:
+            found |= _sorted_contains(run[0], values)
+        return found
+
+    def expand(self, person_id):
+        """
+        For each person of @person_id, find the keys paired with it, see
+            _expand_persons.
+
+        Return:
+            row (ndarray): position in @person_id of each match
+            arrays (list): key and aligned values of each match
+        """
+        rows = [np.zeros(0, dtype='int64')]
+        matches = [[np.zeros(0, dtype=x)] for x in self.dtypes]
+        for run in self.runs:
+            row, position = _expand_persons(run[0], person_id)
+            rows.append(row)
+            for match, values in zip(matches, run):
+                match.append(values[position])
+        return np.concatenate(rows), [np.concatenate(x) for x in matches]
+
+    def increment(self, keys, values):
+        """
+        Add @values to the first aligned array at @keys, and return whether
+            each key was found.
+        """
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self.runs:
+            hit = _sorted_contains(run[0], keys)
+            run[1][np.searchsorted(run[0], keys[hit])] += values[hit]
+            found |= hit
+        return found
+
+    def add(self, keys, *aligned):
+        """
+        Add the sorted @keys, none of them in the set yet, with their
+            aligned values.
+        """
+        if not len(keys):
+            return
+        self.runs.append((keys,) + aligned)
+        while len(self.runs) > 1 and len(self.runs[-2][0]) <= 2 * len(self.runs[-1][0]):
+            self._merge()
+
+    def _merge(self):
+        """
+        Merge the last two runs.
+        """
+        new = self.runs.pop()
+        old = self.runs.pop()
+        self.runs.append(_sorted_insert(old[0], new[0], *zip(old[1:], new[1:])))
+
+
+class CountyCountState():
+    """
+    This class stores the aggregate state behind county condition
+        counts so that new All of Us releases can be folded in without
+        rerunning counties_groupby_count over the full history.
+
+    The state holds two sorted sets of packed person-level pairs,
+        (person, county) and (person, concept) with the year of the first
+        condition record, and the number of distinct persons per
+        (concept, county, year). A new (person, concept) pair adds its
+        person to the keys of all counties of that person, and a new
+        (person, county) pair adds its person to the keys of the older
+        concepts of that person. These contributions never overlap with
+        persons already counted, so the exact distinct counts are updated
+        by addition.
+
+    The sorted sets are kept as sorted runs (see _SortedRuns): the new
+        pairs of a batch are looked up in each run by binary search, only
+        the counts of the keys they touch are incremented, and the new
+        pairs and keys are added as a run that is merged with the older
+        runs geometrically. An update therefore costs time proportional to
+        the new data times the log of the history (amortized), without a
+        copy of the history per update. Reading person_county,
+        person_concept, count_key, counts or saving merges the runs.
+
+    Batches must not repeat condition records of earlier batches, as
+        the record counts per concept (used for thresholds) are summed.
+    """
+    def __init__(self):
+        """
+        This function initializes an empty state.
+        """
+        self.concepts = {}
+        self.counties = {}
+        self.concept_records = np.zeros(0, dtype='int64')
+        self._person_county = _SortedRuns()
+        # with the year of the first condition record
+        self._person_concept = _SortedRuns('int16')
+        # packed (concept, county, year) keys and their counts
+        self._counts = _SortedRuns('int64')
+
+    @property
+    def person_county(self):
+        """
+        Sorted packed (person, county) pairs.
+        """
+        return self._person_county.arrays()[0]
+
+    @property
+    def person_concept(self):
+        """
+        Sorted packed (person, concept) pairs.
+        """
+        return self._person_concept.arrays()[0]
+
+    @property
+    def person_concept_year(self):
+        """
+        Year of the first condition record of each person_concept pair.
+        """
+        return self._person_concept.arrays()[1]
+
+    @property
+    def count_key(self):
+        """
+        Sorted packed (concept, county, year) keys.
+        """
+        return self._counts.arrays()[0]
+
+    @property
+    def count_value(self):
+        """
+        Distinct persons of each count_key.
+        """
+        return self._counts.arrays()[1]
+
+    @property
+    def counts(self):
+        """
+        Distinct persons indexed by (concept, county, year) codes.
+        """
+        index = pd.MultiIndex.from_arrays(
+            [self.count_key >> (_CODE_BITS + _YEAR_BITS),
+             (self.count_key >> _YEAR_BITS) & _CODE_MASK,
+             (self.count_key & ((1 << _YEAR_BITS) - 1)).astype('int16')],
+            names=['concept', 'county', 'year'])
+        return pd.Series(self.count_value.copy(), index=index, name='counts')
+
+    @staticmethod
+    def _codes(registry, values):
+        """
+        Map values to stable integer codes, registering new values.
+        """
+        codes, uniques = pd.factorize(values)
+        lookup = np.array([registry.setdefault(x, len(registry)) for x in uniques],
+                          dtype='int64')
+        if len(registry) > _CODE_MASK:
+            raise ValueError(f'at most {_CODE_MASK} concepts or counties are supported')
+
+        return np.append(lookup, -1)[codes]
+
+    def update(self, person_county, conditions):
+        """
+        Fold a batch of participant counties and condition records into
+            the state.
+
+        Args:
+            person_county (DataFrame): 'person_id', 'state_abbr' and
+                'county' of the participants of the batch
+            conditions (DataFrame): 'person_id', 'standard_concept_name'
+                and 'year' of the new condition records, in record order
+        """
+        county_code = self._codes(self.counties,
+                                  pd.MultiIndex.from_arrays([person_county['state_abbr'].to_numpy(dtype=object),
+                                                             person_county['county'].to_numpy(dtype=object)]))
+        concept_code = self._codes(self.concepts,
+                                   conditions['standard_concept_name'].to_numpy(dtype=object))
+
+        records = np.bincount(concept_code[concept_code >= 0],
+                              minlength=len(self.concepts))
+        records[:len(self.concept_records)] += self.concept_records
+        self.concept_records = records
+
+        # new (person, county) pairs
+        new_county = np.unique(_pack(person_county['person_id'].to_numpy(), county_code))
+        new_county = new_county[~self._person_county.contains(new_county)]
+
+        # new (person, concept) pairs with the year of their first record
+        year = pd.array(conditions['year']).fillna(-1).to_numpy(dtype='int16')
+        valid = concept_code >= 0
+        pair = _pack(conditions['person_id'].to_numpy()[valid], concept_code[valid])
+        new_concept, first = np.unique(pair, return_index=True)
+        new_year = year[valid][first]
+        known = self._person_concept.contains(new_concept)
+        new_concept, new_year = new_concept[~known], new_year[~known]
+
+        # older concepts of persons with new counties
+        row, (concept, concept_year) = self._person_concept.expand(new_county >> _CODE_BITS)
+        keys = [(concept & _CODE_MASK, new_county[row] & _CODE_MASK, concept_year)]
+
+        self._person_county.add(new_county)
+
+        # all counties of persons with new concepts
+        row, (county,) = self._person_county.expand(new_concept >> _CODE_BITS)
+        keys.append((new_concept[row] & _CODE_MASK, county & _CODE_MASK,
+                     new_year[row]))
+
+        self._person_concept.add(new_concept, new_year)
+
+        year = np.concatenate([x[2] for x in keys])
+        valid = year >= 0
+        added, n_added = np.unique(
+            _pack_count_key(np.concatenate([x[0] for x in keys])[valid],
+                            np.concatenate([x[1] for x in keys])[valid],
+                            year[valid]),
+            return_counts=True)
+
+        # increment the keys already counted, add the others
+        known = self._counts.increment(added, n_added)
+        self._counts.add(added[~known], n_added[~known].astype('int64'))
+
+    def conditions_counts(self, threshold=None, top_n=None):
+        """
+        Distinct participants per concept, county and year.
+
+        Args:
+            threshold (int): passed to ConceptFrequencyIndex.select
+            top_n (int): passed to ConceptFrequencyIndex.select
+
+        Return:
+            conditions_counts (DataFrame): columns 'standard_concept_name',
+                'county', 'year', 'state_abbr' and 'counts', sorted like
+                counties_groupby_count
+        """
+        concept_names = np.array(list(self.concepts), dtype=object)
+        county_keys = list(self.counties)
+        index = ConceptFrequencyIndex(pd.Series(self.concept_records,
+                                                index=pd.Index(concept_names,
+                                                               name='standard_concept_name'),
+                                                name='count'))
+
+        counts = self.counts.reset_index()
+        concept_code = counts['concept'].to_numpy(dtype='int64')
+        counts = counts[index.select(threshold, top_n)[concept_code]]
+
+        concept_code = counts['concept'].to_numpy(dtype='int64')
+        county_code = counts['county'].to_numpy(dtype='int64')
+        conditions_counts = pd.DataFrame({
+            'standard_concept_name': concept_names[concept_code],
+            'county': np.array([county_keys[x][1] for x in county_code], dtype=object),
+            'year': counts['year'].to_numpy(dtype='int64'),
+            'state_abbr': np.array([county_keys[x][0] for x in county_code], dtype=object),
+            'counts': counts['counts'].to_numpy(dtype='int64')
+            })
+
+        keys = ['standard_concept_name', 'county', 'year', 'state_abbr']
+        return conditions_counts.sort_values(keys, ignore_index=True)
+
+    def save(self, path):
+        """
+        Save the state to a .npz file.
+        """
+        counts = self.counts.reset_index()
+        county_keys = list(self.counties)
+        np.savez_compressed(path,
+                            concepts=np.array(list(self.concepts), dtype=str),
+                            county_state_abbr=np.array([x[0] for x in county_keys], dtype=str),
+                            county_name=np.array([x[1] for x in county_keys], dtype=str),
+                            concept_records=self.concept_records,
+                            person_county=self.person_county,
+                            person_concept=self.person_concept,
+                            person_concept_year=self.person_concept_year,
+                            counts_key=counts[['concept', 'county', 'year']].to_numpy(dtype='int64'),
+                            counts=counts['counts'].to_numpy(dtype='int64'))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a state saved with save().
+        """
+        state = cls()
+        with np.load(path) as data:
+            state.concepts = {x: i for i, x in enumerate(data['concepts'].tolist())}
+            state.counties = {x: i for i, x in enumerate(zip(data['county_state_abbr'].tolist(),
+                                                             data['county_name'].tolist()))}
+            state.concept_records = data['concept_records']
+            state._person_county.set(data['person_county'])
+            state._person_concept.set(data['person_concept'],
+                                      data['person_concept_year'])
+            key = data['counts_key']
+            state._counts.set(_pack_count_key(key[:, 0], key[:, 1], key[:, 2]),
+                              data['counts'].astype('int64'))
+
+        return state
+
+
+class AoU_socioeconomic(_StageCache):
     """
     This class consists of multiple functions to wrangle and clean
     the All of US dataset to produce interactive visualizations
     specifically for county level socioeconomic data, as defined by
     All of Us.
     """
-    def __init__(self, df, geo_df, county_df):
+    _stage_settings = ('engine', 'cache')
+
+    def __init__(self, df, geo_df, county_df, cache=None, memoize=False,
+                 engine='pandas'):
         """
         This function initializes objects to be passed in the class.
 
@@ -54,11 +1265,21 @@ class AoU_socioeconomic():
             geo_df (str): URL of geoJSON file with US counties geoshape
                 boundaries
             county_df (str): URL of ZIP codes and US counties by name
+            cache (ReferenceCache): cache for geo_df and county_df,
+                defaults to the process-wide hdcd.cache cache
+            memoize (bool): keep stage outputs on the instance and reuse
+                them across method calls
+            engine (str): 'pandas' or 'duckdb' for the ZIP3 merge
          """
+        _check_engine(engine)
+        self.engine = engine
         self.df = df
         self.geo_df = geo_df
         self.county_df = county_df
+        self.cache = cache or get_cache()
+        self.memoize = memoize
 
+    @_stage('geo_df')
     def load_geoshapes(self):
         """
         Load geoshapes file from provided URL. Create column 'state_fips'
@@ -72,11 +1293,12 @@ class AoU_socioeconomic():
             raise ValueError('"geo_df" must be of type string \
                              to a URL for a geoJSON file')
 
-        counties = gpd.read_file(self.geo_df)
+        counties = self.cache.read_geoshapes(self.geo_df)
         counties['state_fips'] = counties['STATEFP'].astype('int')
 
         return counties
 
+    @_stage('county_df')
     def load_counties_zip(self):
         """
         Load ZIP codes and US counties by name. Create column 'NAME'
@@ -91,11 +1313,12 @@ class AoU_socioeconomic():
             raise ValueError('"county_df" must be of type string \
                              to a URL for a county ZIP codes csv')
 
-        counties_zip = pd.read_csv(self.county_df)
+        counties_zip = self.cache.read_csv(self.county_df)
         counties_zip['NAME'] = counties_zip['county']
 
         return counties_zip
 
+    @_stage()
     def merge_geoshapes_counties_zip(self):
         """
         Merge counties and counties_zip by common 'state_fips' and 'NAME'
@@ -116,79 +1339,303 @@ class AoU_socioeconomic():
 
         return counties_merge
 
-    def zip_socioeconomic(self):
+    @_stage('df')
+    def zip_socioeconomic(self, snapshot='latest'):
         """
         Load socioeconomic data by ZIP code and prepare to merge to
-            counties_merge. Delete person_id and drop duplicates to
-            get aggregate data for each 3-digit ZIP code.
+            counties_merge. Delete person_id and observation_datetime
+            and reduce to one row per 3-digit ZIP code, grouping on the
+            3-digit ZIP code only instead of hashing every column.
+
+        Args:
+            snapshot (str): 'latest' keeps the most recent non-missing
+                value of each indicator by observation_datetime, 'mean'
+                and 'median' aggregate the numeric indicators (other
+                columns keep their latest value)
 
         Return:
             zip_socioeconomic_agg (DataFrame): contains socioeconmic data by
-                3-digit ZIP code
+                3-digit ZIP code, with integer column 'zip3'
         """
         # set exceptions
         if not isinstance(self.df, pd.DataFrame):
             raise ValueError('"df" must be a Pandas DataFrame')
 
+        if snapshot not in SNAPSHOTS:
+            raise ValueError(f'"snapshot" must be one of {SNAPSHOTS}')
+
         zip_socioeconomic_df = self.df
-        zip_socioeconomic_agg = zip_socioeconomic_df.drop(
-                                    columns=['person_id',
-                                             'observation_datetime'])
-        zip_socioeconomic_agg = zip_socioeconomic_agg.drop_duplicates()
+        columns = list(zip_socioeconomic_df.columns.drop(['person_id',
+                                                          'observation_datetime']))
+
+        zip_column = [x for x in columns if str(x).lower() == 'zip_code']
+        if not zip_column:
+            raise KeyError('"df" must have a "zip_code" column')
+
+        zip3 = zip3_codes(zip_socioeconomic_df[zip_column[0]])
+        key = zip3.to_numpy(dtype='int64', na_value=-1)
+        observation_datetime = parse_datetimes(zip_socioeconomic_df['observation_datetime'])
+        time = observation_datetime.to_numpy(dtype='datetime64[ns]').view('int64')
+
+        # rows sorted by 3-digit ZIP code, oldest first within each
+        rows = np.flatnonzero(zip3.notna().to_numpy())
+        order = rows[np.lexsort((time[rows], key[rows]))]
+        sorted_key = key[order]
+        starts = np.flatnonzero(np.r_[True, sorted_key[1:] != sorted_key[:-1]]) \
+                 if len(order) else np.zeros(0, dtype='int64')
+        ends = np.r_[starts[1:], len(order)] - 1
+        if not len(starts):
+            # no valid 3-digit ZIP code, same columns and dtypes
+            zip_socioeconomic_agg = zip_socioeconomic_df[columns].iloc[:0].reset_index(drop=True)
+            zip_socioeconomic_agg['zip3'] = np.zeros(0, dtype='int64')
+            return zip_socioeconomic_agg
+
+        numeric = [x for x in columns
+                   if pd.api.types.is_numeric_dtype(zip_socioeconomic_df[x]) and
+                   not pd.api.types.is_bool_dtype(zip_socioeconomic_df[x])] \
+                  if snapshot != 'latest' else []
+        if numeric:
+            aggregated = zip_socioeconomic_df[numeric].groupby(zip3.array, sort=True).agg(snapshot)
+
+        zip_socioeconomic_agg = {}
+        for column in columns:
+            if column in numeric:
+                zip_socioeconomic_agg[column] = aggregated[column].to_numpy()
+                continue
+
+            # latest non-missing value of each 3-digit ZIP code
+            values = zip_socioeconomic_df[column]
+            values = values.array if isinstance(values.dtype, pd.api.extensions.ExtensionDtype) \
+                     else values.to_numpy()
+            missing = pd.isna(values)[order]
+            if missing.any() and len(starts):
+                position = np.where(missing, -1, np.arange(len(order)))
+                last = np.maximum.reduceat(position, starts)
+                take = np.where(last >= 0, order[np.maximum(last, 0)], -1)
+            else:
+                take = order[ends]
+            zip_socioeconomic_agg[column] = pd.api.extensions.take(values, take,
+                                                                   allow_fill=True)
+
+        zip_socioeconomic_agg = pd.DataFrame(zip_socioeconomic_agg, columns=columns)
+        zip_socioeconomic_agg['zip3'] = sorted_key[starts]
 
         return zip_socioeconomic_agg
 
-    def merge_county_socioeconomic(self):
+    @_stage('engine')
+    def merge_county_socioeconomic(self, reducer='first'):
         """
-        Merge county_merge and zip_socioeconomic_agg based on 3-digit
-            ZIP code.
+        Merge geoshapes and zip_socioeconomic_agg based on 3-digit
+            ZIP code. The ZIP code to county join and the reduction to
+            one row per county are done on the attribute tables, and the
+            county geometries are attached once at the end.
+
+        Args:
+            reducer (str): how the socioeconomic rows of the 3-digit ZIP
+                codes of a county are combined: 'first' keeps the row
+                of the first ZIP code of the county, 'mean' averages the
+                numeric columns over all matching rows, and
+                'weighted_mean' weights them by the number of 5-digit ZIP
+                codes of the county in each 3-digit ZIP code. Other
+                columns keep their first value.
 
         Return:
             counties_socioeconomic (DataFrame): full geoshapes file with socioeconmic data
-                by 3-digit ZIP code
+                by 3-digit ZIP code. Column 'zip3' is the integer 3-digit
+                ZIP code of the first ZIP code of each county (Int64, e.g.
+                70 for 07001), no longer the first three characters of the
+                unpadded ZIP code as a string
         """
-        zip_socioeconomic_agg = self.zip_socioeconomic()
-        counties_merge = self.merge_geoshapes_counties_zip()
+        if reducer not in REDUCERS:
+            raise ValueError(f'"reducer" must be one of {REDUCERS}')
+
+        # 'zip3' is computed by zip_socioeconomic, whatever the case of
+        # the ZIP code column
+        zip_socioeconomic_agg = self.zip_socioeconomic().reset_index(drop=True)
+
+        # one row per county, geometries are left out until the end
+        counties = self.load_geoshapes().drop_duplicates(subset='AFFGEOID',
+                                                         ignore_index=True)
+        geometry = counties.geometry.name
+        attributes = pd.DataFrame(counties.drop(columns=geometry))
+        attributes['_county'] = np.arange(len(attributes))
 
-        # get 3-digit ZIP codes
-        counties_merge['zip3'] = counties_merge['zipcode'].apply(
-                                    lambda x: str(x)[0:3])
-        zip_socioeconomic_agg['zip3'] = zip_socioeconomic_agg['zip_code'].apply(
-                                            lambda x: x[0:3])
+        # county attributes to 5-digit ZIP codes, without geometries
+        counties_zip = self.load_counties_zip()[['state_fips', 'zipcode', 'NAME', 'state']]
+        counties_zip['zip3'] = zip3_codes(counties_zip['zipcode'])
+        county_zip = attributes[['state_fips', 'NAME', '_county']].merge(counties_zip,
+                                                                         on=['state_fips', 'NAME'],
+                                                                         how='left')
 
-        # merge county_merge and zip_socioeconomic_agg
-        counties_socioeconomic = counties_merge.merge(zip_socioeconomic_agg,
-                                                      on='zip3',
-                                                      how='left')
-        counties_socioeconomic = counties_socioeconomic.drop_duplicates(
-                                    subset='AFFGEOID')
+        if self.engine == 'duckdb':
+            links = self._socioeconomic_links_duckdb(county_zip,
+                                                     zip_socioeconomic_agg,
+                                                     reducer)
+        else:
+            links = self._socioeconomic_links_pandas(county_zip,
+                                                     zip_socioeconomic_agg,
+                                                     reducer)
+
+        socioeconomic = _reduce_socioeconomic(zip_socioeconomic_agg.drop(columns='zip3'),
+                                              links,
+                                              reducer)
+
+        # first ZIP code of each county, then the reduced socioeconomic data
+        first_zip = county_zip.drop_duplicates('_county')[['_county', 'zipcode', 'state', 'zip3']]
+        counties_socioeconomic = attributes.merge(first_zip, on='_county', how='left')
+        counties_socioeconomic = counties_socioeconomic.merge(socioeconomic,
+                                                              on='_county',
+                                                              how='left')
+
+        # attach each county geometry once, in its original column position
+        counties_socioeconomic.insert(counties.columns.get_loc(geometry),
+                                      geometry,
+                                      counties.geometry.to_numpy()[counties_socioeconomic['_county'].to_numpy()])
+        counties_socioeconomic = gpd.GeoDataFrame(counties_socioeconomic.drop(columns='_county'),
+                                                  geometry=geometry,
+                                                  crs=counties.crs)
 
         return counties_socioeconomic
 
-class AoU_conditions():
+    @staticmethod
+    def _socioeconomic_links_pandas(county_zip, zip_socioeconomic_agg, reducer):
+        """
+        Pair counties ('_county') with socioeconomic rows ('_socio') and
+            their weight ('_weight'), sorted by county and row.
+        """
+        socioeconomic_keys = pd.DataFrame({'zip3': zip_socioeconomic_agg['zip3'],
+                                           '_socio': np.arange(len(zip_socioeconomic_agg))})
+
+        if reducer == 'first':
+            # row of the first ZIP code of each county, missing if unmatched
+            links = county_zip.drop_duplicates('_county')[['_county', 'zip3']]
+            links = links.merge(socioeconomic_keys, on='zip3', how='left')
+            links = links.drop_duplicates('_county')[['_county', '_socio']]
+            links['_weight'] = 1
+        else:
+            links = county_zip.dropna(subset=['zip3'])
+            links = links.groupby(['_county', 'zip3']).size().rename('_weight').reset_index()
+            links = links.merge(socioeconomic_keys, on='zip3', how='inner')
+            links = links[['_county', '_socio', '_weight']]
+
+        return links.sort_values(['_county', '_socio'], ignore_index=True)
+
+    @staticmethod
+    def _socioeconomic_links_duckdb(county_zip, zip_socioeconomic_agg, reducer):
+        """
+        _socioeconomic_links_pandas with the join and aggregation in
+            DuckDB.
+        """
+        con = _duckdb_connect()
+        con.register('county_zip', _with_row(county_zip[['_county', 'zip3']]))
+        con.register('socioeconomic', _with_row(zip_socioeconomic_agg[['zip3']]))
+
+        if reducer == 'first':
+            query = """
+                WITH f AS (
+                    SELECT * FROM county_zip
+                    QUALIFY row_number() OVER (PARTITION BY _county ORDER BY _row) = 1
+                )
+                SELECT f._county, s._row AS _socio, 1 AS _weight
+                FROM f
+                LEFT JOIN socioeconomic s ON f.zip3 IS NOT DISTINCT FROM s.zip3
+                QUALIFY row_number() OVER (PARTITION BY f._county ORDER BY s._row) = 1
+                ORDER BY _county, _socio
+                """
+        else:
+            query = """
+                SELECT c._county, s._row AS _socio, count(*) AS _weight
+                FROM county_zip c
+                JOIN socioeconomic s ON c.zip3 = s.zip3
+                GROUP BY ALL
+                ORDER BY _county, _socio
+                """
+        links = con.execute(query).df()
+        con.close()
+
+        return links
+
+class AoU_conditions(_StageCache):
     """
     This class consists of multiple functions to wrangle and clean
     the All of US dataset to produce interactive visualizations
     specifically for county level conditions data, as defined by
     All of Us.
     """
-    def __init__(self, conditions_df, observations_df, county_df, geo_df):
+    _stage_settings = ('engine', 'cache', 'compact', 'datetime_format')
+
+    def __init__(self, conditions_df, observations_df, county_df, geo_df,
+                 cache=None, compact=False, memoize=False,
+                 datetime_format=None, engine='pandas'):
         """
         This function initializes objects to be passed in the class.
 
         Args:
             conditions_df (DataFrame): All of US conditions data to be
-                passed from SQL query
+                passed from SQL query, or a Parquet/Arrow dataset or path
+                (see read_dataset) read one stage's columns at a time
             observations_df (DataFrame): All of US observations data
-                with ZIP code to be passed from SQL query
+                with ZIP code to be passed from SQL query, or a
+                Parquet/Arrow dataset or path
             county_df (str): URL of ZIP codes and US counties by name
             geo_df (str): URL of geoJSON file with US counties geoshape
                 boundaries
+            cache (ReferenceCache): cache for geo_df and county_df,
+                defaults to the process-wide hdcd.cache cache
+            compact (bool): store repeated strings as categoricals and
+                downcast integers at ingest and through every merge and
+                groupby ('category' is accepted as True)
+            memoize (bool): keep stage outputs on the instance and reuse
+                them across method calls
+            datetime_format (str): strftime format of the timestamps,
+                detected from DATETIME_FORMATS if None
+            engine (str): 'pandas' or 'duckdb' for the merge and groupby
          """
+        _check_engine(engine)
+        self.engine = engine
+        self.datetime_format = datetime_format
+        if compact not in (True, False, 'category'):
+            raise ValueError('"compact" must be True or False')
+        self.compact = bool(compact)
+
+        if self.compact and isinstance(conditions_df, pd.DataFrame):
+            conditions_df = compact_dtypes(conditions_df)
+        if self.compact and isinstance(observations_df, pd.DataFrame):
+            observations_df = compact_dtypes(observations_df)
+
         self.conditions_df = conditions_df
         self.observations_df = observations_df
         self.county_df = county_df
         self.geo_df = geo_df
+        self.cache = cache or get_cache()
+        self.memoize = memoize
+        self._concept_index = None
+        self._concept_index_source = None
+
+    @property
+    def concept_index(self):
+        """
+        ConceptFrequencyIndex of conditions_df, built once per DataFrame.
+        """
+        if self._concept_index is None or \
+            self._concept_index_source is not self.conditions_df:
+            concepts = self._read(self.conditions_df, ['standard_concept_name'])
+            self._concept_index = ConceptFrequencyIndex.from_series(
+                                    concepts['standard_concept_name'])
+            self._concept_index_source = self.conditions_df
+
+        return self._concept_index
+
+    def _read(self, source, columns, filters=None):
+        """
+        Read @columns of a conditions or observations source with
+            read_dataset, compacted if compact is set.
+        """
+        df = read_dataset(source, columns, filters)
+        if self.compact and not isinstance(source, pd.DataFrame):
+            df = compact_dtypes(df)
+
+        return df
 
     def load_counties_zip(self):
         """
@@ -200,6 +1647,22 @@ class AoU_conditions():
                 column 'zip3'
         """
         # set exceptions
+        if not _is_table_source(self.observations_df):
+            raise ValueError('"observations_df" must be a Pandas DataFrame \
+passed from the All of US workbench, or a Parquet/Arrow dataset')
+
+        if not _is_table_source(self.conditions_df):
+            raise ValueError('"conditions_df" must be a Pandas DataFrame \
+passed from the All of US workbench, or a Parquet/Arrow dataset')
+
+        return self._read_counties_zip()
+
+    @_stage('county_df', 'geo_df')
+    def _read_counties_zip(self):
+        """
+        Read the county ZIP codes csv through the cache and add 'zip3'.
+        """
+        # set exceptions
         if not isinstance(self.county_df, str):
             raise ValueError('"county_df" must be of type string to a URL for a \
 county ZIP codes csv')
@@ -208,81 +1671,143 @@ county ZIP codes csv')
             raise ValueError('"geo_df" must be of type string to a URL for a \
 county ZIP codes csv')
 
-        if not isinstance(self.observations_df, pd.DataFrame):
-            raise ValueError('"observations_df" must be a Pandas DataFrame \
-passed from the All of US workbench')
+        counties_zip = self.cache.read_csv(self.county_df)
+        counties_zip['zip3'] = zip3_codes(counties_zip['zipcode'])
 
-        if not isinstance(self.conditions_df, pd.DataFrame):
-            raise ValueError('"conditions_df" must be a Pandas DataFrame \
-passed from the All of US workbench')
-
-        counties_zip = pd.read_csv(self.county_df)
-        counties_zip['zip3'] = counties_zip['zipcode'].apply(lambda x: str(x)[0:3]).astype('int')
+        if self.compact:
+            counties_zip = compact_dtypes(counties_zip)
 
         return counties_zip
 
-    def threshold_conditions(self):
+    @_stage()
+    def load_zip3_crosswalk(self):
+        """
+        Load the deduplicated 3-digit ZIP code to county crosswalk, used
+            by every join of participants to counties.
+
+        Return:
+            crosswalk (DataFrame): one row per 3-digit ZIP code and county
+        """
+        return zip3_crosswalk(self._read_counties_zip())
+
+    @_stage('conditions_df')
+    def threshold_conditions(self, threshold=None, top_n=None):
         """
         Threshold conditions of interest so that only those with at least
             a prevalence of 100k are included for visualization.
 
+        Args:
+            threshold (int): minimum number of records (exclusive),
+                defaults to CONCEPT_THRESHOLD (100k)
+            top_n (int): keep only the top_n most frequent concepts
+
         Return:
             conditions_df_threshold (DataFrame): conditions with at least
                 a prevalence of 100k
         """
-        # threshold at least 10k
-        conditions_df_threshold = \
-        self.conditions_df[self.conditions_df.groupby('standard_concept_name')['standard_concept_name'].transform('size')>100000]
+        columns = ['person_id', 'standard_concept_name', 'condition_start_datetime']
+
+        # threshold at least 100k with the cached concept frequencies
+        if isinstance(self.conditions_df, pd.DataFrame):
+            conditions_df_threshold = \
+            self.conditions_df[self.concept_index.mask(threshold, top_n)]
 
-        # keep columns for merging to counties_zip
-        conditions_df_threshold = conditions_df_threshold[['person_id',
-                                                'standard_concept_name',
-                                                'condition_start_datetime']]
+            # keep columns for merging to counties_zip
+            conditions_df_threshold = conditions_df_threshold[columns]
+        else:
+            keep = self.concept_index.concepts(threshold, top_n)
+            conditions_df_threshold = \
+            self._read(self.conditions_df, columns,
+                       [('standard_concept_name', 'in', list(keep))])
         conditions_df_threshold['condition_start_datetime'] = \
-        pd.to_datetime(conditions_df_threshold['condition_start_datetime'])
+        parse_datetimes(conditions_df_threshold['condition_start_datetime'],
+                        self.datetime_format)
 
         return conditions_df_threshold
 
+    @_stage('observations_df')
     def observation_zip(self):
         """
         Extract participant level 3-digit zip codes from observation dataset
 
         Return:
-            zip_df (DataFrame): participant level 3-digit zip codes
+            zip_df (DataFrame): participant level 3-digit zip codes with
+                columns 'person_id', 'zip', 'datetime' and integer 'zip3'
         """
         # extract 3-digit zip codes to DataFrame
-        if not isinstance(self.observations_df, pd.DataFrame):
-            raise ValueError('"observations_df" must be a Pandas DataFrame')
-
-        postal_code = \
-        self.observations_df.loc[self.observations_df.standard_concept_name == 'Postal code [Location]']
-        postal_code['observation_datetime'] = pd.to_datetime(postal_code['observation_datetime'])
-
-        zip_list = []
-
-        for i,row in postal_code.iterrows():
-            tmp = dict()
+        if not _is_table_source(self.observations_df):
+            raise ValueError('"observations_df" must be a Pandas DataFrame \
+or a Parquet/Arrow dataset')
 
-            tmp['person_id'] = int(row.person_id)
-            tmp['zip'] = row.value_as_string
-            tmp['datetime'] = row.observation_datetime
-            zip_list.append(tmp)
+        # filter and select the needed columns in one pass, pushed down
+        # to the reader for Parquet/Arrow sources
+        postal_code = self._read(self.observations_df,
+                                 ['person_id',
+                                  'value_as_string',
+                                  'observation_datetime'],
+                                 [('standard_concept_name', '==', POSTAL_CODE)])
 
-        zip_df = pd.DataFrame(zip_list)
+        # build output columns from whole arrays, no per-row objects
+        person_id = postal_code['person_id'].to_numpy()
+        if person_id.dtype.kind not in 'iu':
+            person_id = person_id.astype('int64')
+        zip_df = pd.DataFrame({
+            'person_id': person_id,
+            'zip': postal_code['value_as_string'].array,
+            'datetime': parse_datetimes(postal_code['observation_datetime'],
+                                        self.datetime_format).to_numpy(),
+            'zip3': zip3_codes(postal_code['value_as_string']).array
+            })
 
         return zip_df
 
-    def merge_conditions_observation(self):
+    @_stage('engine')
+    def merge_conditions_observation(self, threshold=None, top_n=None):
         """
         Merge conditions to participant level 3-digit zip codes
 
+        Args:
+            threshold (int): passed to threshold_conditions
+            top_n (int): passed to threshold_conditions
+
         Return:
             conditions_zip_unique_county (DataFrame): participant level
                 3-digit ZIP code conditions by year and month
         """
         zip_df = self.observation_zip()
-        conditions_df_threshold = self.threshold_conditions()
-        counties_zip = self.load_counties_zip()
+        conditions_df_threshold = self.threshold_conditions(threshold, top_n)
+        crosswalk = self.load_zip3_crosswalk()
+
+        if self.engine == 'duckdb':
+            conditions_zip_unique_county = \
+            self._merge_conditions_observation_duckdb(zip_df,
+                                                      conditions_df_threshold,
+                                                      crosswalk)
+        else:
+            conditions_zip_unique_county = \
+            self._merge_conditions_observation_pandas(zip_df,
+                                                      conditions_df_threshold,
+                                                      crosswalk)
+
+        # extract year and month for condition_start_datetime
+        year, month = \
+        datetime_parts(conditions_zip_unique_county['condition_start_datetime'])
+        conditions_zip_unique_county['year'] = year
+        conditions_zip_unique_county['month'] = month
+
+        if self.compact:
+            conditions_zip_unique_county = compact_dtypes(conditions_zip_unique_county)
+
+        return conditions_zip_unique_county
+
+    @staticmethod
+    def _merge_conditions_observation_pandas(zip_df, conditions_df_threshold,
+                                             crosswalk):
+        """
+        Join participants, conditions and counties with pandas.
+        """
+        # one row per participant and 3-digit ZIP code
+        zip_df = zip_df.drop_duplicates(['person_id', 'zip3'])
 
         # merge conditions to participants on person_id keeping first match
         conditions_zip_unique = \
@@ -291,49 +1816,339 @@ passed from the All of US workbench')
                                              on='person_id',
                                              how='inner')
 
-        # get 3-digipt ZIP codes from US county ZIP file
-        counties_zip['zip3'] = counties_zip['zipcode'].apply(lambda x: str(x)[0:3]).astype('int')
-
-        # merge conditions_zip_unique to counties_zip on 3-digit ZIP code
-        conditions_zip_unique['zip3'] = \
-        conditions_zip_unique['zip'].apply(lambda x: x[0:3]).astype('int')
+        # merge conditions_zip_unique to the 3-digit ZIP code crosswalk,
+        # keeping at most one row per participant, condition and county
         conditions_zip_unique_county = \
-        conditions_zip_unique.merge(counties_zip, on='zip3', how='inner')
-
-        # extract year and month for condition_start_datetime
-        conditions_zip_unique_county['year'] = \
-        pd.DatetimeIndex(conditions_zip_unique_county['condition_start_datetime']).year
-        conditions_zip_unique_county['month'] = \
-        pd.DatetimeIndex(conditions_zip_unique_county['condition_start_datetime']).month
+        conditions_zip_unique.merge(crosswalk, on='zip3', how='inner')
+        conditions_zip_unique_county = \
+        conditions_zip_unique_county.drop_duplicates(['person_id',
+                                                      'standard_concept_name',
+                                                      'state_abbr',
+                                                      'county'],
+                                                     ignore_index=True)
 
         return conditions_zip_unique_county
 
-    def counties_groupby_count(self):
+    @staticmethod
+    def _merge_conditions_observation_duckdb(zip_df, conditions_df_threshold,
+                                             crosswalk):
+        """
+        Join participants, conditions and counties in DuckDB, keeping
+            the first row of each group in the order of the pandas merges.
+        """
+        con = _duckdb_connect()
+        con.register('zip_df', _with_row(zip_df))
+        con.register('conditions', _with_row(conditions_df_threshold))
+        con.register('crosswalk', _with_row(crosswalk))
+
+        conditions_zip_unique_county = con.execute(f"""
+            WITH z AS (
+                SELECT * FROM zip_df
+                QUALIFY row_number() OVER (PARTITION BY person_id, zip3
+                                           ORDER BY _row) = 1
+            ), c AS (
+                SELECT * FROM conditions
+                QUALIFY row_number() OVER (PARTITION BY person_id,
+                                                        standard_concept_name
+                                           ORDER BY _row) = 1
+            )
+            SELECT {_columns(zip_df.columns, 'z')},
+                   {_columns(conditions_df_threshold.columns, 'c', ['person_id'])},
+                   {_columns(crosswalk.columns, 'x', ['zip3'])}
+            FROM z
+            JOIN c ON z.person_id = c.person_id
+            JOIN crosswalk x ON z.zip3 IS NOT DISTINCT FROM x.zip3
+            QUALIFY row_number() OVER (PARTITION BY z.person_id,
+                                                    c.standard_concept_name,
+                                                    x.state_abbr, x.county
+                                       ORDER BY z._row, c._row, x._row) = 1
+            ORDER BY z._row, c._row, x._row
+            """).df()
+        con.close()
+
+        return _restore_dtypes(conditions_zip_unique_county,
+                               [zip_df, conditions_df_threshold, crosswalk])
+
+    @_stage('engine')
+    def counties_groupby_count(self, threshold=None, top_n=None, n_jobs=1):
         """
         Count total participants for a condition in each county
             stratified by year.
 
+        Args:
+            threshold (int): passed to threshold_conditions
+            top_n (int): passed to threshold_conditions
+            n_jobs (int): number of worker processes, -1 for all cores.
+                With more than one job participants are hash-partitioned
+                and each partition is joined and counted in parallel.
+                Ignored with engine='duckdb', which uses all cores
+
         Return:
             conditions_counts (DataFrame): total counts for each condition
                 stratified by county and year
         """
-        conditions_zip_unique_county = self.merge_conditions_observation()
-        counties = gpd.read_file(self.geo_df)
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+        if n_jobs > 1 and self.engine == 'pandas':
+            return self._counties_groupby_count_parallel(threshold, top_n, n_jobs)
 
-        countyname2geoid = dict(zip(counties["NAME"],
-                                counties["GEOID"].astype(int)))
-        conditions_zip_unique_county["id"] = \
-        [countyname2geoid[x] if x in countyname2geoid else np.nan for x in conditions_zip_unique_county["county"].tolist()]
+        conditions_zip_unique_county = self.merge_conditions_observation(threshold, top_n)
 
-        conditions_counts = \
-        conditions_zip_unique_county.groupby(["standard_concept_name",
-                                                                 "county",
-                                                                 "year",
-                                                                 "state_abbr",
-                                                                 "id"])["person_id"].nunique().reset_index()
+        if self.engine == 'duckdb':
+            # DuckDB parallelizes the aggregation itself
+            con = _duckdb_connect()
+            con.register('conditions_zip_unique_county',
+                         conditions_zip_unique_county[['standard_concept_name',
+                                                       'county',
+                                                       'year',
+                                                       'state_abbr',
+                                                       'person_id']])
+            conditions_counts = con.execute("""
+                SELECT standard_concept_name, county, year, state_abbr,
+                       count(DISTINCT person_id) AS person_id
+                FROM conditions_zip_unique_county
+                WHERE standard_concept_name IS NOT NULL AND county IS NOT NULL
+                      AND year IS NOT NULL AND state_abbr IS NOT NULL
+                GROUP BY ALL
+                ORDER BY ALL
+                """).df()
+            con.close()
+            conditions_counts = _restore_dtypes(conditions_counts,
+                                                [conditions_zip_unique_county],
+                                                ['standard_concept_name',
+                                                 'county',
+                                                 'year',
+                                                 'state_abbr'])
+        else:
+            conditions_counts = \
+            conditions_zip_unique_county.groupby(["standard_concept_name",
+                                                                     "county",
+                                                                     "year",
+                                                                     "state_abbr"],
+                                                                    observed=True)["person_id"].nunique().reset_index()
 
+        # county ids are looked up once per aggregated row
+        conditions_counts.insert(4, "id", self._county_ids(conditions_counts))
         conditions_counts.rename(columns = {"person_id":"counts"},inplace=True)
         conditions_counts.dropna(subset = ["id"],inplace=True)
         conditions_counts["id"] = conditions_counts["id"].astype(int)
 
         return conditions_counts
+
+    def _counties_groupby_count_parallel(self, threshold, top_n, n_jobs):
+        """
+        counties_groupby_count over hash partitions of participants. The
+            inputs are encoded to integer arrays and placed in shared
+            memory, sorted by partition, so workers only receive row
+            ranges instead of pickled DataFrames.
+        """
+        # missing zip3 is kept: like the serial, stream and DuckDB paths,
+        # it joins the crosswalk rows with a missing ZIP code
+        zip_df = self.observation_zip()[['person_id', 'zip3']].drop_duplicates()
+        conditions = self.threshold_conditions(threshold, top_n)
+        conditions = conditions.drop_duplicates(['person_id', 'standard_concept_name'])
+        crosswalk = self.load_zip3_crosswalk()
+
+        concept_codes, concepts = pd.factorize(conditions['standard_concept_name'])
+        county_codes, counties = pd.factorize(pd.MultiIndex.from_frame(
+                                    crosswalk[['county', 'state_abbr']].astype(object)))
+
+        # sort rows by participant partition, ranges are cut with offsets
+        def partitioned(person_id):
+            partition = pd.util.hash_array(person_id) % n_jobs
+            order = np.argsort(partition, kind='stable')
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(partition,
+                                                               minlength=n_jobs))])
+            return order, offsets
+
+        condition_order, condition_offsets = partitioned(conditions['person_id'].to_numpy(dtype='int64'))
+        zip_order, zip_offsets = partitioned(zip_df['person_id'].to_numpy(dtype='int64'))
+
+        arrays = {'person_id': conditions['person_id'].to_numpy(dtype='int64')[condition_order],
+                  'concept': concept_codes.astype('int32')[condition_order],
+                  'year': np.asarray(datetime_parts(conditions['condition_start_datetime'])[0],
+                                     dtype='float64')[condition_order],
+                  'zip_person_id': zip_df['person_id'].to_numpy(dtype='int64')[zip_order],
+                  'zip3': zip_df['zip3'].to_numpy(dtype='float64')[zip_order],
+                  'crosswalk_zip3': crosswalk['zip3'].to_numpy(dtype='float64',
+                                                               na_value=np.nan),
+                  'crosswalk_county': county_codes.astype('int32')}
+
+        blocks, descriptors = _share_arrays(arrays)
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                partials = list(pool.map(_partition_counts,
+                                         [descriptors] * n_jobs,
+                                         zip(condition_offsets[:-1], condition_offsets[1:]),
+                                         zip(zip_offsets[:-1], zip_offsets[1:])))
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        # partitions hold disjoint participants, so counts add up
+        counts = pd.concat(partials).groupby(['concept', 'county', 'year'])['person_id'].sum()
+        counts = counts.reset_index()
+
+        county = counties[counts['county'].to_numpy()]
+        conditions_counts = pd.DataFrame({
+            'standard_concept_name': concepts[counts['concept'].to_numpy()],
+            'county': county.get_level_values(0),
+            # same year dtype as datetime_parts and the serial path
+            'year': counts['year'].to_numpy().astype('int16'),
+            'state_abbr': county.get_level_values(1),
+            'person_id': counts['person_id'].to_numpy()})
+        conditions_counts = conditions_counts.sort_values(['standard_concept_name',
+                                                          'county',
+                                                          'year',
+                                                          'state_abbr'],
+                                                         ignore_index=True)
+
+        conditions_counts.insert(4, "id", self._county_ids(conditions_counts))
+        conditions_counts.rename(columns = {"person_id":"counts"},inplace=True)
+        conditions_counts.dropna(subset = ["id"],inplace=True)
+        conditions_counts["id"] = conditions_counts["id"].astype(int)
+        if self.compact:
+            conditions_counts = compact_dtypes(conditions_counts)
+
+        return conditions_counts
+
+    @_stage('geo_df')
+    def load_county_dimension(self):
+        """
+        Load the county dimension table from the geoshapes file.
+
+        Return:
+            dimension (DataFrame): county FIPS 'id' keyed by
+                (state_abbr, county)
+        """
+        return county_dimension(self.cache.read_geoshapes(self.geo_df))
+
+    def _county_ids(self, df):
+        """
+        Map ('state_abbr', 'county') of @df to county GEOID, NaN if unknown.
+        """
+        return county_ids(self.load_county_dimension(),
+                          df['state_abbr'],
+                          df['county'])
+
+    def counties_groupby_count_append(self, state, threshold=None, top_n=None):
+        """
+        Fold conditions_df and observations_df, the records of a new
+            data release, into @state and return the counts over all
+            releases folded in so far. Only the new records are read.
+
+        Args:
+            state (CountyCountState): aggregate state of earlier releases,
+                updated in place
+            threshold (int): passed to ConceptFrequencyIndex.select
+            top_n (int): passed to ConceptFrequencyIndex.select
+
+        Return:
+            conditions_counts (DataFrame): total counts for each condition
+                stratified by county and year, same as counties_groupby_count
+        """
+        if not isinstance(state, CountyCountState):
+            raise ValueError('"state" must be a CountyCountState')
+
+        zip_df = self.observation_zip()[['person_id', 'zip3']].drop_duplicates()
+        person_county = zip_df.merge(self.load_zip3_crosswalk(), on='zip3', how='inner')
+
+        conditions = self._read(self.conditions_df, ['person_id',
+                                                     'standard_concept_name',
+                                                     'condition_start_datetime'])
+        year, _ = datetime_parts(parse_datetimes(conditions['condition_start_datetime'],
+                                                 self.datetime_format))
+        state.update(person_county, conditions.assign(year=year))
+
+        conditions_counts = state.conditions_counts(threshold, top_n)
+        conditions_counts.insert(4, 'id', self._county_ids(conditions_counts))
+        conditions_counts.dropna(subset = ["id"],inplace=True)
+        conditions_counts["id"] = conditions_counts["id"].astype(int)
+
+        return conditions_counts.reset_index(drop=True)
+
+    def counties_groupby_count_stream(self, chunksize=1000000,
+                                      threshold=None, top_n=None):
+        """
+        Count total participants for a condition in each county
+            stratified by year, reading conditions and observations in
+            chunks. conditions_df and observations_df may be DataFrames,
+            csv, Parquet or Arrow paths or datasets, or iterables of
+            DataFrame chunks.
+
+        Each conditions chunk is reduced to partial aggregates (distinct
+            persons per concept/county/year and condition records per
+            concept) which are merged at the end, so peak memory depends
+            on chunksize and the number of participants rather than on
+            the number of condition records.
+
+        Args:
+            chunksize (int): rows per chunk for csv paths and DataFrames
+            threshold (int): passed to ConceptFrequencyIndex.select
+            top_n (int): passed to ConceptFrequencyIndex.select
+
+        Return:
+            conditions_counts (DataFrame): total counts for each condition
+                stratified by county and year, same as counties_groupby_count
+        """
+        keys = ['standard_concept_name', 'county', 'year', 'state_abbr']
+
+        # participant -> county table, one row per participant and county
+        person_zip3 = []
+        for chunk in _iter_chunks(self.observations_df, chunksize,
+                                  ['person_id',
+                                   'standard_concept_name',
+                                   'value_as_string']):
+            chunk = chunk[chunk['standard_concept_name'] == POSTAL_CODE]
+            person_zip3.append(pd.DataFrame({'person_id': chunk['person_id'].to_numpy(dtype='int64'),
+                                             'zip3': zip3_codes(chunk['value_as_string']).array}).drop_duplicates())
+        person_zip3 = pd.concat(person_zip3, ignore_index=True).drop_duplicates()
+
+        crosswalk = self.load_zip3_crosswalk()
+        person_county = person_zip3.merge(crosswalk, on='zip3', how='inner')
+        person_county = person_county[['person_id', 'county', 'state_abbr']].drop_duplicates()
+
+        # (person, concept) pairs already counted in an earlier chunk, only
+        # the first record of a pair is used as in merge_conditions_observation
+        concept_codes = {}
+        seen = np.empty(0, dtype='int64')
+        concept_sizes = []
+        partials = []
+
+        for chunk in _iter_chunks(self.conditions_df, chunksize,
+                                  ['person_id',
+                                   'standard_concept_name',
+                                   'condition_start_datetime']):
+            concept_sizes.append(chunk['standard_concept_name'].value_counts())
+
+            chunk = chunk.drop_duplicates(['person_id', 'standard_concept_name'])
+            for name in chunk['standard_concept_name'].unique():
+                concept_codes.setdefault(name, len(concept_codes))
+            pair = _pack(chunk['person_id'].to_numpy(dtype='int64'),
+                         chunk['standard_concept_name'].map(concept_codes).to_numpy(dtype='int64'))
+            # binary search, and the new pairs are merged in sorted order
+            # instead of re-sorting every pair seen so far
+            new = ~_sorted_contains(seen, pair)
+            seen, = _sorted_insert(seen, np.sort(pair[new]))
+            chunk = chunk[new]
+
+            chunk = chunk.assign(year=datetime_parts(parse_datetimes(
+                                 chunk['condition_start_datetime'], self.datetime_format))[0])
+            chunk = chunk.merge(person_county, on='person_id', how='inner')
+            partials.append(chunk.groupby(keys, observed=True)['person_id'].nunique())
+
+        # merge partial aggregates, each pair is counted in one chunk only
+        concept_sizes = pd.concat(concept_sizes).groupby(level=0).sum()
+        keep = ConceptFrequencyIndex(concept_sizes).concepts(threshold, top_n)
+
+        conditions_counts = pd.concat(partials).groupby(level=keys, observed=True).sum().reset_index()
+        conditions_counts = conditions_counts[conditions_counts['standard_concept_name'].isin(keep)]
+        conditions_counts.insert(4, 'id', self._county_ids(conditions_counts))
+        conditions_counts.rename(columns = {"person_id":"counts"},inplace=True)
+        conditions_counts.dropna(subset = ["id"],inplace=True)
+        conditions_counts["id"] = conditions_counts["id"].astype(int)
+        # same year dtype as datetime_parts and counties_groupby_count
+        conditions_counts["year"] = conditions_counts["year"].astype('int16')
+
+        return conditions_counts.reset_index(drop=True)
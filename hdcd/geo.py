@@ -0,0 +1,184 @@
+"""
+This Python script defines the state and county dimension tables used to
+assign FIPS ids in the data wrangling and plotting modules.
+    * state_dimension: US states keyed by name and abbreviation
+    * state_ids: vectorized state name (or abbreviation) to FIPS lookup
+    * county_dimension: US counties keyed by (state_abbr, county name)
+    * county_ids: vectorized (state_abbr, county name) to FIPS lookup
+    * county_table: bundled US county FIPS table
+    * us_topology: bundled TopoJSON of US states or counties
+
+County names are only unique within a state ("Washington" exists in
+more than 30 states), so counties are always looked up together with
+their state.
+
+The bundled assets in hdcd/assets are built from the US Census Bureau
+2016 cartographic boundary files (see hdcd/assets/build_assets.py) and
+loaded once per process, so maps and FIPS lookups need no network (see
+hdcd.plot.us_feature and hdcd.plot.remote_maps).
+
+This script requires `numpy` and `pandas`.
+"""
+import gzip
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+__all__ = ['state_dimension', 'state_ids', 'county_dimension', 'county_ids',
+           'county_table', 'us_topology']
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+TOPOLOGY_FILES = {'states': 'us-states.topo.json.gz',
+                  'counties': 'us-counties.topo.json.gz'}
+
+# state name, USPS abbreviation and FIPS code
+STATES = [
+    ('Alabama', 'AL', 1), ('Alaska', 'AK', 2), ('Arizona', 'AZ', 4),
+    ('Arkansas', 'AR', 5), ('California', 'CA', 6), ('Colorado', 'CO', 8),
+    ('Connecticut', 'CT', 9), ('Delaware', 'DE', 10),
+    ('District of Columbia', 'DC', 11), ('Florida', 'FL', 12),
+    ('Georgia', 'GA', 13), ('Hawaii', 'HI', 15), ('Idaho', 'ID', 16),
+    ('Illinois', 'IL', 17), ('Indiana', 'IN', 18), ('Iowa', 'IA', 19),
+    ('Kansas', 'KS', 20), ('Kentucky', 'KY', 21), ('Louisiana', 'LA', 22),
+    ('Maine', 'ME', 23), ('Maryland', 'MD', 24), ('Massachusetts', 'MA', 25),
+    ('Michigan', 'MI', 26), ('Minnesota', 'MN', 27), ('Mississippi', 'MS', 28),
+    ('Missouri', 'MO', 29), ('Montana', 'MT', 30), ('Nebraska', 'NE', 31),
+    ('Nevada', 'NV', 32), ('New Hampshire', 'NH', 33), ('New Jersey', 'NJ', 34),
+    ('New Mexico', 'NM', 35), ('New York', 'NY', 36),
+    ('North Carolina', 'NC', 37), ('North Dakota', 'ND', 38),
+    ('Ohio', 'OH', 39), ('Oklahoma', 'OK', 40), ('Oregon', 'OR', 41),
+    ('Pennsylvania', 'PA', 42), ('Rhode Island', 'RI', 44),
+    ('South Carolina', 'SC', 45), ('South Dakota', 'SD', 46),
+    ('Tennessee', 'TN', 47), ('Texas', 'TX', 48), ('Utah', 'UT', 49),
+    ('Vermont', 'VT', 50), ('Virginia', 'VA', 51), ('Washington', 'WA', 53),
+    ('West Virginia', 'WV', 54), ('Wisconsin', 'WI', 55), ('Wyoming', 'WY', 56),
+    ('Puerto Rico', 'PR', 72),
+    ]
+
+_state_dimension = None
+_county_table = None
+_topologies = {}
+
+
+def state_dimension():
+    """
+    Return the state dimension table, built once per process.
+
+    Return:
+        states (DataFrame): columns 'state', 'state_abbr' and 'state_fips'
+            with an integer index
+    """
+    global _state_dimension
+    if _state_dimension is None:
+        _state_dimension = pd.DataFrame(STATES, columns=['state',
+                                                         'state_abbr',
+                                                         'state_fips'])
+    return _state_dimension
+
+
+def state_ids(states):
+    """
+    Map state names or USPS abbreviations to state FIPS codes.
+
+    Args:
+        states (Series): state names (e.g. 'Washington') or
+            abbreviations (e.g. 'WA')
+
+    Return:
+        ids (ndarray): float FIPS codes, NaN for unknown states
+    """
+    table = state_dimension()
+    fips = table['state_fips'].astype(float)
+    lookup = pd.concat([pd.Series(fips.to_numpy(), index=table['state']),
+                        pd.Series(fips.to_numpy(), index=table['state_abbr'])])
+
+    return lookup.reindex(np.asarray(states, dtype=object)).to_numpy()
+
+
+def county_table():
+    """
+    Return the bundled county FIPS table, read once per process.
+
+    Return:
+        counties (DataFrame): columns 'GEOID', 'STATEFP' and 'NAME' as in
+            the counties geoshapes, codes as zero-padded strings
+    """
+    global _county_table
+    if _county_table is None:
+        _county_table = pd.read_csv(os.path.join(ASSETS_DIR, 'us-counties.csv'),
+                                    dtype=str, keep_default_na=False)
+    return _county_table
+
+
+def us_topology(feature='states'):
+    """
+    Return the bundled TopoJSON of US states or counties, read once per
+        process. Feature ids are integer FIPS codes, as in the vega
+        datasets us-10m TopoJSON.
+
+    Args:
+        feature (str): 'states' or 'counties', also the name of the
+            topology object
+
+    Return:
+        topology (dict): TopoJSON topology
+    """
+    if feature not in TOPOLOGY_FILES:
+        raise ValueError(f'"feature" must be one of {list(TOPOLOGY_FILES)}')
+    if feature not in _topologies:
+        with gzip.open(os.path.join(ASSETS_DIR, TOPOLOGY_FILES[feature])) as f:
+            _topologies[feature] = json.load(f)
+    return _topologies[feature]
+
+
+def county_dimension(counties=None):
+    """
+    Build the county dimension table from a counties geoshapes file,
+        keyed by (state_abbr, county name) with the county FIPS (GEOID)
+        as integer id. For the few names that repeat within a state
+        (e.g. Baltimore county and city) the lowest GEOID is kept.
+
+    Args:
+        counties (DataFrame): geoshapes with 'STATEFP', 'NAME' and 'GEOID',
+            defaults to the bundled county_table
+
+    Return:
+        dimension (DataFrame): columns 'state_fips' and 'id' indexed by
+            a (state_abbr, county) MultiIndex
+    """
+    if counties is None:
+        counties = county_table()
+    dimension = pd.DataFrame({'state_fips': counties['STATEFP'].astype(int).to_numpy(),
+                              'county': counties['NAME'].to_numpy(),
+                              'id': counties['GEOID'].astype(int).to_numpy()})
+    abbr = state_dimension().set_index('state_fips')['state_abbr']
+    dimension['state_abbr'] = dimension['state_fips'].map(abbr)
+
+    dimension = dimension.dropna(subset=['state_abbr']).sort_values('id')
+    dimension = dimension.drop_duplicates(['state_abbr', 'county'])
+
+    return dimension.set_index(['state_abbr', 'county'])[['state_fips', 'id']]
+
+
+def county_ids(dimension, state_abbr, county):
+    """
+    Look up county FIPS ids for (state_abbr, county name) pairs.
+
+    Args:
+        dimension (DataFrame): table from county_dimension
+        state_abbr (Series): state abbreviations
+        county (Series): county names
+
+    Return:
+        ids (ndarray): float county FIPS codes, NaN for unknown counties
+    """
+    keys = pd.MultiIndex.from_arrays([np.asarray(state_abbr, dtype=object),
+                                      np.asarray(county, dtype=object)])
+    position = dimension.index.get_indexer(keys)
+
+    # extra NaN slot for pairs that are not found (position -1)
+    ids = np.append(dimension['id'].to_numpy(dtype=float), np.nan)[position]
+
+    return ids
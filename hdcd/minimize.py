@@ -0,0 +1,229 @@
+"""
+This Python script shrinks the data embedded in hdcd.plot charts before
+they are serialized:
+    * minimize_chart: copy of a chart with smaller inline data, and the
+      spec size before and after
+    * spec_size: size in bytes of the compact spec JSON of a chart
+
+Three passes are applied to every DataFrame of the chart, the data of its
+views and of its lookups:
+    * columns: only the fields referenced by the spec are kept, i.e. the
+      fields of encodings (tooltips included), selections and transforms,
+      and the datum fields of filter and calculate expressions. A lookup
+      with explicit fields keeps its key and those fields.
+    * floats: each value rounded to @precision significant digits of its
+      own, never to fewer than 0 decimals, so small values keep their
+      digits and integer ids and lookup keys are unchanged. JSON has no
+      float width, so rounding is what shortens the numbers.
+    * strings: a text column whose values repeat is replaced by integer
+      codes, and a calculate transform at the start of the view decodes
+      them from an array of the distinct values, so encodings, filters and
+      selections see the original strings.
+
+Columns are not pruned when a field is only known at render time, e.g. an
+expression datum[param] or a repeat chart. Strings are not encoded in
+lookup data or in the data of concatenated charts, which cannot carry
+transforms. Data passed as URLs or dicts (TopoJSON) is left as is.
+
+This script requires `numpy`, `pandas` and `altair`.
+"""
+import json
+import re
+
+import numpy as np
+import pandas as pd
+import altair as alt
+
+__all__ = ['minimize_chart', 'spec_size']
+
+# spec keys whose string values name data fields
+FIELD_KEYS = {'field', 'fields', 'groupby', 'fold', 'lookup', 'key', 'flatten',
+              'pivot', 'value', 'impute', 'stack', 'density', 'regression',
+              'loess', 'quantile', 'extent', 'on'}
+# sub-charts of compound charts
+CHART_LISTS = ('layer', 'hconcat', 'vconcat', 'concat')
+# charts that take transforms
+TRANSFORM_CHARTS = (alt.Chart, alt.LayerChart, alt.FacetChart)
+
+_DATUM_FIELD = re.compile(r'datum\.([A-Za-z_$][\w$]*)|datum\[\s*(["\'])(.*?)\2\s*\]')
+_DATUM_DYNAMIC = re.compile(r'datum\[\s*[^\s"\']')
+
+
+def spec_size(chart):
+    """
+    Size in bytes of the compact Vega-Lite spec JSON of @chart.
+    """
+    return len(chart.to_json(indent=None, separators=(',', ':')).encode())
+
+
+def _add_field(fields, name):
+    """
+    Add a field name and the column it reads, e.g. 'a' of 'a.b' or 'a[0]'.
+    """
+    fields.add(name)
+    unescaped = name.replace('\\', '')
+    fields.add(unescaped)
+    fields.add(re.split(r'(?<!\\)[.\[]', name)[0])
+
+
+def _referenced_fields(spec, fields=None):
+    """
+    Field names referenced anywhere in a Vega-Lite spec, outside its data.
+
+    Return:
+        fields (set): field names, None if a field is only known at render
+            time
+    """
+    if fields is None:
+        fields = set()
+    if isinstance(spec, dict):
+        if 'repeat' in spec:
+            return None
+        for key, value in spec.items():
+            if key == 'datasets':
+                continue
+            if key == 'data':
+                # only names and URLs, no fields
+                continue
+            if key in FIELD_KEYS:
+                for name in (value if isinstance(value, list) else [value]):
+                    if isinstance(name, str):
+                        _add_field(fields, name)
+            if _referenced_fields(value, fields) is None:
+                return None
+    elif isinstance(spec, list):
+        for value in spec:
+            if _referenced_fields(value, fields) is None:
+                return None
+    elif isinstance(spec, str) and 'datum' in spec:
+        if _DATUM_DYNAMIC.search(spec):
+            return None
+        for match in _DATUM_FIELD.finditer(spec):
+            _add_field(fields, match.group(1) or match.group(3))
+    return fields
+
+
+def _round_floats(frame, precision):
+    """
+    Round each value of the float columns to @precision significant digits,
+    keeping at least its integer part.
+    """
+    for column in frame.columns:
+        if not pd.api.types.is_float_dtype(frame[column]):
+            continue
+        values = frame[column].to_numpy(dtype='float64', na_value=np.nan)
+        rounded = values.copy()
+        finite = np.isfinite(values) & (values != 0)
+        magnitude = np.floor(np.log10(np.abs(values[finite])))
+        # 10 ** decimals is exact up to 22 decimals, so the quotient is the
+        # nearest float to the rounded decimal and serializes shortly
+        decimals = np.clip(precision - 1 - magnitude, 0, 308)
+        scale = 10.0 ** decimals
+        rounded[finite] = np.round(values[finite] * scale) / scale
+        frame[column] = rounded
+    return frame
+
+
+def _encode_strings(frame):
+    """
+    Replace text columns with repeated values by integer codes.
+
+    Return:
+        frame (DataFrame): the data with codes
+        transforms (list): calculate transforms decoding the codes
+    """
+    transforms = []
+    for column in frame.columns:
+        values = frame[column]
+        if not isinstance(column, str) or \
+                not (pd.api.types.is_object_dtype(values) or
+                     isinstance(values.dtype, pd.CategoricalDtype)):
+            continue
+        present = values.dropna()
+        if present.empty or not all(isinstance(x, str) for x in present.unique()):
+            continue
+
+        codes, uniques = pd.factorize(values)
+        dictionary = json.dumps([str(x) for x in uniques], separators=(',', ':'))
+        name = json.dumps(column)
+        expression = f'{dictionary}[datum[{name}]]'
+        if (codes < 0).any():
+            expression = f'datum[{name}] == null ? null : {expression}'
+        # bytes of the values against the bytes of the codes and dictionary
+        before = int(present.astype(str).str.len().sum()) + 2 * len(present)
+        after = int(np.char.str_len(codes.astype(str)).sum()) + \
+            len(expression) + len(name) + 30
+        if after >= before:
+            continue
+
+        frame[column] = pd.array(np.where(codes < 0, None, codes), dtype='Int64')
+        transforms.append(alt.CalculateTransform(calculate=expression, **{'as': column}))
+    return frame, transforms
+
+
+def _minimize(chart, fields, precision, encode_strings):
+    """
+    Minimize the data of @chart and of its sub-charts in place (on a copy).
+    """
+    transforms = chart._get('transform')
+    if transforms is not alt.Undefined:
+        for transform in transforms:
+            lookup = transform._get('from') \
+                if isinstance(transform, alt.LookupTransform) else alt.Undefined
+            if lookup is alt.Undefined or not isinstance(lookup._get('data'), pd.DataFrame):
+                continue
+            frame = lookup._get('data')
+            keep = lookup._get('fields')
+            if keep is not alt.Undefined:
+                keep = [lookup._get('key')] + list(keep)
+                frame = frame[[x for x in frame.columns if x in keep]]
+            lookup.data = _round_floats(frame.copy(), precision)
+
+    data = chart._get('data')
+    if isinstance(data, pd.DataFrame):
+        frame = data
+        if fields is not None:
+            frame = frame[[x for x in frame.columns if str(x) in fields]]
+        frame = _round_floats(frame.copy(), precision)
+        if encode_strings and isinstance(chart, TRANSFORM_CHARTS):
+            frame, decode = _encode_strings(frame)
+            if decode:
+                chart.transform = decode + (list(transforms)
+                                            if transforms is not alt.Undefined else [])
+        chart.data = frame
+
+    for attr in CHART_LISTS:
+        subcharts = chart._get(attr)
+        for subchart in (subcharts if isinstance(subcharts, list) else []):
+            if isinstance(subchart, alt.SchemaBase):
+                _minimize(subchart, fields, precision, encode_strings)
+    spec = chart._get('spec')
+    if isinstance(spec, alt.SchemaBase):
+        _minimize(spec, fields, precision, encode_strings)
+    return chart
+
+
+def minimize_chart(chart, precision=6, encode_strings=True):
+    """
+    Copy of @chart with only the data it draws: unused columns dropped,
+        floats rounded and repeated strings dictionary-encoded.
+
+    Args:
+        chart (alt.TopLevelMixin): chart, e.g. returned by an hdcd.plot
+            function
+        precision (int): significant digits kept of each float
+        encode_strings (bool): dictionary-encode repeated strings
+
+    Return:
+        chart (alt.TopLevelMixin): the minimized copy
+        sizes (dict): 'before' and 'after', spec sizes in bytes
+    """
+    if precision < 1:
+        raise ValueError('"precision" must be a positive integer')
+
+    before = chart.to_json(indent=None, separators=(',', ':'))
+    fields = _referenced_fields(json.loads(before))
+    minimized = _minimize(chart.copy(deep=True), fields, precision, encode_strings)
+
+    return minimized, {'before': len(before.encode()),
+                       'after': spec_size(minimized)}
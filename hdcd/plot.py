@@ -2,10 +2,15 @@
 This Python script defines functions for interactive visualizations
     in this project.
     * plot_corr: scatterplot of two variables
+    * spearman_matrix: Spearman correlations of all pairs of questions
+    * plot_corr_matrix: heatmap of spearman_matrix
     * plot_geomap: CDI geomap of variable of interest
     * plot_longitudinal_change: interactive time series with respect to a variable
     * plot_geomap_socioeconomic: geomap of defined SDOH per All of Us
     * plot_geomap_conditions: geomap of conditions passed from All of Us
+    * county_topology: simplified county TopoJSON shared by the geomaps
+    * us_feature: US states or counties TopoJSON as chart data
+    * remote_maps: link the vega_datasets us-10m TopoJSON instead
 
 This module require the following packages within the Python environment
 you are running in:
@@ -17,16 +22,27 @@ you are running in:
 
 This script can be imported as a module for the functions listed above.
 """
+import json
+import logging
 import warnings
 
 import pandas as pd
 import numpy as np
 import scipy.stats as sp
 import altair as alt
-import geopandas as gpd
+
+from .cache import get_cache
+from .chart_data import within_max_rows
+from .geo import state_dimension, state_ids, county_dimension, county_ids
+from .geo import us_topology, TOPOLOGY_FILES
+from .minimize import minimize_chart
+from .store import select, unique_values
+from .topology import cached_topojson
 
 warnings.filterwarnings("ignore")
 
+logger = logging.getLogger(__name__)
+
 ### --- TODO ----###
 ### Add __all__ to the import * in __init__
 ### Add print functions in vocab variable defining printing of correlation
@@ -39,7 +55,18 @@ STRAT_LONG = "StratificationCategory1"
 D_TYPE = "DataValueType"
 YEAR = "YearStart"
 
+COUNTIES_GEOJSON = 'https://gist.githubusercontent.com/sdwfrost/\
+d1c73f91dd9d175998ed166eb216994a/raw/e89c35f308cee7e2e5a784e1d3afc5d449e9e4bb/\
+counties.geojson'
+US_10M = 'https://cdn.jsdelivr.net/npm/vega-datasets@v1.29.0/data/us-10m.json'
+SDOH = {'high_school_education': ('High School Education (%)', 'darkblue'),
+        'median_income': ('Median Income ($)', 'yelloworangered'),
+        'no_health_insurance': ('No Health Insurance (%)', 'lightgreyred'),
+        'poverty': ('Poverty (%)', 'lightmulti')}
+
 __all__ = ['plot_corr',
+            "spearman_matrix",
+            "plot_corr_matrix",
             "plot_geomap",
             "plot_longitudinal_change",
             "plot_geomap_socioeconomic",
@@ -49,7 +76,8 @@ def plot_corr(sod,
              health_outcome,
              stratification,
              dataframe,
-             print_corr=False):
+             print_corr=False,
+             minimize=False):
 
     """
     Function to plot the correlation of two variables in a scatterplot.
@@ -61,19 +89,22 @@ Implementation based on altair (alt).
 the dataframe
     @stratification: string variable drawn from the [StratificationCategory1]
 column
+    @dataframe: CDI dataframe or hdcd.store.CDIStore
     @output: an interactive pointplot of longitudinal change with respect to
 @variable
+    @minimize: if True, keep only the data the chart draws (see
+hdcd.minimize.minimize_chart) and log the spec size before and after, in bytes
+(logger "hdcd.plot", INFO level)
     @return: an alt.layer() object
 
     """
-    dataframe = dataframe[dataframe[LOC_SHORT] != "US"]
-
-    # set exceptions
-    if sod not in set(dataframe["Question"]):
+    # set exceptions, on the same non-US rows for DataFrames and stores
+    national = {LOC_SHORT: "US"}
+    if sod not in unique_values(dataframe, "Question", exclude=national):
         raise NameError(f"{sod} not found in dataframe, check [Question] \
 columns for available variable")
 
-    if health_outcome not in set(dataframe["Question"]):
+    if health_outcome not in unique_values(dataframe, "Question", exclude=national):
         raise NameError(f"{health_outcome} not found in dataframe, check \
 [Question] columns for available variable")
 
@@ -81,12 +112,13 @@ columns for available variable")
 #         raise NameError(f"{location} not found in dataframe, check \
 # [LocationAbbr] columns for available sod variable")
 
-    if stratification not in set(dataframe[STRAT_LONG]):
+    if stratification not in unique_values(dataframe, STRAT_LONG, exclude=national):
         raise NameError(f"{stratification} not found in dataframe, check \
 [StratificationCategory1] columns for available sod variable")
 
-    data_analysis = dataframe[(dataframe["Question"] == sod) \
-    & (dataframe[STRAT_LONG] == stratification)]
+    data_analysis = select(dataframe, {"Question": sod,
+                                       STRAT_LONG: stratification})
+    data_analysis = data_analysis[data_analysis[LOC_SHORT] != "US"]
 
     # set exceptions
     if all( not str(x).replace(".","").isdigit() \
@@ -107,8 +139,9 @@ into numeric or contains NAs, try to clean it before analyzing.")
     sod_var.columns = [sod + " - " + x for x in sod_var.columns]
     x_col = list(sod_var.columns)
 
-    data_analysis = dataframe[(dataframe["Question"] == health_outcome) \
-    & (dataframe[STRAT_LONG] == stratification)]
+    data_analysis = select(dataframe, {"Question": health_outcome,
+                                       STRAT_LONG: stratification})
+    data_analysis = data_analysis[data_analysis[LOC_SHORT] != "US"]
 
     # set exceptions
     if all( not str(x).replace(".","").isdigit() \
@@ -132,6 +165,8 @@ into numeric or contains NAs, try to clean it before analyzing.")
     dataframeplot = sod_var.join(outcome_var).reset_index()
 
     chart = alt.hconcat()
+    if print_corr:
+        dataframeplot_complete = dataframeplot.dropna()
     #plotlist = []
     for xvar in x_col:
         for yvar in y_col:
@@ -143,12 +178,155 @@ into numeric or contains NAs, try to clean it before analyzing.")
             chart |= plot
 
             if print_corr:
-                res = sp.stats.spearmanr(dataframeplot.dropna()[xvar],
-                                   dataframeplot.dropna()[yvar])
+                res = sp.stats.spearmanr(dataframeplot_complete[xvar],
+                                   dataframeplot_complete[yvar])
                 print(f'spearmanr correlation coefficient for \
 [{xvar}] and [{yvar}]: {res} \n')
 
-    return chart.interactive()
+    return _minimized(chart.interactive(), minimize)
+
+
+def _pairwise_ranks(below, observed):
+    """
+    Average ranks of each column among the rows observed in every other
+column, [a, i, b] = rank of row i of column a among rows observed in both
+columns a and b. @below[a, i, j] is 1 if row j is below row i in column a
+and 1/2 if tied (self included).
+    """
+    return np.matmul(below, observed) + 0.5
+
+
+def spearman_matrix(stratification,
+                    dataframe,
+                    datatype=None,
+                    min_periods=3,
+                    chunk_size=64):
+    """
+    Spearman correlation of every pair of questions across states, for one
+stratification. States x questions are pivoted once (mean [DataValue] per
+state as in plot_corr) and all pairs are computed with matrix operations.
+Each pair uses the states observed for both questions (pairwise complete),
+ranked among those states, which matches
+pd.DataFrame.corr(method='spearman').
+
+    Parameters:
+    @stratification: string variable drawn from the [StratificationCategory1]
+column
+    @dataframe: CDI dataframe or hdcd.store.CDIStore
+    @datatype: string variable drawn from the [DataValueType] column; if
+None, every [Question] - [DataValueType] combination is a column as in
+plot_corr
+    @min_periods: minimum number of states observed for both questions,
+NaN otherwise
+    @chunk_size: number of questions processed at once, bounds memory
+    @return: a square pd.DataFrame of correlations
+    """
+    if stratification not in unique_values(dataframe, STRAT_LONG):
+        raise NameError(f"{stratification} not found in dataframe, check \
+[StratificationCategory1] columns for available variable")
+
+    criteria = {STRAT_LONG: stratification}
+    if datatype is not None:
+        if datatype not in unique_values(dataframe, D_TYPE):
+            raise NameError(f"{datatype} not found in dataframe, check \
+[DataValueType] columns for available variable")
+        criteria[D_TYPE] = datatype
+
+    data_analysis = select(dataframe, criteria)
+    data_analysis = data_analysis[data_analysis[LOC_SHORT] != "US"]
+    values = pd.to_numeric(data_analysis[D_VALUE], errors='coerce')
+    if datatype is None:
+        question = data_analysis["Question"] + " - " + data_analysis[D_TYPE]
+    else:
+        question = data_analysis["Question"]
+
+    # states x questions, one pass
+    pivot = values.groupby([data_analysis[LOC_SHORT].to_numpy(),
+                            question.to_numpy()]).mean().unstack()
+    x = pivot.to_numpy(dtype=float)
+    n_rows, n_columns = x.shape
+    observed = ~np.isnan(x)
+
+    if observed.all():
+        # no missing states, every pair shares the same ranks
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = np.corrcoef(sp.rankdata(x, axis=0), rowvar=False)
+        if n_rows < min_periods:
+            corr[:] = np.nan
+        return pd.DataFrame(np.clip(corr, -1, 1),
+                            index=pivot.columns.rename(None),
+                            columns=pivot.columns.rename(None))
+
+    observed = observed.astype(float)
+    # below[a, i, j]: row j is below row i in column a (1/2 if tied),
+    # NaN never compares
+    column_major = x.T
+    below = (column_major[:, None, :] < column_major[:, :, None]) + \
+        (column_major[:, None, :] == column_major[:, :, None]) / 2
+
+    corr = np.full((n_columns, n_columns), np.nan)
+    for start in range(0, n_columns, chunk_size):
+        chunk = slice(start, min(start + chunk_size, n_columns))
+        # ranks of the chunk columns and of every column against them
+        rank_a = _pairwise_ranks(below[chunk], observed)
+        rank_b = _pairwise_ranks(below, observed[:, chunk]).transpose(2, 1, 0)
+
+        both = observed[:, chunk].T[:, :, None] * observed[None, :, :]
+        n_both = both.sum(axis=1)
+        # average ranks of n values always have mean (n + 1) / 2
+        center = (n_both[:, None, :] + 1) / 2
+        a = (rank_a - center) * both
+        b = (rank_b - center) * both
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rho = (a * b).sum(axis=1) / np.sqrt((a * a).sum(axis=1) *
+                                                (b * b).sum(axis=1))
+        rho[n_both < min_periods] = np.nan
+        corr[chunk] = rho
+
+    return pd.DataFrame(np.clip(corr, -1, 1),
+                        index=pivot.columns.rename(None),
+                        columns=pivot.columns.rename(None))
+
+
+def plot_corr_matrix(stratification,
+                     dataframe,
+                     datatype=None,
+                     min_periods=3,
+                     color_scheme="redblue",
+                     width='container',
+                     minimize=False):
+    """
+    Plot a heatmap of the Spearman correlation of every pair of questions
+across states, given @dataframe. See spearman_matrix for the parameters.
+
+    Parameters:
+    @color_scheme: diverging color scheme of the correlations
+    @minimize: if True, keep only the data the chart draws (see
+hdcd.minimize.minimize_chart) and log the spec size before and after, in bytes
+(logger "hdcd.plot", INFO level)
+    @return: an alt.Chart() object
+    """
+    corr = spearman_matrix(stratification,
+                           dataframe,
+                           datatype=datatype,
+                           min_periods=min_periods)
+
+    heatmap_df = corr.rename_axis("x").reset_index().melt(
+        id_vars="x", var_name="y", value_name="correlation")
+
+    heatmap = alt.Chart(heatmap_df,
+                        title=f"Spearman correlation ({stratification})").mark_rect(
+    ).encode(
+        alt.X("x:N", title=None, sort=list(corr.columns)),
+        alt.Y("y:N", title=None, sort=list(corr.columns)),
+        color=alt.Color("correlation:Q",
+                        scale=alt.Scale(scheme=color_scheme,
+                                        domain=[-1, 1])),
+        tooltip=["x:N", "y:N", alt.Tooltip("correlation:Q", format=".3f")]
+    ).properties(
+        width=width
+    )
+    return within_max_rows(_minimized(heatmap, minimize))
 
 
 def plot_geomap(variable,
@@ -156,7 +334,9 @@ def plot_geomap(variable,
                 stratification,
                 dataframe,
                 color_scheme = "bluepurple",
-                width = 'container'):
+                width = 'container',
+                pre_aggregate = False,
+                minimize = False):
                 # height = 720):
     """
     Plot a longitudinal geomap (of the United States) distribution of @variable,
@@ -171,34 +351,35 @@ from the [DataValueType] column of the @dataframe. Or user are recommended to \
 use the variable_summary() function to check the DataValueType.
     @dataframe: pd.DataFrame, the dataframe used to generate the plot, must be
 formatted and contains required columns, including
-["YearStart","Question","DataValue","DataValueType"].
+["YearStart","Question","DataValue","DataValueType"]. A hdcd.store.CDIStore
+of the dataframe is also accepted.
+    @pre_aggregate: if True, average [DataValue] per (state, year) before
+plotting and embed one row per state with one column per year; the year
+slider then looks up the column of the selected year instead of filtering
+every row of @dataframe in the browser. The tooltip is the same in both
+modes.
+    @minimize: if True, keep only the data the chart draws (see
+hdcd.minimize.minimize_chart) and log the spec size before and after, in bytes
+(logger "hdcd.plot", INFO level)
     """
-    # set up id map
-    from vega_datasets import data
-    pop = data.population_engineers_hurricanes()
-    state2id = dict(zip(pop["state"],
-                        pop["id"]))
-
     # set exceptions
-    if variable not in set(dataframe["Question"]):
+    if variable not in unique_values(dataframe, "Question"):
         raise NameError(f"{variable} not found in dataframe, check [Question] \
 columns for available variable")
 
-    if datatype not in set(dataframe[D_TYPE]):
+    if datatype not in unique_values(dataframe, D_TYPE):
         raise NameError(f"{datatype} not found in dataframe, check \
 [DataValueType] columns for available variable")
 
-    if stratification not in set(dataframe[STRAT_LONG]):
+    if stratification not in unique_values(dataframe, STRAT_LONG):
         raise NameError(f"{stratification} not found in dataframe, check \
 [StratificationCategory1] columns for available variable")
 
-    dataframeplot = dataframe[dataframe["Question"] == variable]
-    dataframeplot["id"] = [int(state2id[x]) \
-    if x in state2id else np.nan for x in dataframeplot[LOC_LONG]]
-
-    # stratification
-    dataframeplot = dataframeplot[dataframeplot[STRAT_LONG] \
-    == stratification]
+    # question and stratification
+    dataframeplot = select(dataframe, {"Question": variable,
+                                       STRAT_LONG: stratification})
+    # state FIPS ids from the state dimension table
+    dataframeplot["id"] = state_ids(dataframeplot[LOC_LONG])
 
     # datatype
     if all( not str(x).replace(".","").isdigit() \
@@ -220,7 +401,7 @@ into numeric or contains NAs, try to clean it before analyzing.")
     slider_selection = alt.selection_point(bind=select_year,
                                            fields=['YearStart'])
 
-    states = alt.topo_feature(data.us_10m.url, feature='states')
+    states = us_feature('states')
 
     background = alt.Chart(states).mark_geoshape(
         fill='lightgray',
@@ -230,13 +411,49 @@ into numeric or contains NAs, try to clean it before analyzing.")
         # height=height
     )
 
-    foreground = alt.Chart(dataframeplot).mark_geoshape().encode(
-        color=alt.Color(
+    values = dataframeplot[D_VALUE]
+    if pre_aggregate:
+        # one row per state id, one column per year
+        per_year = dataframeplot.groupby(["id", YEAR])[D_VALUE].mean().unstack()
+        per_year.columns = [str(int(x)) for x in per_year.columns]
+        years = list(per_year.columns)
+        # the colors span the drawn state means, not the raw rows
+        values = per_year[years].stack()
+        # state names of the data, as in the tooltip of the rows
+        per_year.insert(0, LOC_LONG, dataframeplot.groupby("id")[LOC_LONG].first())
+
+    color = alt.Color(
                 D_VALUE+":Q",
                 scale=alt.Scale(scheme=color_scheme,
-                                domainMax = dataframeplot[D_VALUE].max(),
-                                domainMin = dataframeplot[D_VALUE].min()),
-            ),
+                                domainMax = values.max(),
+                                domainMin = values.min()),
+            )
+
+    if pre_aggregate:
+        year_param = alt.param(name=YEAR, value=int(years[-1]) if years else None,
+                               bind=select_year)
+
+        foreground = alt.Chart(states).mark_geoshape().encode(
+            color=color,
+            tooltip=[LOC_LONG+":N", YEAR+":Q", D_VALUE+":Q"]
+        ).transform_lookup(
+            lookup='id',
+            from_=alt.LookupData(per_year.reset_index(), 'id', [LOC_LONG] + years)
+        ).transform_calculate(
+            **{YEAR: YEAR, D_VALUE: f"datum[{YEAR}]"}
+        ).transform_filter(
+            f"isValid(datum.{D_VALUE})"
+        ).properties(
+            width=width
+        ).project(
+            type='albersUsa'
+        ).add_params(
+            year_param
+        )
+        return _minimized(background + foreground, minimize)
+
+    foreground = alt.Chart(dataframeplot).mark_geoshape().encode(
+        color=color,
         tooltip=[LOC_LONG+":N", YEAR+":Q", D_VALUE+":Q"]
     ).transform_lookup(
         lookup='id',
@@ -254,7 +471,7 @@ into numeric or contains NAs, try to clean it before analyzing.")
                     ).transform_filter(
         slider_selection,
     )
-    return background + foreground
+    return _minimized(background + foreground, minimize)
 
 
 def plot_geomap_by_location(variable,
@@ -263,7 +480,8 @@ def plot_geomap_by_location(variable,
                             longitude = "longitude",
                             latitude = "latitude",
                             color_scheme = "bluepurple",
-                            width = 'container'):
+                            width = 'container',
+                            minimize = False):
                             # height = 720):
 
     """
@@ -281,11 +499,12 @@ use the variable_summary() function to check the DataValueType.
     @dataframe: pd.DataFrame, the dataframe used to generate the plot, must be \
 formatted and contains required columns,
     including ["YearStart","Question","DataValue","DataValueType"].
+    @minimize: if True, keep only the data the chart draws (see
+hdcd.minimize.minimize_chart) and log the spec size before and after, in bytes
+(logger "hdcd.plot", INFO level)
     """
 
-    from vega_datasets import data
-
-    states = alt.topo_feature(data.us_10m.url, feature='states')
+    states = us_feature('states')
     dataframe = dataframe[dataframe["Question"] == variable]
 
     # set exceptions
@@ -322,13 +541,14 @@ columns for available variable")
         size=alt.value(10),
     )
 
-    return background + points
+    return _minimized(background + points, minimize)
 
 
 def plot_longitudinal_change(variable,
                              location,
                              stratification,
-                             dataframe):
+                             dataframe,
+                             minimize=False):
 
     """
     Plot a longitudinal lineplot of @variable, with unit in @datatype at \
@@ -341,16 +561,19 @@ different panels, given @dataframe.
 dataframe
     @stratification: string variable drawn from the [StratificationCategory1] \
 column
+    @dataframe: CDI dataframe or hdcd.store.CDIStore
     @output: an interactive pointplot of longitudinal change with respect to \
 @variable
+    @minimize: if True, keep only the data the chart draws (see
+hdcd.minimize.minimize_chart) and log the spec size before and after, in bytes
+(logger "hdcd.plot", INFO level)
     @return: an alt.layer() object
 
     """
 
-    dataframeplot = dataframe[(dataframe[LOC_LONG] == location) \
-    & (dataframe["Question"] == variable)]
-    tmp = dataframeplot[dataframeplot[STRAT_LONG] \
-    == stratification]
+    tmp = select(dataframe, {"Question": variable,
+                             STRAT_LONG: stratification,
+                             LOC_LONG: location})
 
     domain = list(tmp[STRAT_SHORT].unique())
     colors = alt.Scale(
@@ -377,84 +600,212 @@ column
         alt.Color('Stratification1:N', scale=colors),
         tooltip=[YEAR,D_VALUE,STRAT_SHORT])
 
-    return alt.layer(points, cis, line).facet(
+    longitudinal = alt.layer(points, cis, line).facet(
       data=tmp,
       column='DataValueType:N'
     ).resolve_scale(
         x='independent',
         y='independent')
+    return _minimized(longitudinal, minimize)
+
+def county_topology(geodataframe, level='national', cache=None):
+    """
+    Simplified, quantized TopoJSON of county geoshapes as inline Altair
+data, with the integer county FIPS (GEOID) as feature id.
+
+    Parameters:
+
+    @geodataframe: GeoDataFrame of counties with a [GEOID] column
+    @level: level of detail, one of hdcd.topology.LEVELS ('national',
+'state' or 'zoomed')
+    @cache: hdcd.cache.ReferenceCache whose directory stores the TopoJSON,
+defaults to the process-wide cache
+    @return: Vega-Lite data (dict) with the 'counties' feature, see
+us_feature
+    """
+    counties = geodataframe.drop_duplicates('GEOID')
+    topology = cached_topojson(counties[['GEOID', counties.geometry.name]],
+                               level=level,
+                               id_column='GEOID',
+                               cache=cache)
+
+    return _topology_data(topology, 'counties')
+
+_remote_maps = False
+
+def remote_maps(enable=None):
+    """
+    Link the vega_datasets us-10m TopoJSON (US_10M) in the geomaps instead
+of the bundled shapes, which keeps specs small but needs network access
+when the maps are rendered. Off by default.
+
+The bundled shapes and county FIPS table are the Census 2016 counties,
+and us-10m predates some FIPS changes, e.g. Oglala Lakota County, SD is
+46102 in the bundled data and 46113 (Shannon County) in us-10m. Conditions
+of such counties are not drawn on the linked map.
+
+    Parameters:
+
+    @enable: True to link us-10m, False to use the bundled shapes, None to
+leave the setting unchanged
+    @return: the setting before the call
+    """
+    global _remote_maps
+    previous = _remote_maps
+    if enable is not None:
+        _remote_maps = bool(enable)
+    return previous
+
+def us_feature(feature='states'):
+    """
+    TopoJSON of US states or counties as Altair data, with integer FIPS
+codes as feature ids. The bundled copy (hdcd.geo.us_topology) is used, so
+maps render without network access: inline (about 270 kB for states,
+1 MB for counties) or written once to the shared data directory if the
+'hdcd' data transformer is enabled. With remote_maps enabled, the
+vega_datasets us-10m file is linked by URL instead.
+
+    Parameters:
+
+    @feature: 'states' or 'counties'
+    @return: Vega-Lite data (dict), the topology inline or a URL
+    """
+    if feature not in TOPOLOGY_FILES:
+        raise ValueError(f'"feature" must be one of {list(TOPOLOGY_FILES)}')
+    if _remote_maps:
+        return {'url': US_10M,
+                'format': {'type': 'topojson', 'feature': feature}}
+    return _topology_data(us_topology(feature), feature)
+
+def _topology_data(topology, feature):
+    """
+    Vega-Lite data of @feature of a TopoJSON @topology. The topology is
+inlined as a JSON string, which Vega parses with the format; Altair would
+otherwise deep-copy and validate its nested arrays on every layer and
+to_dict call. Altair does not pass dicts through the data transformers, so
+the shared data transformer is applied here to write the topology once
+instead of into every spec.
+    """
+    data = {'values': json.dumps(topology, separators=(',', ':')),
+            'format': {'type': 'topojson', 'feature': feature}}
+    if alt.data_transformers.active == 'hdcd':
+        data = alt.data_transformers.get()(data)
+    return data
 
 def plot_geomap_socioeconomic(dataframe,
-                              width='container'):
+                              width='container',
+                              level='national',
+                              cache=None,
+                              sdoh='poverty',
+                              minimize=False):
     """
-    Plot a geomap of selected SDOH given @dataframe at the county level.
+    Plot a geomap of selected SDOH given @dataframe at the county level, with
+a dropdown to switch between them.
         * High school education (%)
         * Median income ($)
         * No health insurance (%)
         * Poverty (%)
 
+    County shapes are embedded once as simplified, quantized TopoJSON and
+joined to one table of the four SDOH values by county FIPS. The table is
+folded to long format in the spec and filtered by the dropdown, so a
+single chart carries all four maps.
+
     Parameters:
 
     @dataframe: counties_socioeconomic dataframe from data_wrangling.AoU_socioeconomic
+    @level: level of detail of the county shapes, one of
+hdcd.topology.LEVELS ('national', 'state' or 'zoomed')
+    @cache: hdcd.cache.ReferenceCache whose directory stores the TopoJSON,
+defaults to the process-wide cache
+    @sdoh: SDOH shown first, one of the keys of SDOH
+    @minimize: if True, keep only the data the chart draws (see
+hdcd.minimize.minimize_chart) and log the spec size before and after, in bytes
+(logger "hdcd.plot", INFO level)
     @return: an alt.Chart() object with geomap and encoded SDOH data
     """
     if not isinstance(dataframe, pd.DataFrame):
         raise ValueError('"dataframe" must be a Pandas DataFrame')
 
-    from vega_datasets import data
-    alt.data_transformers.disable_max_rows()
-
-    for sdoh in ['high_school_education',
-                'median_income',
-                'no_health_insurance',
-                'poverty']:
-
-        dataframe[sdoh] = dataframe[sdoh].astype('float')
-        if sdoh == 'high_school_education':
-            title = 'High School Education (%)'
-            scheme = 'darkblue'
-        elif sdoh == 'median_income':
-            title = 'Median Income ($)'
-            scheme = 'yelloworangered'
-        elif sdoh == 'no_health_insurance':
-            title = 'No Health Insurance (%)'
-            scheme = 'lightgreyred'
-        elif sdoh == 'poverty':
-            title = 'Poverty (%)'
-            scheme = 'lightmulti'
-
-        sdoh_geomap = alt.Chart(dataframe, title=title).mark_geoshape(
-        stroke='white'
-        ).encode(
-            color=alt.Color(sdoh+':Q',
-                            scale=alt.Scale(scheme=scheme),
-                            title=title),
-            tooltip=[alt.Tooltip('county:N', title='County'),
-                    alt.Tooltip('state_abbr:N', title='State'),
-                    alt.Tooltip(sdoh+':Q', title=title, format='.2f')]
-        ).project(
-            type='albersUsa'
-        ).properties(
-            width=width
-        )
-
-        sdoh_geomap
+    if sdoh not in SDOH:
+        raise ValueError(f'"sdoh" must be one of {list(SDOH)}')
+
+    counties = county_topology(dataframe, level=level, cache=cache)
+    # tooltip names from the geoshapes if not merged in
+    if 'county' in dataframe.columns:
+        county = dataframe['county']
+    else:
+        county = dataframe['NAME']
+    if 'state_abbr' in dataframe.columns:
+        state_abbr = dataframe['state_abbr']
+    else:
+        state_abbr = dataframe['STATEFP'].astype(int).map(
+            state_dimension().set_index('state_fips')['state_abbr'])
+    values = pd.DataFrame({'id': dataframe['GEOID'].astype(int).to_numpy(),
+                           'county': county.to_numpy(),
+                           'state_abbr': state_abbr.to_numpy()})
+    for column in SDOH:
+        values[column] = dataframe[column].astype('float').to_numpy()
+
+    input_dropdown = alt.binding_select(options=list(SDOH),
+                                        labels=[x[0] for x in SDOH.values()],
+                                        name='SDOH ')
+    selection_sdoh = alt.param(name='sdoh', value=sdoh, bind=input_dropdown)
+
+    # title and color scheme of the selected SDOH
+    title = scheme = None
+    for column, (sdoh_title, sdoh_scheme) in SDOH.items():
+        title = f"sdoh == '{column}' ? '{sdoh_title}' : " + (title or "''")
+        scheme = f"sdoh == '{column}' ? '{sdoh_scheme}' : " + (scheme or "''")
+
+    sdoh_geomap = alt.Chart(counties,
+                            title=alt.Title(alt.ExprRef(title))).mark_geoshape(
+    stroke='white'
+    ).transform_lookup(
+        lookup='id',
+        from_=alt.LookupData(values, 'id', ['county', 'state_abbr'] + list(SDOH))
+    ).transform_fold(
+        list(SDOH), as_=['sdoh', 'value']
+    ).transform_filter(
+        alt.datum.sdoh == selection_sdoh
+    ).encode(
+        color=alt.Color('value:Q',
+                        scale=alt.Scale(scheme=alt.ExprRef(scheme)),
+                        title=None),
+        tooltip=[alt.Tooltip('county:N', title='County'),
+                alt.Tooltip('state_abbr:N', title='State'),
+                alt.Tooltip('value:Q', title='Value', format='.2f')]
+    ).project(
+        type='albersUsa'
+    ).properties(
+        width=width
+    ).add_params(
+        selection_sdoh
+    )
 
-        #sdoh_geomap.save(sdoh + '_geomap.html')
+    #sdoh_geomap.save('sdoh_geomap.html')
 
-    return sdoh_geomap
+    return within_max_rows(_minimized(sdoh_geomap, minimize))
 
-def plot_geomap_conditions(dataframe, width='container'):
+def plot_geomap_conditions(dataframe, width='container', cache=None, level=None,
+                           minimize=False):
     """
     Plot a geomap of conditions given @dataframe.
 
     Parameters:
 
-    @dataframe: conditions dataframe from data_wrangling.AoU_conditions
+    @dataframe: conditions dataframe from data_wrangling.AoU_conditions, an
+[id] column of county FIPS is added from [state_abbr] and [county] if missing
+    @cache: hdcd.cache.ReferenceCache for the counties geoJSON used with
+@level, defaults to the process-wide cache
+    @level: if given, embed the counties geoJSON as simplified TopoJSON at
+this level of detail (see hdcd.topology.LEVELS) instead of the
+US counties TopoJSON of us_feature
+    @minimize: if True, keep only the data the chart draws (see
+hdcd.minimize.minimize_chart) and log the spec size before and after, in bytes
+(logger "hdcd.plot", INFO level)
     @return: an alt.Chart() object with geomap and encoded conditions counts
     """
-    from vega_datasets import data
-
     # set exceptions
     if dataframe.empty:
         raise ValueError(f"{dataframe} is empty, load a dataframe that is not empty.")
@@ -466,16 +817,20 @@ def plot_geomap_conditions(dataframe, width='container'):
     #if dataframe is None:
     #    raise TypeError(f"{dataframe} has None as type, load a dataframe that is not None.")
 
-    alt.data_transformers.disable_max_rows()
-    counties = gpd.read_file('https://gist.githubusercontent.com/\
-sdwfrost/d1c73f91dd9d175998ed166eb216994a/raw/e89c35f308cee7e2e5a784e1d\
-3afc5d449e9e4bb/counties.geojson')
-
-    countyname2geoid = dict(zip(counties["NAME"],
-                            counties["GEOID"].astype(int)))
-
     dfplot = dataframe.copy()
-    counties = alt.topo_feature(data.us_10m.url, 'counties')
+    # bundled county FIPS table, unless the map uses the geoshapes
+    geoshapes = None
+    if level is not None:
+        geoshapes = (cache or get_cache()).read_geoshapes(COUNTIES_GEOJSON)
+    if "id" not in dfplot.columns:
+        dfplot["id"] = county_ids(county_dimension(geoshapes),
+                                  dfplot["state_abbr"],
+                                  dfplot["county"])
+        dfplot = dfplot.dropna(subset=["id"]).astype({"id": int})
+    if level is not None:
+        counties = county_topology(geoshapes, level=level, cache=cache)
+    else:
+        counties = us_feature('counties')
 
     input_dropdown = alt.binding_select(options=list(dataframe["standard_concept_name"].unique()),
                                     name='Conditions')
@@ -531,4 +886,18 @@ sdwfrost/d1c73f91dd9d175998ed166eb216994a/raw/e89c35f308cee7e2e5a784e1d\
     conditions_geomap = background + foreground
     #conditions_geomap.save('conditions_geomap.html')
 
-    return conditions_geomap
+    return within_max_rows(_minimized(conditions_geomap, minimize))
+
+def _minimized(chart, minimize):
+    """
+    @chart through hdcd.minimize.minimize_chart if @minimize, logging the
+spec size before and after.
+    """
+    if not minimize:
+        return chart
+    # the limit is only lifted while the sizes are measured
+    with alt.data_transformers.disable_max_rows():
+        chart, sizes = minimize_chart(chart)
+    logger.info("spec size: %s -> %s bytes (%.0f%%)", f"{sizes['before']:,}",
+                f"{sizes['after']:,}", 100 * sizes['after'] / sizes['before'])
+    return chart
@@ -0,0 +1,195 @@
+"""
+This Python script renders batches of hdcd.plot charts to static files
+across a pool of worker processes:
+    * render_charts: build and render chart requests to SVG, PNG or HTML
+
+A chart request is a dict:
+    {'function': 'plot_geomap',                  # an hdcd.plot function
+     'kwargs': {'variable': ..., 'datatype': ...},   # its arguments
+     'data': 'cdi',                              # optional, see below
+     'output': 'reports/geomap.svg'}             # format from the extension
+
+Datasets are passed by name in @datasets and sent to each worker once,
+when it starts, instead of with every request; 'data' names the dataset
+passed to the plot function as its dataframe argument. Workers are reused
+for the whole batch, so hdcd, Altair and the Vega converter load once per
+worker. Requests whose output file already exists are skipped.
+
+SVG and PNG are rendered locally by the headless vl-convert converter
+(`pip install vl-convert-python`). HTML pages load Vega from a CDN, as
+Altair's chart.save() does, and need no converter.
+
+This script requires `pandas` and `altair`.
+"""
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from altair.utils.html import spec_to_html
+from altair.vegalite.v5 import VEGALITE_VERSION, VEGA_VERSION, VEGAEMBED_VERSION
+
+from . import plot
+
+__all__ = ['render_charts', 'FORMATS']
+
+FORMATS = ('svg', 'png', 'html')
+# plot_geomap_by_location is public but not in plot.__all__
+FUNCTIONS = [x for x in plot.__all__ if x.startswith('plot_')] + ['plot_geomap_by_location']
+
+# datasets of the current worker, set once by _init_worker
+_datasets = {}
+
+
+def _vl_convert():
+    try:
+        import vl_convert
+    except ImportError as e:
+        raise ImportError('SVG and PNG output require the `vl-convert-python` \
+package, install it with `pip install vl-convert-python`') from e
+    return vl_convert
+
+
+def _init_worker(datasets):
+    global _datasets
+    _datasets = datasets
+
+
+def _output_format(output):
+    extension = os.path.splitext(str(output))[1].lstrip('.').lower()
+    if extension not in FORMATS:
+        raise ValueError(f'output "{output}" must end with one of {list(FORMATS)}')
+    return extension
+
+
+def _render(spec, output_format, scale):
+    """
+    Render a Vega-Lite spec to the bytes of an SVG, PNG or HTML file.
+    """
+    if output_format == 'html':
+        return spec_to_html(spec, mode='vega-lite',
+                            vegalite_version=VEGALITE_VERSION,
+                            vegaembed_version=VEGAEMBED_VERSION,
+                            vega_version=VEGA_VERSION).encode()
+
+    vlc = _vl_convert()
+    # render with the Vega-Lite version Altair targets, if bundled
+    version = '.'.join(VEGALITE_VERSION.split('.')[:2])
+    if version not in vlc.get_vegalite_versions():
+        version = None
+    vl_spec = json.dumps(spec)
+    if output_format == 'svg':
+        return vlc.vegalite_to_svg(vl_spec, vl_version=version).encode()
+    return vlc.vegalite_to_png(vl_spec, vl_version=version, scale=scale)
+
+
+def _render_request(request, scale=1):
+    """
+    Build, render and write one chart request.
+
+    Return:
+        row (dict): report row, with the error instead of raising it
+    """
+    row = {'output': request['output'], 'function': request['function'],
+           'status': 'rendered', 'build_s': np.nan, 'render_s': np.nan,
+           'bytes': 0, 'error': None}
+    try:
+        start = time.perf_counter()
+        kwargs = dict(request.get('kwargs') or {})
+        if request.get('data') is not None:
+            kwargs['dataframe'] = _datasets[request['data']]
+        spec = getattr(plot, request['function'])(**kwargs).to_dict()
+        built = time.perf_counter()
+
+        raw = _render(spec, _output_format(request['output']), scale)
+        rendered = time.perf_counter()
+
+        path = str(request['output'])
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp_path, path)
+
+        row.update(build_s=built - start, render_s=rendered - built,
+                   bytes=len(raw))
+    except Exception as e:
+        row.update(status='failed', error=f'{type(e).__name__}: {e}')
+
+    return row
+
+
+def render_charts(requests, datasets=None, processes=None, scale=1,
+                  overwrite=False):
+    """
+    Build and render a batch of hdcd.plot charts to SVG, PNG or HTML files
+        across a pool of worker processes.
+
+    Args:
+        requests (list): chart requests, dicts with 'function' (name of an
+            hdcd.plot function), 'kwargs' (its arguments), 'output' (file
+            path ending in .svg, .png or .html) and optionally 'data' (name
+            of the dataset in @datasets passed as dataframe)
+        datasets (dict): name to DataFrame or hdcd.CDIStore, sent to each
+            worker once
+        processes (int): number of worker processes, defaults to the number
+            of CPUs; 1 renders in the current process
+        scale (float): PNG scale factor
+        overwrite (bool): render requests whose output already exists
+
+    Return:
+        report (DataFrame): one row per request, in order, with 'output',
+            'function', 'status' ('rendered', 'skipped' or 'failed'),
+            'build_s' and 'render_s' (seconds), 'bytes' and 'error'
+    """
+    datasets = datasets or {}
+    if processes is not None and processes < 1:
+        raise ValueError('"processes" must be a positive integer')
+
+    outputs = set()
+    for request in requests:
+        if request.get('function') not in FUNCTIONS:
+            raise ValueError(f'"function" must be one of {FUNCTIONS}')
+        if request.get('data') is not None and request['data'] not in datasets:
+            raise NameError(f"{request['data']} not found in datasets.")
+        _output_format(request.get('output', ''))
+        if request['output'] in outputs:
+            raise ValueError(f"output \"{request['output']}\" is requested twice")
+        outputs.add(request['output'])
+
+    rows = [None] * len(requests)
+    todo = []
+    for i, request in enumerate(requests):
+        if not overwrite and os.path.exists(request['output']):
+            rows[i] = {'output': request['output'], 'function': request['function'],
+                       'status': 'skipped', 'build_s': np.nan, 'render_s': np.nan,
+                       'bytes': os.path.getsize(request['output']), 'error': None}
+        else:
+            todo.append(i)
+
+    workers = min(processes or os.cpu_count() or 1, len(todo))
+    if workers <= 1:
+        previous = dict(_datasets)
+        _init_worker(datasets)
+        try:
+            for i in todo:
+                rows[i] = _render_request(requests[i], scale)
+        finally:
+            _init_worker(previous)
+    else:
+        # spawn: forked workers hang once the converter ran in this process
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(datasets,)) as executor:
+            results = executor.map(_render_request, [requests[i] for i in todo],
+                                   [scale] * len(todo))
+            for i, row in zip(todo, results):
+                rows[i] = row
+
+    return pd.DataFrame(rows, columns=['output', 'function', 'status', 'build_s',
+                                       'render_s', 'bytes', 'error'])
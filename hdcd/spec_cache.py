@@ -0,0 +1,293 @@
+"""
+This Python script defines an opt-in cache of serialized chart specs for
+dashboards that redraw the same charts from the same data:
+    * SpecCache: in-memory LRU cache of spec JSON, with an optional disk tier
+    * cached_spec: spec JSON of a plot function call, through a SpecCache
+    * fingerprint: content hash of a DataFrame or CDIStore
+
+Specs are keyed by the plot function and a hash of the source of its
+module, its arguments (bound to its signature, so positional and keyword
+calls share an entry), the hdcd and Altair versions, the active Altair
+data transformer and theme, the remote_maps setting, and a fingerprint
+of every DataFrame argument. Editing or upgrading the plot code therefore
+never serves a spec drawn by the old code from the disk tier.
+
+Fingerprints hash the index and the raw buffers of numeric columns
+directly and other columns by value (pd.util.hash_array), so
+equal data gives equal keys in any process and the disk tier can be
+shared between sessions. The fingerprint of a CDIStore is computed once
+per store, and that of a DataFrame once per frame until one of its
+columns, its index or its column names is replaced, so a hit costs no
+hashing. Values edited in place are not detected: pass a copy.
+
+A hit returns the spec JSON without calling the plot function, so
+nothing it prints is printed again.
+
+This script requires `pandas` and `altair`.
+"""
+import collections
+import hashlib
+import inspect
+import json
+import os
+import weakref
+
+import numpy as np
+import pandas as pd
+import altair as alt
+
+from . import __version__
+from .cache import get_cache
+from .plot import remote_maps
+from .store import CDIStore
+
+__all__ = ['SpecCache', 'cached_spec', 'fingerprint']
+
+# fingerprints of CDIStore objects, computed once per store
+_store_fingerprints = weakref.WeakKeyDictionary()
+# fingerprints of DataFrames and Series by id, with the objects backing
+# them when hashed; dropped when the frame is garbage collected
+_frame_fingerprints = {}
+# source hashes of plot functions, computed once per function
+_code_hashes = weakref.WeakKeyDictionary()
+
+_default_spec_cache = None
+
+
+def _column_buffer(values):
+    """
+    Bytes that identify the content of a column or index.
+    """
+    if getattr(values.dtype, 'name', None) == 'geometry':
+        import shapely
+        return b''.join(x or b'' for x in shapely.to_wkb(np.asarray(values)))
+    if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'biufcmM':
+        return np.ascontiguousarray(values.to_numpy()).tobytes()
+    return pd.util.hash_pandas_object(values, index=False).to_numpy().tobytes()
+
+
+def _backing(data):
+    """
+    The index, column labels (or name) and arrays backing @data. Assigning
+    a column, the index or the labels replaces one of them, while editing
+    values in place does not.
+    """
+    labels = data.name if isinstance(data, pd.Series) else data.columns
+    return [data.index, labels] + list(data._mgr.arrays)
+
+
+def fingerprint(data):
+    """
+    Content hash of a DataFrame, Series or CDIStore, from its index,
+        column names, dtypes and column buffers. The hash is computed
+        once per store, and once per DataFrame or Series until a column,
+        its index or its labels are replaced; values edited in place
+        (e.g. df.loc[0, 'DataValue'] = 0) are not detected, so pass a
+        copy after such edits.
+
+    Args:
+        data (DataFrame, Series or CDIStore): chart data
+
+    Return:
+        digest (str): hex digest, None if a column cannot be hashed
+            (e.g. lists)
+    """
+    if isinstance(data, CDIStore):
+        if data not in _store_fingerprints:
+            _store_fingerprints[data] = fingerprint(data.frame)
+        return _store_fingerprints[data]
+
+    key = id(data)
+    backing = _backing(data)
+    cached = _frame_fingerprints.get(key)
+    if cached is not None and len(cached[0]) == len(backing) and \
+            all(x is y for x, y in zip(cached[0], backing)):
+        return cached[1]
+
+    digest = _hash_frame(data)
+    if cached is None:
+        weakref.finalize(data, _frame_fingerprints.pop, key, None)
+    _frame_fingerprints[key] = (backing, digest)
+    return digest
+
+
+def _hash_frame(data):
+    """
+    Content hash of a DataFrame or Series, None if a column cannot be
+    hashed.
+    """
+    frame = data.to_frame() if isinstance(data, pd.Series) else data
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([type(data).__name__, list(frame.shape),
+                              [str(x) for x in frame.columns],
+                              [str(x) for x in frame.dtypes]]).encode())
+    try:
+        digest.update(_column_buffer(frame.index))
+        for i in range(frame.shape[1]):
+            digest.update(_column_buffer(frame.iloc[:, i]))
+    except TypeError:
+        return None
+    return digest.hexdigest()
+
+
+def _code_hash(function):
+    """
+    Hash of the source of the module defining @function, so an edit to the
+    function or to a helper it calls changes the key. The bytecode and
+    constants of the function if its source is not available.
+    """
+    if function not in _code_hashes:
+        try:
+            source = inspect.getsource(inspect.getmodule(function)).encode()
+        except (TypeError, OSError):
+            code = function.__code__
+            source = code.co_code + repr(code.co_consts).encode()
+        _code_hashes[function] = hashlib.sha256(source).hexdigest()
+    return _code_hashes[function]
+
+
+def _normalize(value):
+    """
+    JSON-able stand-in for an argument: data by fingerprint, caches by
+    directory, containers recursively and anything else by repr.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series, CDIStore)):
+        digest = fingerprint(value)
+        if digest is None:
+            raise TypeError('unhashable data')
+        return {'data': digest}
+    if hasattr(value, 'cache_dir'):
+        return {'cache_dir': os.path.abspath(value.cache_dir)}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(x) for x in value]
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value)
+
+
+class SpecCache():
+    """
+    This class keeps the spec JSON of the most recently used plot calls in
+    memory, and optionally every spec on disk next to the reference files.
+    """
+    def __init__(self, maxsize=128, disk=False, cache=None):
+        """
+        This function initializes objects to be passed in the class.
+
+        Args:
+            maxsize (int): number of specs kept in memory
+            disk (bool): also store specs on disk, in the specs/ directory
+                of @cache
+            cache (ReferenceCache): cache whose directory is used, defaults
+                to the process-wide hdcd.cache cache
+        """
+        if maxsize < 1:
+            raise ValueError('"maxsize" must be a positive integer')
+        self.maxsize = maxsize
+        self.spec_dir = None
+        if disk:
+            self.spec_dir = os.path.join((cache or get_cache()).cache_dir, 'specs')
+        self._memory = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._memory)
+
+    def key(self, function, *args, **kwargs):
+        """
+        Return the cache key of a plot call, None if an argument cannot
+            be fingerprinted.
+        """
+        bound = inspect.signature(function).bind(*args, **kwargs)
+        bound.apply_defaults()
+        try:
+            arguments = _normalize(dict(bound.arguments))
+        except TypeError:
+            return None
+        parts = [function.__module__, function.__qualname__,
+                 _code_hash(function), __version__, alt.__version__,
+                 alt.data_transformers.active,
+                 _normalize(alt.data_transformers.options), alt.themes.active,
+                 remote_maps(), arguments]
+
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:32]
+
+    def spec(self, function, *args, **kwargs):
+        """
+        Return the spec JSON of function(*args, **kwargs), from the cache
+            if the same call was made on the same data before.
+
+        Args:
+            function (callable): plot function returning an Altair chart,
+                e.g. hdcd.plot_geomap
+            args, kwargs: its arguments
+
+        Return:
+            spec (str): Vega-Lite spec JSON
+        """
+        key = self.key(function, *args, **kwargs)
+        if key is None:
+            self.misses += 1
+            return self._to_json(function(*args, **kwargs))
+
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._memory[key]
+
+        path = os.path.join(self.spec_dir, f'{key}.json') if self.spec_dir else None
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                spec = f.read()
+            self.hits += 1
+        else:
+            spec = self._to_json(function(*args, **kwargs))
+            self.misses += 1
+            if path is not None:
+                os.makedirs(self.spec_dir, exist_ok=True)
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'w') as f:
+                    f.write(spec)
+                os.replace(tmp_path, path)
+
+        self._memory[key] = spec
+        if len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+        return spec
+
+    def clear(self):
+        """
+        Remove the specs in memory and on disk.
+        """
+        self._memory.clear()
+        if self.spec_dir is not None and os.path.isdir(self.spec_dir):
+            for file_name in os.listdir(self.spec_dir):
+                if file_name.endswith('.json'):
+                    os.remove(os.path.join(self.spec_dir, file_name))
+
+    @staticmethod
+    def _to_json(chart):
+        return chart.to_json(indent=None, separators=(',', ':'))
+
+
+def cached_spec(function, *args, spec_cache=None, **kwargs):
+    """
+    Spec JSON of function(*args, **kwargs) through @spec_cache.
+
+    Args:
+        function (callable): plot function, e.g. hdcd.plot_geomap
+        spec_cache (SpecCache): defaults to a process-wide in-memory cache
+        args, kwargs: arguments of @function
+
+    Return:
+        spec (str): Vega-Lite spec JSON
+    """
+    global _default_spec_cache
+    if spec_cache is None:
+        if _default_spec_cache is None:
+            _default_spec_cache = SpecCache()
+        spec_cache = _default_spec_cache
+    return spec_cache.spec(function, *args, **kwargs)
@@ -0,0 +1,171 @@
+"""
+This Python script defines an indexed store of the long-format chronic
+disease index (CDI) data for the plotting and summary functions.
+    * CDIStore: CDI data indexed once by
+      (Question, StratificationCategory1, DataValueType, LocationDesc)
+    * select: rows matching column values, from a CDIStore or a DataFrame
+    * unique_values: set of values of a column, from a CDIStore or a DataFrame
+
+The plotting and summary functions accept a CDIStore wherever they accept
+the CDI DataFrame. Building the store sorts the data once; afterwards each
+call retrieves its slice in time proportional to the slice instead of
+masking the whole dataset, which pays off when the same data is queried
+many times (e.g. in a dashboard session). Slices keep the row order of
+the original data, so results match the DataFrame path exactly.
+
+This script requires `numpy` and `pandas`.
+"""
+import numpy as np
+import pandas as pd
+
+__all__ = ['CDIStore', 'select', 'unique_values']
+
+KEYS = ['Question', 'StratificationCategory1', 'DataValueType', 'LocationDesc']
+
+
+class CDIStore():
+    """
+    This class maps every key prefix of KEYS, e.g. (Question,) or
+    (Question, StratificationCategory1), to a contiguous range of a stable
+    sort of the CDI rows by that prefix.
+    """
+    def __init__(self, dataframe):
+        """
+        This function initializes objects to be passed in the class.
+
+        Args:
+            dataframe (DataFrame): long-format CDI data with the KEYS columns
+        """
+        if not isinstance(dataframe, pd.DataFrame):
+            raise ValueError('"dataframe" must be a Pandas DataFrame')
+        for key in KEYS:
+            if key not in dataframe.columns:
+                raise NameError(f'{key} not found in columns of dataframe.')
+
+        factorized = [pd.factorize(dataframe[key], sort=True) for key in KEYS]
+        codes = np.stack([x[0] for x in factorized])
+        uniques = [np.asarray(x[1], dtype=object) for x in factorized]
+
+        self.frame = dataframe
+        self._values = {}
+        self._orders = []
+        self._ranges = {}
+
+        n_rows = len(dataframe)
+        for level in range(len(KEYS)):
+            # stable, so rows keep their original order within a group
+            order = np.lexsort(codes[level::-1])
+            prefix = codes[:level + 1, order]
+            change = np.zeros(n_rows, dtype=bool)
+            change[:1] = True
+            change[1:] = (prefix[:, 1:] != prefix[:, :-1]).any(axis=0)
+            starts = np.flatnonzero(change)
+            stops = np.append(starts[1:], n_rows)
+            prefix = prefix[:, starts]
+            # missing values (code -1) are never matched, as with masks
+            found = (prefix >= 0).all(axis=0)
+            keys = zip(*[uniques[i][prefix[i, found]] for i in range(level + 1)])
+            self._orders.append(order)
+            self._ranges.update(zip(keys, zip(starts[found].tolist(),
+                                              stops[found].tolist())))
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def columns(self):
+        return self.frame.columns
+
+    def values(self, column, exclude=None):
+        """
+        Return the set of values of @column, computed once per column and
+            @exclude.
+
+        Args:
+            column (str): column name
+            exclude (dict): column name to value of rows left out
+
+        Return:
+            values (set): values of @column
+        """
+        key = (column, tuple(sorted((exclude or {}).items())))
+        if key not in self._values:
+            self._values[key] = set(self.frame.loc[_kept(self.frame, exclude),
+                                                   column])
+        return self._values[key]
+
+    def select(self, criteria):
+        """
+        Return a copy of the rows where each column in @criteria equals
+            its value. The longest leading run of KEYS in @criteria is
+            looked up in the index, other columns are matched on that
+            slice only.
+
+        Args:
+            criteria (dict): column name to value
+
+        Return:
+            rows (DataFrame): matching rows
+        """
+        prefix = []
+        for key in KEYS:
+            if key not in criteria:
+                break
+            prefix.append(criteria[key])
+
+        if prefix:
+            start, stop = self._ranges.get(tuple(prefix), (0, 0))
+            rows = self.frame.iloc[self._orders[len(prefix) - 1][start:stop]]
+        else:
+            rows = self.frame
+
+        rest = {k: v for k, v in criteria.items() if k not in KEYS[:len(prefix)]}
+        if rest:
+            mask = np.ones(len(rows), dtype=bool)
+            for column, value in rest.items():
+                mask &= (rows[column] == value).to_numpy()
+            rows = rows[mask]
+
+        return rows.copy()
+
+
+def select(data, criteria):
+    """
+    Rows of a CDIStore or a CDI DataFrame where each column in @criteria
+        equals its value.
+
+    Args:
+        data (CDIStore or DataFrame): CDI data
+        criteria (dict): column name to value
+
+    Return:
+        rows (DataFrame): matching rows
+    """
+    if isinstance(data, CDIStore):
+        return data.select(criteria)
+
+    mask = True
+    for column, value in criteria.items():
+        mask = mask & (data[column] == value)
+    return data[mask]
+
+
+def _kept(frame, exclude):
+    """
+    Mask of the rows of @frame where no column of @exclude equals its
+    value.
+    """
+    mask = np.ones(len(frame), dtype=bool)
+    for column, value in (exclude or {}).items():
+        mask &= (frame[column] != value).to_numpy()
+    return mask
+
+
+def unique_values(data, column, exclude=None):
+    """
+    Set of values of @column of a CDIStore or a CDI DataFrame, leaving
+        out the rows where a column of @exclude equals its value.
+    """
+    if isinstance(data, CDIStore):
+        return data.values(column, exclude)
+    return set(data.loc[_kept(data, exclude), column])
@@ -12,6 +12,8 @@ you can find the a html file called "Lets Get Started....html"
 ### Add more statement if/else to specify if variables are not encountered and
 ### notify the user to change the data format
 
+from .store import CDIStore, select
+
 __all__ = ['data_summary',"variable_summary"]
 
 def _check_name_error(var,data):
@@ -27,9 +29,11 @@ def data_summary(dataframe):
     These variables are important in the plottting function (hdcd.plot).
 
     Parameters:
-    @dataframe: a pandas dataframe.
+    @dataframe: a pandas dataframe or hdcd.store.CDIStore.
     @return: None
     """
+    if isinstance(dataframe, CDIStore):
+        dataframe = dataframe.frame
 
     n_cols = len(dataframe.columns)
     n_rows = len(dataframe)
@@ -75,7 +79,7 @@ def variable_summary(variable, dataframe):
     Parameters:
     @variable: str type of variable, should be presented in the ["Question"]
     column of the @dataframe.
-    @dataframe: a pandas dataframe.
+    @dataframe: a pandas dataframe or hdcd.store.CDIStore.
     """
 
     if not _check_name_error("DataValue",dataframe):
@@ -93,7 +97,7 @@ def variable_summary(variable, dataframe):
     if not _check_name_error("YearStart",dataframe):
         raise NameError("YearStart not found in columns of dataframe.")
 
-    dataframe = dataframe[dataframe["Question"] == variable]
+    dataframe = select(dataframe, {"Question": variable})
 
     units = dataframe["DataValueType"].unique()
     print(f'variable units including {units}')
@@ -0,0 +1,302 @@
+"""
+This Python script converts county geoshapes to simplified, quantized
+TopoJSON for the geomaps in the plotting module.
+    * to_topojson: TopoJSON topology of a GeoDataFrame at a level of detail
+    * cached_topojson: to_topojson, stored on disk in the reference cache
+
+Borders shared by two counties are stored once as arcs, and each arc is
+simplified once, so neighbouring counties stay watertight after
+simplification. Coordinates are quantized to an integer grid and delta
+encoded, which together shrink map payloads by an order of magnitude
+compared to embedding the GeoJSON.
+
+The levels of detail in LEVELS set the quantization grid and the
+simplification tolerance (in degrees):
+    * national: whole US maps
+    * state: maps of one or a few states
+    * zoomed: county-level close-ups
+
+This script requires `numpy`, `pandas`, `geopandas` and `shapely`.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from .cache import get_cache
+
+__all__ = ['LEVELS', 'to_topojson', 'cached_topojson']
+
+LEVELS = {'national': {'quantization': 100000, 'tolerance': 0.01},
+          'state': {'quantization': 100000, 'tolerance': 0.002},
+          'zoomed': {'quantization': 1000000, 'tolerance': 0.0002}}
+
+# quantized x and y are packed into one int64 point key
+_KEY_BITS = 21
+
+_memory = {}
+
+
+def _level(level):
+    if level not in LEVELS:
+        raise ValueError(f'"level" must be one of {list(LEVELS)}')
+    return LEVELS[level]
+
+
+def _rings(geometry):
+    """
+    Return the polygons of a geometry as lists of exterior and interior
+    coordinate arrays.
+    """
+    if geometry is None or geometry.is_empty:
+        return []
+    if geometry.geom_type == 'Polygon':
+        polygons = [geometry]
+    elif geometry.geom_type == 'MultiPolygon':
+        polygons = list(geometry.geoms)
+    else:
+        raise ValueError(f'unsupported geometry type "{geometry.geom_type}"')
+
+    return [[np.asarray(polygon.exterior.coords)] +
+            [np.asarray(ring.coords) for ring in polygon.interiors]
+            for polygon in polygons]
+
+
+def _quantize_ring(coords, translate, scale):
+    """
+    Quantize an open ring and remove repeated points, None if fewer
+    than three points remain.
+    """
+    ring = np.rint((coords[:-1, :2] - translate) / scale).astype('int64')
+    repeated = np.all(ring == np.roll(ring, 1, axis=0), axis=1)
+    ring = ring[~repeated] if len(ring) > 1 else ring
+    if len(ring) < 3:
+        return None
+
+    return (ring[:, 0] << _KEY_BITS) | ring[:, 1]
+
+
+def _junctions(rings):
+    """
+    Points where rings meet or part, i.e. with more than two distinct
+    neighbours over all rings.
+    """
+    points = np.concatenate(rings + rings)
+    neighbours = np.concatenate([np.roll(x, 1) for x in rings] +
+                                [np.roll(x, -1) for x in rings])
+    order = np.lexsort([neighbours, points])
+    points, neighbours = points[order], neighbours[order]
+    distinct = np.ones(len(points), dtype=bool)
+    distinct[1:] = (points[1:] != points[:-1]) | (neighbours[1:] != neighbours[:-1])
+    point, count = np.unique(points[distinct], return_counts=True)
+
+    return point[count > 2]
+
+
+def _signed_area(x, y):
+    """
+    Twice the signed area of a closed ring, negative if clockwise.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    return np.sum(x[:-1] * y[1:] - x[1:] * y[:-1])
+
+
+def _cut(ring, is_junction):
+    """
+    Cut a ring at its junctions into arcs that include both ends. A ring
+    without junctions is one closed arc starting at its smallest point,
+    so that rings shared in full (enclaves) give the same arc.
+    """
+    cut = np.flatnonzero(is_junction)
+    if len(cut) == 0:
+        ring = np.roll(ring, -int(np.argmin(ring)))
+        return [np.append(ring, ring[0])]
+
+    ring = np.roll(ring, -int(cut[0]))
+    ring = np.append(ring, ring[0])
+    cut = np.append(cut - cut[0], len(ring) - 1)
+
+    return [ring[start:end + 1] for start, end in zip(cut[:-1], cut[1:])]
+
+
+def to_topojson(geodataframe, level='national', object_name='counties',
+                id_column=None, properties=None):
+    """
+    Convert the geometries of a GeoDataFrame to a TopoJSON topology with
+        shared, simplified and quantized arcs.
+
+    Args:
+        geodataframe (GeoDataFrame): polygons in longitude and latitude
+        level (str): level of detail, one of LEVELS
+        object_name (str): name of the topology object
+        id_column (str): column used as feature id, integer if numeric
+            strings (e.g. county GEOID '06037' -> 6037)
+        properties (list): columns added as feature properties
+
+    Return:
+        topology (dict): TopoJSON topology
+    """
+    settings = _level(level)
+    geometries = geodataframe.geometry.to_numpy()
+
+    x0, y0, x1, y1 = geodataframe.geometry.total_bounds
+    quantization = settings['quantization']
+    scale = np.array([max(x1 - x0, 1e-12), max(y1 - y0, 1e-12)]) / (quantization - 1)
+    translate = np.array([x0, y0])
+
+    # quantized rings of each polygon of each feature
+    features = []
+    for geometry in geometries:
+        polygons = []
+        for polygon in _rings(geometry):
+            rings = [_quantize_ring(x, translate, scale) for x in polygon]
+            if rings[0] is None:
+                continue
+            polygons.append([x for x in rings if x is not None])
+        features.append(polygons)
+
+    all_rings = [ring for polygons in features for polygon in polygons for ring in polygon]
+    if all_rings:
+        is_junction = np.isin(np.concatenate(all_rings), _junctions(all_rings))
+        is_junction = iter(np.split(is_junction, np.cumsum([len(x) for x in all_rings])[:-1]))
+
+    # cut rings into arcs and store each shared arc once
+    arcs = []
+    arc_index = {}
+
+    def index_of(arc):
+        key = arc.tobytes()
+        if key in arc_index:
+            return arc_index[key]
+        reverse = arc[::-1].tobytes()
+        if reverse in arc_index:
+            return ~arc_index[reverse]
+        arc_index[key] = len(arcs)
+        arcs.append(arc)
+        return arc_index[key]
+
+    topology_features = [[[[index_of(arc) for arc in _cut(ring, next(is_junction))]
+                            for ring in polygon]
+                           for polygon in polygons]
+                          for polygons in features]
+
+    # simplify each arc once, keeping its end points; in degrees, since
+    # the grid steps differ along x and y
+    points = np.concatenate(arcs) if arcs else np.zeros(0, dtype='int64')
+    lines = shapely.linestrings((points >> _KEY_BITS) * scale[0],
+                                (points & ((1 << _KEY_BITS) - 1)) * scale[1],
+                                indices=np.repeat(np.arange(len(arcs)),
+                                                  [len(x) for x in arcs]))
+    simplified = shapely.simplify(lines, settings['tolerance'],
+                                  preserve_topology=False)
+
+    encoded = []
+    arc_coords = []
+    for arc, line in zip(arcs, simplified):
+        coords = np.rint(shapely.get_coordinates(line) / scale).astype('int64')
+        # keep closed arcs as valid rings
+        if arc[0] == arc[-1] and len(coords) < 4:
+            coords = np.stack([arc >> _KEY_BITS, arc & ((1 << _KEY_BITS) - 1)], axis=1)
+        arc_coords.append(coords)
+        delta = np.vstack([coords[:1], np.diff(coords, axis=0)])
+        encoded.append(delta.tolist())
+
+    def keeps_orientation(ring, ring_arcs):
+        """
+        False if a ring collapses or turns inside out when its arcs are
+        simplified (e.g. small islands), which renderers would fill
+        inside out over the whole map.
+        """
+        coords = np.concatenate([arc_coords[i] if i >= 0 else arc_coords[~i][::-1]
+                                 for i in ring_arcs])
+        area = _signed_area(coords[:, 0], coords[:, 1])
+        ring = np.append(ring, ring[0])
+        original = _signed_area(ring >> _KEY_BITS, ring & ((1 << _KEY_BITS) - 1))
+        return area * original > 0
+
+    # drop such rings, and polygons whose exterior collapses
+    topology_features = [[[ring_arcs for ring, ring_arcs in zip(rings, polygon)
+                           if keeps_orientation(ring, ring_arcs)]
+                          for rings, polygon in zip(polygons, topology_polygons)
+                          if keeps_orientation(rings[0], polygon[0])]
+                         for polygons, topology_polygons in zip(features, topology_features)]
+
+    ids = None
+    if id_column is not None:
+        ids = geodataframe[id_column]
+        if not pd.api.types.is_numeric_dtype(ids) and \
+            ids.astype(str).str.fullmatch(r'\d+').all():
+            ids = ids.astype('int64')
+        ids = ids.tolist()
+
+    records = geodataframe[properties].to_dict('records') if properties else None
+
+    objects = []
+    for i, polygons in enumerate(topology_features):
+        if not polygons:
+            feature = {'type': None}
+        elif len(polygons) == 1:
+            feature = {'type': 'Polygon', 'arcs': polygons[0]}
+        else:
+            feature = {'type': 'MultiPolygon', 'arcs': polygons}
+        if ids is not None:
+            feature['id'] = ids[i]
+        if records is not None:
+            feature['properties'] = records[i]
+        objects.append(feature)
+
+    return {'type': 'Topology',
+            'transform': {'scale': scale.tolist(), 'translate': translate.tolist()},
+            'objects': {object_name: {'type': 'GeometryCollection',
+                                      'geometries': objects}},
+            'arcs': encoded}
+
+
+def cached_topojson(geodataframe, level='national', object_name='counties',
+                    id_column=None, properties=None, cache=None):
+    """
+    to_topojson, stored on disk next to the reference files and keyed by
+        the SHA-256 hash of the geometries, ids, properties and level.
+
+    Args:
+        cache (ReferenceCache): cache whose directory is used, defaults to
+            the process-wide hdcd.cache cache
+        see to_topojson for the other arguments
+
+    Return:
+        topology (dict): TopoJSON topology
+    """
+    settings = _level(level)
+    cache = cache or get_cache()
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps([level, settings, object_name, id_column, properties],
+                             sort_keys=True).encode())
+    for wkb in shapely.to_wkb(geodataframe.geometry.to_numpy()):
+        digest.update(wkb or b'')
+    for column in [id_column] + list(properties or []):
+        if column is not None:
+            digest.update(pd.util.hash_pandas_object(geodataframe[column],
+                                                     index=False).to_numpy().tobytes())
+    digest = digest.hexdigest()[:32]
+
+    if digest in _memory:
+        return _memory[digest]
+
+    path = os.path.join(cache.cache_dir, 'topojson', f'{digest}.json')
+    if os.path.exists(path):
+        with open(path) as f:
+            topology = json.load(f)
+    else:
+        topology = to_topojson(geodataframe, level, object_name, id_column, properties)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(topology, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    _memory[digest] = topology
+    return topology
@@ -2,8 +2,14 @@
 Test functions for hdcd package.
 """
 import unittest
+import json
 import os
 import sys
+import tempfile
+import contextlib
+import io
+import importlib.util
+from unittest import mock
 
 import pandas as pd
 import numpy as np
@@ -18,6 +24,20 @@ sys.path.append('../hdcd')
 import hdcd
 from hdcd.data_wrangling import AoU_socioeconomic
 from hdcd.data_wrangling import AoU_conditions
+from hdcd.data_wrangling import ConceptFrequencyIndex
+from hdcd.data_wrangling import CountyCountState
+from hdcd.data_wrangling import compact_dtypes
+from hdcd.data_wrangling import zip3_codes, zip3_crosswalk
+from hdcd.data_wrangling import parse_datetimes, datetime_parts
+from hdcd.data_wrangling import read_dataset
+from hdcd.cache import ReferenceCache
+from hdcd.topology import to_topojson
+from hdcd.store import CDIStore
+from hdcd.chart_data import shared_data
+from hdcd.render import render_charts
+from hdcd.spec_cache import SpecCache
+from hdcd.minimize import minimize_chart
+from hdcd.geo import state_ids, county_dimension, county_ids, us_topology
 
 cdi_dummy = pd.read_csv("./data/cdi_dummy.csv")
 conditions_csv = pd.read_csv("./data/conditions.csv")
@@ -124,6 +144,66 @@ class TestCases(unittest.TestCase):
                            dataframe,
                            print_corr=False)
 
+    def test_edge_test_4_plot_corr(self):
+        """
+        A DataFrame and a CDIStore are validated on the same non-US rows
+        and give the same chart
+        """
+        sod = "Mortality from coronary heart disease"
+        health_outcome = "Life expectancy at birth"
+        dataframe = cdi_dummy.copy()
+        national = dataframe.iloc[:1].assign(LocationAbbr="US",
+                                             Question="National only",
+                                             StratificationCategory1="US only")
+        dataframe = pd.concat([dataframe, national], ignore_index=True)
+
+        for data in [dataframe, CDIStore(dataframe)]:
+            with self.assertRaises(NameError):
+                hdcd.plot_corr("National only", health_outcome, "Overall", data)
+            with self.assertRaises(NameError):
+                hdcd.plot_corr(sod, health_outcome, "US only", data)
+
+        # view names differ between calls, the data must not
+        self.assertEqual(
+            hdcd.plot_corr(sod, health_outcome, "Overall",
+                           dataframe).to_dict()['datasets'],
+            hdcd.plot_corr(sod, health_outcome, "Overall",
+                           CDIStore(dataframe)).to_dict()['datasets'])
+
+
+    def test_one_shot_test_1_spearman_matrix(self):
+        """
+        Batched correlations match pairwise complete pandas correlations,
+        and the heatmap is built
+        """
+        stratification = "Overall"
+        dataframe = cdi_dummy.copy()
+        dataframe = dataframe.drop(index=dataframe.index[::4])
+
+        corr = hdcd.spearman_matrix(stratification, dataframe, min_periods=2)
+
+        rows = dataframe[(dataframe["StratificationCategory1"] == stratification)
+                         & (dataframe["LocationAbbr"] != "US")]
+        pivot = rows.groupby(["LocationAbbr",
+                              rows["Question"] + " - " + rows["DataValueType"]]
+                             )["DataValue"].mean().unstack()
+        expected = pivot.corr(method="spearman", min_periods=2)
+        pd.testing.assert_frame_equal(corr, expected.rename_axis(index=None,
+                                                                 columns=None))
+
+        chart = hdcd.plot_corr_matrix(stratification, dataframe)
+        self.assertIsInstance(chart, alt.Chart)
+
+    def test_edge_test_1_spearman_matrix(self):
+        """
+        throw NameError if the stratification or datatype is not found
+        """
+        dataframe = cdi_dummy.copy()
+
+        with self.assertRaises(NameError):
+            hdcd.spearman_matrix("No such stratification", dataframe)
+        with self.assertRaises(NameError):
+            hdcd.spearman_matrix("Overall", dataframe, datatype="No such type")
 
     def test_smoke_test_geomap(self):
         """
@@ -205,6 +285,56 @@ class TestCases(unittest.TestCase):
                             dataframe)
 
 
+    def test_one_shot_test_2_geomap(self):
+        """
+        Pre-aggregated mode embeds one row per state with a column per year,
+        and the year slider picks the column
+        """
+
+        variable = "Mortality from coronary heart disease"
+        datatype = "Number"
+        stratification = "Overall"
+        dataframe = cdi_dummy.copy()
+
+        chart = hdcd.plot_geomap(variable,
+                                 datatype,
+                                 stratification,
+                                 dataframe,
+                                 pre_aggregate=True)
+        spec = chart.to_dict()
+        years = dataframe[dataframe["Question"] == variable]["YearStart"]
+        columns = {'id', 'LocationDesc'} | {str(x) for x in years.unique()}
+        # the other dataset is the states topology
+        tables = [x for x in spec['datasets'].values() if isinstance(x, list)]
+        self.assertEqual(len(tables), 1)
+        self.assertTrue(all(set(x) <= columns for x in tables[0]))
+        self.assertEqual(len(tables[0]), len({x['id'] for x in tables[0]}))
+        self.assertEqual(spec['params'][0]['name'], 'YearStart')
+        self.assertEqual(spec['params'][0]['value'], int(years.max()))
+        # same tooltip as the row mode, with the state name
+        rows = hdcd.plot_geomap(variable, datatype, stratification,
+                                dataframe).to_dict()
+        self.assertEqual(spec['layer'][1]['encoding']['tooltip'],
+                         rows['layer'][1]['encoding']['tooltip'])
+        self.assertTrue(all(x['LocationDesc'] for x in tables[0]))
+
+        # the color domain spans the state means, not the raw rows
+        row = dataframe[(dataframe["Question"] == variable) &
+                        (dataframe["DataValueType"] == datatype) &
+                        (dataframe["StratificationCategory1"] == stratification)].iloc[:1]
+        row = row.assign(DataValue=pd.to_numeric(row["DataValue"]) + 1000)
+        chart = hdcd.plot_geomap(variable, datatype, stratification,
+                                 pd.concat([dataframe, row], ignore_index=True),
+                                 pre_aggregate=True)
+        spec = chart.to_dict()
+        table = [x for x in spec['datasets'].values() if isinstance(x, list)][0]
+        means = [v for x in table for k, v in x.items()
+                 if k not in ('id', 'LocationDesc') and v is not None]
+        scale = spec['layer'][1]['encoding']['color']['scale']
+        self.assertEqual(scale['domainMax'], max(means))
+        self.assertEqual(scale['domainMin'], min(means))
+
+
     ### smoke test
     def test_smoke_test_plot_geomap_conditions(self):
         '''
@@ -255,6 +385,27 @@ class TestCases(unittest.TestCase):
             hdcd.plot_geomap_conditions(dataframe,
                                     width)
 
+    ### one-shot test 2
+    def test_one_shot_test_2_plot_geomap_conditions(self):
+        '''
+        Data over Altair's max rows is inlined, so the chart serializes
+        without lifting the limit globally
+        '''
+        dataframe = pd.concat([conditions_csv] * 6, ignore_index=True)
+        options = dict(alt.data_transformers.options)
+        with alt.data_transformers.enable('default'):
+            chart = hdcd.plot_geomap_conditions(dataframe, minimize=True)
+            self.assertEqual(dict(alt.data_transformers.options), {})
+            spec = chart.to_dict()
+            with self.assertRaises(alt.MaxRowsError):
+                alt.Chart(dataframe).mark_point().to_dict()
+        self.assertEqual(dict(alt.data_transformers.options), options)
+        # the rows, besides the counties topology
+        inline = [json.loads(x) for x in spec['datasets'].values()
+                  if isinstance(x, str)]
+        rows = [x for x in inline if isinstance(x, list)]
+        self.assertEqual(len(rows[0]), len(dataframe))
+
 
     def test_smoke_test_plot_longitudinal_change(self):
         """
@@ -633,6 +784,33 @@ class TestCases(unittest.TestCase):
         self.assertTrue(set(['ZIP_code', 'some_other_column']).issubset(set(result.columns)))
         self.assertEqual(len(result), 3)
 
+    def test_one_shot_test_2_zip_socioeconomic(self):
+        """
+        One row per 3-digit ZIP code with the latest value of each
+        indicator, or the mean of the numeric indicators
+        """
+        sample_df = pd.DataFrame({
+            'person_id': [1, 2, 3, 4],
+            'observation_datetime': ['2023-03-01', '2021-01-01',
+                                     '2022-01-01', '2020-01-01'],
+            'zip_code': ['981**', '981**', '981**', '070**'],
+            'median_income': [np.nan, 1000, 3000, 5000],
+            'source': ['c', 'a', 'b', 'd']
+        })
+
+        aou = AoU_socioeconomic(
+            df=sample_df,
+            geo_df=geo_df,
+            county_df=county_df)
+
+        latest = aou.zip_socioeconomic()
+        mean = aou.zip_socioeconomic(snapshot='mean')
+
+        self.assertEqual(latest['zip3'].tolist(), [70, 981])
+        self.assertEqual(latest['median_income'].tolist(), [5000, 3000])
+        self.assertEqual(latest['source'].tolist(), ['d', 'c'])
+        self.assertEqual(mean['median_income'].tolist(), [5000, 2000])
+
     def test_edge_test_1_zip_socioeconomic(self):
         """
         Edge test: Empty Pandas DataFrame input for zip_socioeconomic
@@ -665,6 +843,27 @@ class TestCases(unittest.TestCase):
         with self.assertRaises(KeyError):
             result = aou.zip_socioeconomic()
 
+    def test_edge_test_3_zip_socioeconomic(self):
+        """
+        Edge test: no valid 3-digit ZIP code gives an empty frame with the
+        same columns, for every snapshot
+        """
+        invalid_zip_df = pd.DataFrame({
+            'person_id': [1, 2],
+            'observation_datetime': ['2023-01-01'] * 2,
+            'zip_code': ['abc', None],
+            'median_income': [1000, 5000]
+        })
+        aou = AoU_socioeconomic(df=invalid_zip_df,
+                                geo_df=geo_df,
+                                county_df=county_df)
+
+        for snapshot in ['latest', 'mean']:
+            result = aou.zip_socioeconomic(snapshot=snapshot)
+            self.assertEqual(len(result), 0)
+            self.assertEqual(list(result.columns),
+                             ['zip_code', 'median_income', 'zip3'])
+
     # For load_counties_zip
     ### smoke test
     def test_smoke_test_load_counties_zip(self):
@@ -768,6 +967,49 @@ class TestCases(unittest.TestCase):
             self.fail(f"load_counties_zip raised an exception: {e}")
 
 
+    ### one-shot test 2
+    def test_one_shot_test_2_threshold_conditions(self):
+        '''
+        Threshold and top-N selection reuse the concept frequency index
+        '''
+        # first concept becomes the most frequent one
+        conditions = pd.concat([conditions_df, conditions_df.head(1)],
+                               ignore_index=True)
+        aou_tc = AoU_conditions(conditions_df = conditions,
+                                observations_df = observations_df,
+                                county_df = county_df,
+                                geo_df = geo_df)
+        sizes = conditions['standard_concept_name'].value_counts()
+
+        result = aou_tc.threshold_conditions(threshold=0)
+        self.assertEqual(len(result), len(conditions))
+
+        index = aou_tc.concept_index
+        result = aou_tc.threshold_conditions(top_n=1)
+        self.assertIs(aou_tc.concept_index, index)
+        self.assertEqual(set(result['standard_concept_name']),
+                         {sizes.index[0]})
+
+        result = aou_tc.threshold_conditions()
+        self.assertTrue(result.empty)
+
+    ### For ConceptFrequencyIndex
+    ### one-shot test 1
+    def test_one_shot_test_1_concept_frequency_index(self):
+        '''
+        Counts, thresholds and masks for plain and categorical columns
+        '''
+        concepts = pd.Series(['b', 'a', 'b', None, 'c', 'a', 'b'])
+
+        for column in [concepts, concepts.astype('category')]:
+            index = ConceptFrequencyIndex.from_series(column)
+
+            self.assertEqual(index.counts.to_dict(), {'a': 2, 'b': 3, 'c': 1})
+            self.assertEqual(sorted(index.concepts(threshold=1)), ['a', 'b'])
+            self.assertEqual(list(index.concepts(top_n=1)), ['b'])
+            self.assertEqual(index.mask(threshold=2).tolist(),
+                             [True, False, True, False, False, False, True])
+
     ### For observation zip
     ### smoke test ###
     def test_smoke_test_observation_zip(self):
@@ -801,6 +1043,27 @@ class TestCases(unittest.TestCase):
         except Exception as e:
             self.fail(f"load_counties_zip raised an exception: {e}")
 
+    ### one shot test 2 ###
+    def test_one_shot_test_2_observation_zip(self):
+        '''
+        Provide good input and test that only postal code rows are kept
+        with the expected columns and integer 3-digit ZIP codes
+        '''
+        aou_tc = AoU_conditions(conditions_df = conditions_df,
+                                observations_df = observations_df,
+                                county_df = county_df,
+                                geo_df = geo_df
+                                )
+        zip_df = aou_tc.observation_zip()
+        postal_code = observations_df[observations_df['standard_concept_name'] \
+                                      == 'Postal code [Location]']
+
+        self.assertEqual(list(zip_df.columns),
+                         ['person_id', 'zip', 'datetime', 'zip3'])
+        self.assertEqual(len(zip_df), len(postal_code))
+        self.assertEqual(zip_df['zip3'].tolist(),
+                         [int(x[0:3]) for x in postal_code['value_as_string']])
+
 
 
 
@@ -872,3 +1135,1094 @@ class TestCases(unittest.TestCase):
             aou_tc.counties_groupby_count()
         except Exception as e:
             self.fail(f"load_counties_zip raised an exception: {e}")
+
+
+    ### one shot test 2 ###
+    def test_one_shot_test_2_counties_groupby_count(self):
+        '''
+        Compact mode keeps categorical columns and gives the same counts
+        '''
+        aou_tc = AoU_conditions(conditions_df = conditions_df,
+                                observations_df = observations_df,
+                                county_df = county_df,
+                                geo_df = geo_df
+                                )
+        aou_compact = AoU_conditions(conditions_df = conditions_df,
+                                     observations_df = observations_df,
+                                     county_df = county_df,
+                                     geo_df = geo_df,
+                                     compact = True
+                                     )
+        expected = aou_tc.counties_groupby_count(threshold=0)
+        result = aou_compact.counties_groupby_count(threshold=0)
+
+        self.assertEqual(result['county'].dtype, 'category')
+        pd.testing.assert_frame_equal(result.astype(expected.dtypes),
+                                      expected)
+
+    ### For compact_dtypes
+    ### one shot test 1 ###
+    def test_one_shot_test_1_compact_dtypes(self):
+        '''
+        Repeated strings become categorical and integers are downcast
+        '''
+        result = compact_dtypes(conditions_df)
+
+        self.assertEqual(result['standard_concept_name'].dtype, 'category')
+        self.assertEqual(result['person_id'].dtype, np.int8)
+        self.assertEqual(conditions_df['standard_concept_name'].dtype, object)
+        self.assertEqual(result['standard_concept_name'].tolist(),
+                         conditions_df['standard_concept_name'].tolist())
+
+    ### edge test 1 ###
+    def test_edge_test_1_compact_dtypes(self):
+        '''
+        Only categorical compaction is offered, other modes raise ValueError
+        '''
+        with self.assertRaises(ValueError):
+            AoU_conditions(conditions_df = conditions_df,
+                           observations_df = observations_df,
+                           county_df = county_df,
+                           geo_df = geo_df,
+                           compact = 'string[pyarrow]')
+
+    ### For zip3_crosswalk
+    ### one shot test 1 ###
+    def test_one_shot_test_1_zip3_crosswalk(self):
+        '''
+        One row per 3-digit ZIP code and county, used by the conditions merge
+        '''
+        counties_zip = pd.DataFrame({
+            'state_abbr': ['NJ', 'NJ', 'NJ', 'WA', 'WA'],
+            'county': ['Essex', 'Essex', 'Union', 'King', 'King'],
+            'zipcode': [7001, 7002, 7083, 98101, 98102]})
+        counties_zip['zip3'] = zip3_codes(counties_zip['zipcode'])
+
+        crosswalk = zip3_crosswalk(counties_zip)
+        self.assertEqual(len(crosswalk), 3)
+        self.assertEqual(sorted(crosswalk['zip3'].unique()), [70, 981])
+
+        aou_tc = AoU_conditions(conditions_df = conditions_df,
+                                observations_df = observations_df,
+                                county_df = county_df,
+                                geo_df = geo_df,
+                                memoize = True
+                                )
+        aou_tc.merge_conditions_observation(threshold=0)
+        graph = aou_tc.stage_graph().set_index('stage')
+        self.assertIn('load_zip3_crosswalk',
+                      graph.loc['merge_conditions_observation', 'depends_on'])
+
+    ### For zip3_codes
+    ### edge test 1 ###
+    def test_edge_test_1_zip3_codes(self):
+        '''
+        Numeric ZIP codes are zero padded, masked or invalid ones handled
+        '''
+        self.assertEqual(zip3_codes(pd.Series([501, 98101])).tolist(),
+                         [5, 981])
+        self.assertEqual(zip3_codes(pd.Series(['070**', 'abc', None])).tolist(),
+                         [70, pd.NA, pd.NA])
+
+    ### For parse_datetimes and datetime_parts
+    ### one shot test 1 ###
+    def test_one_shot_test_1_parse_datetimes(self):
+        '''
+        Parsing unique values with a detected format matches pd.to_datetime
+        and year/month are compact integers
+        '''
+        values = conditions_df['condition_start_datetime']
+        result = parse_datetimes(values)
+        pd.testing.assert_series_equal(result, pd.to_datetime(values))
+
+        year, month = datetime_parts(result)
+        self.assertEqual(year.dtype, np.int16)
+        self.assertEqual(month.dtype, np.int8)
+        np.testing.assert_array_equal(year, pd.DatetimeIndex(result).year)
+        np.testing.assert_array_equal(month, pd.DatetimeIndex(result).month)
+
+    ### edge test 1 ###
+    def test_edge_test_1_parse_datetimes(self):
+        '''
+        Missing and mixed-format timestamps are handled
+        '''
+        result = parse_datetimes(pd.Series(['2011/9/23 16:00', None,
+                                            '2020-01-05']))
+        self.assertTrue(pd.isna(result[1]))
+        self.assertEqual(result[2], pd.Timestamp('2020-01-05'))
+
+        year, month = datetime_parts(result)
+        self.assertEqual(year.tolist(), [2011, pd.NA, 2020])
+        self.assertEqual(month.tolist(), [9, pd.NA, 1])
+
+    ### one shot test 3 ###
+    def test_one_shot_test_3_counties_groupby_count(self):
+        '''
+        Partitioned execution over worker processes gives the same counts
+        with the same dtypes
+        '''
+        aou_tc = AoU_conditions(conditions_df = conditions_df,
+                                observations_df = observations_df,
+                                county_df = county_df,
+                                geo_df = geo_df
+                                )
+        expected = aou_tc.counties_groupby_count(threshold=0)
+        result = aou_tc.counties_groupby_count(threshold=0, n_jobs=2)
+
+        pd.testing.assert_frame_equal(result,
+                                      expected.reset_index(drop=True))
+
+        aou_tc.compact = True
+        result = aou_tc.counties_groupby_count(threshold=0, n_jobs=2)
+        self.assertEqual(result['county'].dtype, 'category')
+        self.assertEqual(result['year'].dtype, expected['year'].dtype)
+
+    ### edge test 1 ###
+    def test_edge_test_1_counties_groupby_count_parallel(self):
+        '''
+        Participants without a 3-digit ZIP code join the crosswalk rows
+        without a ZIP code in every execution path
+        '''
+        counties_zip = ReferenceCache().read_csv(county_df)
+        missing_zip = counties_zip.iloc[[-1]].assign(zipcode=None)
+        observations = observations_df.copy()
+        postal = observations.index[observations['standard_concept_name'] ==
+                                    'Postal code [Location]'][:3]
+        observations.loc[postal, 'value_as_string'] = None
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'counties_zip.csv')
+            pd.concat([counties_zip, missing_zip]).to_csv(path, index=False)
+            aou_tc = AoU_conditions(conditions_df = conditions_df,
+                                    observations_df = observations,
+                                    county_df = path,
+                                    geo_df = geo_df
+                                    )
+            expected = aou_tc.counties_groupby_count(threshold=0)
+            result = aou_tc.counties_groupby_count(threshold=0, n_jobs=2)
+            stream = aou_tc.counties_groupby_count_stream(chunksize=5,
+                                                          threshold=0)
+
+        pd.testing.assert_frame_equal(result, expected.reset_index(drop=True))
+        pd.testing.assert_frame_equal(stream, expected.reset_index(drop=True))
+
+    ### For stage memoization
+    ### one shot test 1 ###
+    def test_one_shot_test_1_stage_graph(self):
+        '''
+        Repeated calls reuse stage outputs and reassigned inputs are
+        recomputed
+        '''
+        aou_tc = AoU_conditions(conditions_df = conditions_df,
+                                observations_df = observations_df,
+                                county_df = county_df,
+                                geo_df = geo_df,
+                                memoize = True
+                                )
+        expected = aou_tc.counties_groupby_count(threshold=0)
+        result = aou_tc.counties_groupby_count(threshold=0)
+        pd.testing.assert_frame_equal(result, expected)
+
+        graph = aou_tc.stage_graph().set_index('stage')
+        self.assertEqual(graph.loc['counties_groupby_count', 'reused'], 1)
+        self.assertEqual(graph.loc['observation_zip', 'computed'], 1)
+        self.assertIn('merge_conditions_observation',
+                      graph.loc['counties_groupby_count', 'depends_on'])
+
+        aou_tc.observations_df = observations_df.copy()
+        aou_tc.counties_groupby_count(threshold=0)
+        graph = aou_tc.stage_graph().set_index('stage')
+        self.assertEqual(graph.loc['observation_zip', 'computed'], 2)
+        self.assertEqual(graph.loc['threshold_conditions', 'last'], 'reused')
+        self.assertEqual(graph.loc['counties_groupby_count', 'last'], 'computed')
+
+    ### edge test 1 ###
+    def test_edge_test_1_stage_graph(self):
+        '''
+        Invalidated stages and their dependents are recomputed
+        '''
+        aou_tc = AoU_conditions(conditions_df = conditions_df,
+                                observations_df = observations_df,
+                                county_df = county_df,
+                                geo_df = geo_df,
+                                memoize = True
+                                )
+        aou_tc.merge_conditions_observation(threshold=0)
+        aou_tc.invalidate('threshold_conditions')
+        aou_tc.merge_conditions_observation(threshold=0)
+
+        graph = aou_tc.stage_graph().set_index('stage')
+        self.assertEqual(graph.loc['threshold_conditions', 'computed'], 2)
+        self.assertEqual(graph.loc['merge_conditions_observation', 'computed'], 2)
+        self.assertEqual(graph.loc['observation_zip', 'reused'], 1)
+
+    ### one shot test 2 ###
+    def test_one_shot_test_2_stage_graph(self):
+        '''
+        Cached outputs are returned as copies, settings are part of the
+        stage key and nothing is kept unless memoize is set
+        '''
+        aou_tc = AoU_conditions(conditions_df = conditions_df,
+                                observations_df = observations_df,
+                                county_df = county_df,
+                                geo_df = geo_df,
+                                memoize = True
+                                )
+        first = aou_tc.observation_zip()
+        first['zip3'] = -1
+        self.assertFalse((aou_tc.observation_zip()['zip3'] == -1).any())
+
+        aou_tc.compact = True
+        aou_tc.observation_zip()
+        graph = aou_tc.stage_graph()
+        self.assertEqual(graph[graph['stage'] == 'observation_zip']['computed'].tolist(),
+                         [1, 1])
+        self.assertEqual(graph[graph['stage'] == 'observation_zip']['valid'].tolist(),
+                         [False, True])
+
+        aou_default = AoU_conditions(conditions_df = conditions_df,
+                                     observations_df = observations_df,
+                                     county_df = county_df,
+                                     geo_df = geo_df
+                                     )
+        aou_default.observation_zip()
+        aou_default.observation_zip()
+        graph = aou_default.stage_graph().set_index('stage')
+        self.assertEqual(graph.loc['observation_zip', 'computed'], 2)
+        self.assertEqual(aou_default._stages, {})
+
+    ### For read_dataset
+    ### one shot test 1 ###
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow not installed')
+    def test_one_shot_test_1_read_dataset(self):
+        '''
+        Parquet reads load the requested columns and filtered rows only
+        '''
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'observations.parquet')
+            observations_df.to_parquet(path)
+
+            result = read_dataset(path, ['person_id', 'value_as_string'],
+                                  [('standard_concept_name', '==',
+                                    'Postal code [Location]')])
+            expected = read_dataset(observations_df,
+                                    ['person_id', 'value_as_string'],
+                                    [('standard_concept_name', '==',
+                                      'Postal code [Location]')])
+
+        self.assertEqual(list(result.columns), ['person_id', 'value_as_string'])
+        pd.testing.assert_frame_equal(result, expected.reset_index(drop=True))
+
+    ### one shot test 2 ###
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow not installed')
+    def test_one_shot_test_2_read_dataset(self):
+        '''
+        AoU_conditions gives the same counts from Parquet paths
+        '''
+        with tempfile.TemporaryDirectory() as tmp:
+            conditions_path = os.path.join(tmp, 'conditions.parquet')
+            observations_path = os.path.join(tmp, 'observations.parquet')
+            conditions_df.to_parquet(conditions_path)
+            observations_df.to_parquet(observations_path)
+
+            expected = AoU_conditions(conditions_df = conditions_df,
+                                      observations_df = observations_df,
+                                      county_df = county_df,
+                                      geo_df = geo_df
+                                      ).counties_groupby_count(threshold=0)
+            result = AoU_conditions(conditions_df = conditions_path,
+                                    observations_df = observations_path,
+                                    county_df = county_df,
+                                    geo_df = geo_df
+                                    ).counties_groupby_count(threshold=0)
+
+        pd.testing.assert_frame_equal(result, expected)
+
+    ### one shot test 3 ###
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow not installed')
+    def test_one_shot_test_3_read_dataset(self):
+        '''
+        A threshold above every concept keeps no rows from a Parquet path,
+        as from a DataFrame
+        '''
+        threshold = conditions_df['standard_concept_name'].value_counts().max()
+        with tempfile.TemporaryDirectory() as tmp:
+            conditions_path = os.path.join(tmp, 'conditions.parquet')
+            conditions_df.to_parquet(conditions_path)
+
+            expected = AoU_conditions(conditions_df = conditions_df,
+                                      observations_df = observations_df,
+                                      county_df = county_df,
+                                      geo_df = geo_df
+                                      ).threshold_conditions(threshold)
+            result = AoU_conditions(conditions_df = conditions_path,
+                                    observations_df = observations_df,
+                                    county_df = county_df,
+                                    geo_df = geo_df
+                                    ).threshold_conditions(threshold)
+
+        self.assertEqual(expected.shape, (0, 3))
+        self.assertEqual(result.shape, (0, 3))
+        self.assertEqual(list(result.columns), list(expected.columns))
+
+    ### edge test 1 ###
+    def test_edge_test_1_read_dataset(self):
+        '''
+        Provide input with mistakes, see if error is raised
+        '''
+        with self.assertRaises(ValueError):
+            read_dataset(observations_df, ['person_id'],
+                         [('person_id', '>', 1)])
+        with self.assertRaises(ValueError):
+            read_dataset('./data/does_not_exist.parquet', ['person_id'])
+
+    ### For merge_county_socioeconomic
+    ### one shot test 1 ###
+    def test_one_shot_test_1_merge_county_socioeconomic(self):
+        '''
+        One row and one geometry per county, combined by the reducer
+        '''
+        sample_df = pd.DataFrame({
+            'person_id': [1, 2, 3],
+            'observation_datetime': ['2023-01-01'] * 3,
+            'zip_code': ['980**', '981**', '070**'],
+            'median_income': [1000, 3000, 5000]
+        })
+        aou = AoU_socioeconomic(df=sample_df,
+                                geo_df=geo_df,
+                                county_df=county_df)
+
+        first = aou.merge_county_socioeconomic()
+        mean = aou.merge_county_socioeconomic(reducer='mean')
+
+        self.assertIsInstance(first, gpd.GeoDataFrame)
+        self.assertFalse(first['AFFGEOID'].duplicated().any())
+        self.assertEqual(len(first), len(mean))
+        king = (mean['STATEFP'] == '53') & (mean['NAME'] == 'King')
+        self.assertEqual(mean.loc[king, 'median_income'].item(), 2000)
+        self.assertIn(first.loc[king, 'median_income'].item(), [1000, 3000])
+
+    ### edge test 1 ###
+    def test_edge_test_1_merge_county_socioeconomic(self):
+        '''
+        Provide an unknown reducer, see if error is raised
+        '''
+        aou = AoU_socioeconomic(df=pd.DataFrame(),
+                                geo_df=geo_df,
+                                county_df=county_df)
+        with self.assertRaises(ValueError):
+            aou.merge_county_socioeconomic(reducer='median')
+
+    ### edge test 2 ###
+    def test_edge_test_2_merge_county_socioeconomic(self):
+        '''
+        An upper case ZIP code column is merged like 'zip_code', with the
+        integer 3-digit ZIP code
+        '''
+        sample_df = pd.DataFrame({
+            'person_id': [1, 2],
+            'observation_datetime': ['2023-01-01'] * 2,
+            'ZIP_CODE': ['981**', '070**'],
+            'median_income': [1000, 5000]
+        })
+        counties = AoU_socioeconomic(df=sample_df,
+                                     geo_df=geo_df,
+                                     county_df=county_df).merge_county_socioeconomic()
+        king = (counties['STATEFP'] == '53') & (counties['NAME'] == 'King')
+        self.assertEqual(counties.loc[king, 'median_income'].item(), 1000)
+        self.assertEqual(counties.loc[king, 'zip3'].item(), 981)
+        self.assertEqual(counties['zip3'].dtype, 'Int64')
+
+    ### For to_topojson
+    ### one shot test 1 ###
+    def test_one_shot_test_1_to_topojson(self):
+        '''
+        The border of two neighbouring counties is stored once
+        '''
+        from shapely.geometry import box
+        counties = gpd.GeoDataFrame({'GEOID': ['53033', '53061']},
+                                    geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1)])
+        topology = to_topojson(counties, 'zoomed', id_column='GEOID')
+
+        geometries = topology['objects']['counties']['geometries']
+        self.assertEqual([x['id'] for x in geometries], [53033, 53061])
+        self.assertEqual(len(topology['arcs']), 3)
+        shared = set(geometries[0]['arcs'][0]) & \
+            {~x for x in geometries[1]['arcs'][0]}
+        self.assertEqual(len(shared), 1)
+
+    ### edge test 1 ###
+    def test_edge_test_1_to_topojson(self):
+        '''
+        Provide an unknown level of detail, see if error is raised
+        '''
+        counties = gpd.read_file(geo_df)
+        with self.assertRaises(ValueError):
+            to_topojson(counties, 'county')
+
+    ### edge test 2 ###
+    def test_edge_test_2_to_topojson(self):
+        '''
+        A sliver that collapses when simplified is dropped instead of
+        being drawn inside out
+        '''
+        from shapely.geometry import Polygon
+        shapes = gpd.GeoDataFrame(
+            {'GEOID': ['01001', '01003']},
+            geometry=[Polygon([(0, 0), (0, 1), (1, 1), (1, 0)]),
+                      Polygon([(1, 0), (1, 1), (1.005, 0.5)])])
+        topology = to_topojson(shapes, 'national', id_column='GEOID')
+        geometries = topology['objects']['counties']['geometries']
+
+        self.assertEqual([x['type'] for x in geometries], ['Polygon', None])
+        self.assertEqual([x['id'] for x in geometries], [1001, 1003])
+
+    ### For CDIStore
+    ### one shot test 1 ###
+    def test_one_shot_test_1_cdi_store(self):
+        '''
+        Slices from the store match boolean masks, row order included
+        '''
+        dataframe = cdi_dummy.copy()
+        store = CDIStore(dataframe)
+        variable = "Mortality from coronary heart disease"
+
+        for criteria in [{"Question": variable},
+                         {"Question": variable,
+                          "StratificationCategory1": "Overall",
+                          "DataValueType": "Number"},
+                         {"Question": variable,
+                          "LocationDesc": "California"}]:
+            mask = np.ones(len(dataframe), dtype=bool)
+            for column, value in criteria.items():
+                mask &= dataframe[column] == value
+            pd.testing.assert_frame_equal(store.select(criteria),
+                                          dataframe[mask])
+
+        chart = hdcd.plot_geomap(variable, "Number", "Overall", store)
+        self.assertIsInstance(chart, alt.LayerChart)
+
+    ### edge test 1 ###
+    def test_edge_test_1_cdi_store(self):
+        '''
+        Missing key columns raise, unknown keys give an empty slice
+        '''
+        dataframe = cdi_dummy.copy()
+        store = CDIStore(dataframe)
+        self.assertTrue(store.select({"Question": "No such variable"}).empty)
+
+        with self.assertRaises(NameError):
+            CDIStore(dataframe.drop(columns=["DataValueType"]))
+
+    ### For the hdcd data transformer
+    ### one shot test 1 ###
+    def test_one_shot_test_1_shared_data(self):
+        '''
+        Charts from the same data reference one content-addressed file
+        '''
+        variable = "Mortality from coronary heart disease"
+        dataframe = cdi_dummy.copy()
+        with tempfile.TemporaryDirectory() as tmp:
+            with hdcd.enable_shared_data(data_dir=tmp, url_path='data'):
+                specs = [hdcd.plot_longitudinal_change(variable,
+                                                       "California",
+                                                       "Overall",
+                                                       dataframe).to_dict()
+                         for _ in range(2)]
+            files = os.listdir(tmp)
+
+            self.assertEqual(alt.data_transformers.active, 'default')
+            self.assertEqual(len(files), 1)
+            self.assertEqual(specs[0]['data'], specs[1]['data'])
+            self.assertEqual(specs[0]['data']['url'], 'data/' + files[0])
+            self.assertNotIn('datasets', specs[0])
+
+            data = shared_data(dataframe, data_dir=tmp, format='csv')
+            self.assertEqual(data['format']['parse']['DataValue'], 'number')
+
+    ### edge test 1 ###
+    def test_edge_test_1_shared_data(self):
+        '''
+        Provide an unknown format, see if error is raised
+        '''
+        with self.assertRaises(ValueError):
+            hdcd.enable_shared_data(format='parquet')
+        with self.assertRaises(ValueError):
+            shared_data(cdi_dummy, format='parquet')
+
+    ### For render_charts
+    ### one shot test 1 ###
+    def test_one_shot_test_1_render_charts(self):
+        '''
+        Charts are written once, failures are reported, existing outputs
+        are skipped
+        '''
+        variable = "Mortality from coronary heart disease"
+        with tempfile.TemporaryDirectory() as out_dir:
+            requests = [{'function': 'plot_geomap', 'data': 'cdi',
+                         'kwargs': {'variable': variable, 'datatype': 'Number',
+                                    'stratification': 'Overall'},
+                         'output': os.path.join(out_dir, 'geomap.html')},
+                        {'function': 'plot_geomap', 'data': 'cdi',
+                         'kwargs': {'variable': 'No such variable',
+                                    'datatype': 'Number',
+                                    'stratification': 'Overall'},
+                         'output': os.path.join(out_dir, 'missing.html')}]
+
+            report = render_charts(requests, {'cdi': cdi_dummy}, processes=1)
+            self.assertEqual(report['status'].tolist(), ['rendered', 'failed'])
+            self.assertTrue(report['error'][1].startswith('NameError'))
+            with open(requests[0]['output']) as f:
+                self.assertIn('vega-lite', f.read())
+            self.assertFalse(os.path.exists(requests[1]['output']))
+
+            report = render_charts(requests, {'cdi': cdi_dummy}, processes=1)
+            self.assertEqual(report['status'].tolist(), ['skipped', 'failed'])
+
+    ### one shot test 3 ###
+    def test_one_shot_test_3_render_charts(self):
+        '''
+        plot_geomap_by_location can be rendered too
+        '''
+        variable = "Mortality from coronary heart disease"
+        points = cdi_dummy.assign(longitude=-120.0, latitude=47.0)
+        with tempfile.TemporaryDirectory() as out_dir:
+            requests = [{'function': 'plot_geomap_by_location', 'data': 'cdi',
+                         'kwargs': {'variable': variable, 'datatype': 'Number'},
+                         'output': os.path.join(out_dir, 'points.html')}]
+
+            report = render_charts(requests, {'cdi': points}, processes=1)
+            self.assertEqual(report['status'].tolist(), ['rendered'])
+
+    ### one shot test 2 ###
+    @unittest.skipUnless(importlib.util.find_spec('vl_convert'),
+                         'vl-convert-python not installed')
+    def test_one_shot_test_2_render_charts(self):
+        '''
+        SVG and PNG are rendered by a pool of workers
+        '''
+        with tempfile.TemporaryDirectory() as out_dir:
+            requests = [{'function': 'plot_corr', 'data': 'cdi',
+                         'kwargs': {'sod': "Mortality from coronary heart disease",
+                                    'health_outcome': "Life expectancy at birth",
+                                    'stratification': "Overall"},
+                         'output': os.path.join(out_dir, f'corr.{x}')}
+                        for x in ['svg', 'png']]
+
+            report = render_charts(requests, {'cdi': cdi_dummy}, processes=2)
+            self.assertEqual(report['status'].tolist(), ['rendered'] * 2)
+            with open(requests[0]['output']) as f:
+                self.assertTrue(f.read().startswith('<svg'))
+            with open(requests[1]['output'], 'rb') as f:
+                self.assertEqual(f.read(4), b'\x89PNG')
+
+    ### edge test 1 ###
+    def test_edge_test_1_render_charts(self):
+        '''
+        Provide unknown functions, datasets and formats, see if error is raised
+        '''
+        request = {'function': 'plot_corr', 'data': 'cdi', 'kwargs': {},
+                   'output': 'corr.svg'}
+        with self.assertRaises(ValueError):
+            render_charts([dict(request, function='data_summary')],
+                          {'cdi': cdi_dummy})
+        with self.assertRaises(NameError):
+            render_charts([request], {'places': cdi_dummy})
+        with self.assertRaises(ValueError):
+            render_charts([dict(request, output='corr.pdf')], {'cdi': cdi_dummy})
+
+    ### For SpecCache
+    ### one shot test 1 ###
+    def test_one_shot_test_1_spec_cache(self):
+        '''
+        Repeated calls on the same data return the cached spec, changed
+        data is a miss, and the disk tier serves a new session
+        '''
+        calls = []
+        def plot(sod, health_outcome, stratification, dataframe):
+            calls.append(sod)
+            return hdcd.plot_corr(sod, health_outcome, stratification, dataframe)
+
+        args = ("Mortality from coronary heart disease",
+                "Life expectancy at birth", "Overall")
+        dataframe = cdi_dummy.copy()
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ReferenceCache(cache_dir=cache_dir)
+            specs = SpecCache(maxsize=2, disk=True, cache=cache)
+
+            first = specs.spec(plot, *args, dataframe)
+            second = specs.spec(plot, *args, dataframe=dataframe.copy())
+            self.assertEqual(first, second)
+            self.assertEqual((specs.hits, specs.misses, len(calls)), (1, 1, 1))
+            self.assertIn('"mark"', first)
+
+            changed = dataframe.copy()
+            changed.loc[0, "DataValue"] = 0
+            specs.spec(plot, *args, changed)
+            self.assertEqual(len(calls), 2)
+
+            session = SpecCache(disk=True, cache=cache)
+            self.assertEqual(session.spec(plot, *args, CDIStore(dataframe)), first)
+            self.assertEqual(len(calls), 2)
+
+            cache.clear()
+            self.assertFalse(os.path.exists(os.path.join(cache_dir, 'specs')))
+
+    ### edge test 1 ###
+    def test_edge_test_1_spec_cache(self):
+        '''
+        Reject an empty cache; data that cannot be fingerprinted is
+        plotted without caching
+        '''
+        with self.assertRaises(ValueError):
+            SpecCache(maxsize=0)
+
+        specs = SpecCache()
+        dataframe = cdi_dummy.copy()
+        dataframe["lists"] = [[x] for x in range(len(dataframe))]
+        args = ("Mortality from coronary heart disease",
+                "Life expectancy at birth", "Overall", dataframe)
+        specs.spec(hdcd.plot_corr, *args)
+        specs.spec(hdcd.plot_corr, *args)
+        self.assertEqual((specs.hits, specs.misses, len(specs)), (0, 2, 0))
+
+    ### edge test 2 ###
+    def test_edge_test_2_spec_cache(self):
+        '''
+        Edited plot code, a new hdcd version or remote maps change the key
+        '''
+        specs = SpecCache()
+        namespace = {'__name__': 'edited_plots'}
+        exec('def plot(x):\n    return x + 1', namespace)
+        first = namespace['plot']
+        exec('def plot(x):\n    return x + 2', namespace)
+        self.assertNotEqual(specs.key(first, 1), specs.key(namespace['plot'], 1))
+
+        key = specs.key(hdcd.plot_corr, 'a', 'b', 'Overall', cdi_dummy)
+        with mock.patch('hdcd.spec_cache.__version__', '0.0'):
+            self.assertNotEqual(
+                specs.key(hdcd.plot_corr, 'a', 'b', 'Overall', cdi_dummy), key)
+        with mock.patch('hdcd.plot._remote_maps', not hdcd.plot.remote_maps()):
+            self.assertNotEqual(
+                specs.key(hdcd.plot_corr, 'a', 'b', 'Overall', cdi_dummy), key)
+        self.assertEqual(
+            specs.key(hdcd.plot_corr, 'a', 'b', 'Overall', cdi_dummy), key)
+
+    ### edge test 3 ###
+    def test_edge_test_3_spec_cache(self):
+        '''
+        A DataFrame is hashed once until a column, its index or its column
+        names are replaced
+        '''
+        dataframe = cdi_dummy.copy()
+        with mock.patch('hdcd.spec_cache._hash_frame',
+                        wraps=hdcd.spec_cache._hash_frame) as hashed:
+            first = hdcd.spec_cache.fingerprint(dataframe)
+            self.assertEqual(hdcd.spec_cache.fingerprint(dataframe), first)
+            self.assertEqual(hashed.call_count, 1)
+
+            dataframe["DataValue"] = dataframe["DataValue"].astype(str) + "0"
+            self.assertNotEqual(hdcd.spec_cache.fingerprint(dataframe), first)
+            dataframe.index = dataframe.index + 1
+            hdcd.spec_cache.fingerprint(dataframe)
+            self.assertEqual(hashed.call_count, 3)
+
+    ### For minimize_chart
+    ### one shot test 1 ###
+    def test_one_shot_test_1_minimize_chart(self):
+        '''
+        Only the encoded columns are embedded, repeated strings are decoded
+        in the spec and the chart passed in is unchanged
+        '''
+        chart = hdcd.plot_longitudinal_change("Life expectancy at birth",
+                                              "California", "Overall",
+                                              cdi_dummy)
+        minimized, sizes = minimize_chart(chart)
+
+        self.assertLess(sizes['after'], sizes['before'])
+        self.assertEqual(sizes['before'], len(chart.to_json(
+            indent=None, separators=(',', ':')).encode()))
+        spec = minimized.to_dict()
+        rows = [x for x in spec['datasets'].values()][0]
+        self.assertEqual(set(rows[0]), {"YearStart", "DataValue",
+                                        "DataValueType", "LowConfidenceLimit",
+                                        "HighConfidenceLimit",
+                                        "Stratification1"})
+        self.assertIsInstance(rows[0]["DataValueType"], int)
+        decode = {x['as']: x['calculate'] for x in spec['transform']}
+        self.assertIn("DataValueType", decode)
+        self.assertIn('"Topic"', chart.to_json())
+
+    ### one shot test 2 ###
+    def test_one_shot_test_2_minimize_chart(self):
+        '''
+        Every plot function takes minimize=True and reports the spec sizes
+        '''
+        with self.assertLogs('hdcd.plot', level='INFO') as logs, \
+                contextlib.redirect_stdout(io.StringIO()) as output:
+            chart = hdcd.plot_geomap("Life expectancy at birth",
+                                     "Number", "Overall", cdi_dummy,
+                                     minimize=True)
+        self.assertRegex(logs.output[0], r'spec size: [\d,]+ -> [\d,]+ bytes')
+        self.assertEqual(output.getvalue(), '')
+        rows = [x for x in chart.to_dict()['datasets'].values()
+                if isinstance(x, list)][0]
+        self.assertEqual(set(rows[0]),
+                         {"YearStart", "LocationDesc", "DataValue", "id"})
+
+    ### edge test 1 ###
+    def test_edge_test_1_minimize_chart(self):
+        '''
+        Fields only known at render time keep every column; floats keep
+        their own significant digits and integer lookup keys
+        '''
+        with self.assertRaises(ValueError):
+            minimize_chart(alt.Chart(cdi_dummy).mark_point(), precision=0)
+
+        data = pd.DataFrame({'id': [1000001.0, 2.0, 3.0],
+                             'x': [0.123456789, 12345.6789, 0.000123456],
+                             'unused': ['a', 'b', 'c']})
+        chart = alt.Chart(data).mark_point().transform_calculate(
+            y='datum[field]').encode(x='x:Q', y='y:Q')
+        minimized, _ = minimize_chart(chart, precision=3)
+        rows = [x for x in minimized.to_dict()['datasets'].values()][0]
+        self.assertEqual(rows[0], {'id': 1000001.0, 'x': 0.123, 'unused': 'a'})
+        self.assertEqual([x['x'] for x in rows], [0.123, 12346.0, 0.000123])
+
+    ### For plot_geomap_socioeconomic
+    ### one shot test 1 ###
+    def test_one_shot_test_1_plot_geomap_socioeconomic(self):
+        '''
+        County shapes are embedded as TopoJSON and cached on disk
+        '''
+        sample_df = pd.DataFrame({
+            'person_id': [1, 2],
+            'observation_datetime': ['2023-01-01'] * 2,
+            'zip_code': ['980**', '070**'],
+            'high_school_education': [0.9, 0.8],
+            'median_income': [1000, 5000],
+            'no_health_insurance': [0.1, 0.2],
+            'poverty': [0.1, 0.3]
+        })
+        counties = AoU_socioeconomic(df=sample_df,
+                                     geo_df=geo_df,
+                                     county_df=county_df).merge_county_socioeconomic()
+        with tempfile.TemporaryDirectory() as tmp:
+            chart = hdcd.plot_geomap_socioeconomic(counties,
+                                                   cache=ReferenceCache(tmp))
+            spec = chart.to_dict()
+            self.assertEqual(len(os.listdir(os.path.join(tmp, 'topojson'))), 1)
+
+        self.assertEqual(spec['data']['format'], {'type': 'topojson',
+                                                  'feature': 'counties'})
+        self.assertEqual(spec['transform'][0]['lookup'], 'id')
+        # one chart, the dropdown switches between the folded SDOH
+        self.assertEqual(spec['transform'][1]['fold'], list(hdcd.plot.SDOH))
+        self.assertEqual(spec['params'][0]['name'], 'sdoh')
+        self.assertEqual(spec['params'][0]['value'], 'poverty')
+
+    ### edge test 1 ###
+    def test_edge_test_1_plot_geomap_socioeconomic(self):
+        '''
+        Provide an unknown SDOH, see if error is raised
+        '''
+        counties = AoU_socioeconomic(df=pd.DataFrame(),
+                                     geo_df=geo_df,
+                                     county_df=county_df).load_geoshapes()
+        with self.assertRaises(ValueError):
+            hdcd.plot_geomap_socioeconomic(counties, sdoh='income')
+
+    ### For engine='duckdb'
+    ### one shot test 1 ###
+    @unittest.skipUnless(importlib.util.find_spec('duckdb'), 'duckdb not installed')
+    def test_one_shot_test_1_duckdb_engine(self):
+        '''
+        Both engines return the same conditions merge and counts
+        '''
+        result = {}
+        for engine in ['pandas', 'duckdb']:
+            aou_tc = AoU_conditions(conditions_df = conditions_df,
+                                    observations_df = observations_df,
+                                    county_df = county_df,
+                                    geo_df = geo_df,
+                                    engine = engine
+                                    )
+            result[engine] = (aou_tc.merge_conditions_observation(threshold=0),
+                              aou_tc.counties_groupby_count(threshold=0))
+
+        pd.testing.assert_frame_equal(result['pandas'][0], result['duckdb'][0])
+        pd.testing.assert_frame_equal(result['pandas'][1], result['duckdb'][1])
+
+    ### one shot test 2 ###
+    @unittest.skipUnless(importlib.util.find_spec('duckdb'), 'duckdb not installed')
+    def test_one_shot_test_2_duckdb_engine(self):
+        '''
+        Both engines return the same county socioeconomic merge
+        '''
+        sample_df = pd.DataFrame({
+            'person_id': [1, 2, 3, 4],
+            'observation_datetime': ['2023-01-01'] * 4,
+            'zip_code': ['981**', '070**', '457**', '999**'],
+            'median_income': [50000, 60000, 70000, 80000]
+        })
+
+        result = {}
+        for engine in ['pandas', 'duckdb']:
+            aou = AoU_socioeconomic(df=sample_df,
+                                    geo_df=geo_df,
+                                    county_df=county_df,
+                                    engine=engine)
+            result[engine] = aou.merge_county_socioeconomic()
+
+        pd.testing.assert_frame_equal(result['pandas'], result['duckdb'])
+
+    ### edge test 1 ###
+    def test_edge_test_1_duckdb_engine(self):
+        '''
+        Provide an unknown engine, see if error is raised
+        '''
+        with self.assertRaises(ValueError):
+            AoU_conditions(conditions_df = conditions_df,
+                           observations_df = observations_df,
+                           county_df = county_df,
+                           geo_df = geo_df,
+                           engine = 'spark'
+                           )
+
+    ### For counties_groupby_count_stream
+    ### one shot test 1 ###
+    def test_one_shot_test_1_counties_groupby_count_stream(self):
+        '''
+        Streaming counts over small chunks match the in-memory counts
+        '''
+        aou_tc = AoU_conditions(conditions_df = conditions_df,
+                                observations_df = observations_df,
+                                county_df = county_df,
+                                geo_df = geo_df
+                                )
+        with mock.patch('hdcd.data_wrangling.CONCEPT_THRESHOLD', 0):
+            expected = aou_tc.counties_groupby_count().reset_index(drop=True)
+            result = aou_tc.counties_groupby_count_stream(chunksize=3)
+
+        pd.testing.assert_frame_equal(result, expected)
+
+    ### edge test 1 ###
+    def test_edge_test_1_counties_groupby_count_stream(self):
+        '''
+        Provide input with mistakes, see if error is raised
+        '''
+        aou_tc = AoU_conditions(conditions_df = "./data/condition_data.csv",
+                                observations_df = "./data/observation_data.csv",
+                                county_df = 1234567,
+                                geo_df = geo_df
+                                )
+        with self.assertRaises(ValueError):
+            aou_tc.counties_groupby_count_stream()
+
+    ### edge test 2 ###
+    def test_edge_test_2_counties_groupby_count_stream(self):
+        '''
+        Person ids that do not fit the packed (person, concept) key raise
+        instead of overflowing
+        '''
+        conditions = conditions_df.copy()
+        conditions['person_id'] = conditions['person_id'] + 2 ** 43
+        aou_tc = AoU_conditions(conditions_df = conditions,
+                                observations_df = observations_df,
+                                county_df = county_df,
+                                geo_df = geo_df
+                                )
+        with self.assertRaises(ValueError):
+            aou_tc.counties_groupby_count_stream(chunksize=3)
+
+    ### For counties_groupby_count_append
+    ### one shot test 1 ###
+    def test_one_shot_test_1_counties_groupby_count_append(self):
+        '''
+        Folding two releases into a saved and reloaded state gives the
+        counts over all records
+        '''
+        expected = AoU_conditions(conditions_df = conditions_df,
+                                  observations_df = observations_df,
+                                  county_df = county_df,
+                                  geo_df = geo_df
+                                  ).counties_groupby_count(threshold=0)
+
+        state = CountyCountState()
+        half_c, half_o = len(conditions_df) // 2, len(observations_df) // 2
+        AoU_conditions(conditions_df = conditions_df.iloc[:half_c],
+                       observations_df = observations_df.iloc[:half_o],
+                       county_df = county_df,
+                       geo_df = geo_df
+                       ).counties_groupby_count_append(state, threshold=0)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'state.npz')
+            state.save(path)
+            state = CountyCountState.load(path)
+
+        result = AoU_conditions(conditions_df = conditions_df.iloc[half_c:],
+                                observations_df = observations_df.iloc[half_o:],
+                                county_df = county_df,
+                                geo_df = geo_df
+                                ).counties_groupby_count_append(state, threshold=0)
+
+        pd.testing.assert_frame_equal(result, expected.reset_index(drop=True),
+                                      check_dtype=False)
+
+    ### edge test 1 ###
+    def test_edge_test_1_counties_groupby_count_append(self):
+        '''
+        Provide input with mistakes, see if error is raised
+        '''
+        aou_tc = AoU_conditions(conditions_df = conditions_df,
+                                observations_df = observations_df,
+                                county_df = county_df,
+                                geo_df = geo_df
+                                )
+        with self.assertRaises(ValueError):
+            aou_tc.counties_groupby_count_append({})
+
+    ### edge test 2 ###
+    def test_edge_test_2_counties_groupby_count_append(self):
+        '''
+        Many small batches, kept as several sorted runs between updates,
+        give the same counts as one batch
+        '''
+        rng = np.random.default_rng(0)
+        person_county = pd.DataFrame({'person_id': rng.integers(0, 300, 400),
+                                      'state_abbr': rng.choice(['CA', 'NY'], 400),
+                                      'county': rng.choice(['A', 'B', 'C'], 400)})
+        conditions = pd.DataFrame({'person_id': rng.integers(0, 300, 3000),
+                                   'standard_concept_name': rng.choice(list('abcdefg'), 3000),
+                                   'year': rng.integers(2000, 2010, 3000)})
+        expected = CountyCountState()
+        expected.update(person_county, conditions)
+
+        state = CountyCountState()
+        for people, records in zip(np.array_split(np.arange(400), 40),
+                                   np.array_split(np.arange(3000), 40)):
+            state.update(person_county.iloc[people], conditions.iloc[records])
+
+        self.assertGreater(len(state._counts.runs), 1)
+        pd.testing.assert_frame_equal(state.conditions_counts(),
+                                      expected.conditions_counts())
+
+    ### For state and county dimension tables
+    ### one shot test 1 ###
+    def test_one_shot_test_1_state_ids(self):
+        '''
+        State names and abbreviations map to FIPS, unknown ones to NaN
+        '''
+        ids = state_ids(pd.Series(['Washington', 'WA', 'United States']))
+
+        self.assertEqual(ids[:2].tolist(), [53, 53])
+        self.assertTrue(np.isnan(ids[2]))
+
+    ### one shot test 1 ###
+    def test_one_shot_test_1_county_ids(self):
+        '''
+        Counties with the same name in different states get their own id
+        '''
+        counties = pd.DataFrame({'STATEFP': ['39', '41', '49', '24', '24'],
+                                 'NAME': ['Washington', 'Washington',
+                                          'Washington', 'Baltimore',
+                                          'Baltimore'],
+                                 'GEOID': ['39167', '41067', '49053',
+                                           '24510', '24005']})
+        dimension = county_dimension(counties)
+
+        ids = county_ids(dimension,
+                         pd.Series(['OR', 'OH', 'UT', 'MD', 'WA']),
+                         pd.Series(['Washington', 'Washington',
+                                    'Washington', 'Baltimore', 'King']))
+
+        self.assertEqual(ids[:4].tolist(), [41067, 39167, 49053, 24005])
+        self.assertTrue(np.isnan(ids[4]))
+
+    ### one shot test 2 ###
+    def test_one_shot_test_2_county_ids(self):
+        '''
+        The bundled county table and TopoJSON share integer FIPS ids
+        '''
+        ids = county_ids(county_dimension(),
+                         pd.Series(['WA', 'OR', 'NM']),
+                         pd.Series(['King', 'Washington', 'Doña Ana']))
+        self.assertEqual(ids.tolist(), [53033, 41067, 35013])
+
+        counties = us_topology('counties')['objects']['counties']['geometries']
+        self.assertTrue({53033, 41067, 35013} <= {x['id'] for x in counties})
+        states = us_topology('states')['objects']['states']['geometries']
+        self.assertEqual(len(states), 52)
+        self.assertIs(us_topology('states'), us_topology('states'))
+
+    ### edge test 1 ###
+    def test_edge_test_1_us_topology(self):
+        '''
+        Only states and counties are bundled
+        '''
+        with self.assertRaises(ValueError):
+            us_topology('zip3')
+
+    ### For us_feature
+    ### one shot test 1 ###
+    def test_one_shot_test_1_us_feature(self):
+        '''
+        The bundled copy is inlined by default and written once with shared
+        chart data, us-10m is only linked when opted in
+        '''
+        data = hdcd.plot.us_feature('states')
+        self.assertEqual(json.loads(data['values']), us_topology('states'))
+
+        previous = hdcd.plot.remote_maps(True)
+        try:
+            self.assertFalse(previous)
+            self.assertEqual(hdcd.plot.us_feature('counties'),
+                             {'url': hdcd.plot.US_10M,
+                              'format': {'type': 'topojson',
+                                         'feature': 'counties'}})
+            chart = hdcd.plot_geomap("Mortality from coronary heart disease",
+                                     "Number", "Overall", cdi_dummy.copy())
+            self.assertLess(len(chart.to_json()), 100000)
+        finally:
+            hdcd.plot.remote_maps(previous)
+        self.assertFalse(hdcd.plot.remote_maps())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with hdcd.enable_shared_data(data_dir=tmp, url_path='data'):
+                data = hdcd.plot.us_feature('states')
+            self.assertTrue(data['url'].startswith('data/hdcd-data-'))
+            self.assertEqual(data['format']['type'], 'topojson')
+        with self.assertRaises(ValueError):
+            hdcd.plot.us_feature('zip3')
+
+    ### For ReferenceCache
+    ### smoke test ###
+    def test_smoke_test_reference_cache(self):
+        '''
+        A cached csv is stored once on disk and read back unchanged
+        '''
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ReferenceCache(cache_dir=cache_dir)
+            first = cache.read_csv('./data/conditions.csv')
+
+            # a fresh instance must read from disk, not from memory
+            second = ReferenceCache(cache_dir=cache_dir,
+                                    offline=True).read_csv('./data/conditions.csv')
+
+            pd.testing.assert_frame_equal(first, second)
+            pd.testing.assert_frame_equal(first,
+                                          pd.read_csv('./data/conditions.csv'))
+            self.assertEqual(len([f for f in os.listdir(cache_dir)
+                                  if f != 'index.json']), 1)
+
+    ### edge test 1 ###
+    def test_edge_test_1_reference_cache(self):
+        '''
+        Offline mode raises ValueError for sources that are not cached
+        '''
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ReferenceCache(cache_dir=cache_dir, offline=True)
+
+            with self.assertRaises(ValueError):
+                cache.read_geoshapes(geo_df)